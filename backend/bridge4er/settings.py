@@ -137,9 +137,30 @@ DROPBOX_ACCESS_TOKEN = env_text("DROPBOX_ACCESS_TOKEN", "")
 DROPBOX_REFRESH_TOKEN = env_text("DROPBOX_REFRESH_TOKEN", "")
 DROPBOX_APP_KEY = env_text("DROPBOX_APP_KEY", "")
 DROPBOX_APP_SECRET = env_text("DROPBOX_APP_SECRET", "")
+DROPBOX_UPLOAD_CHUNK_SIZE_MB = env_int("DROPBOX_UPLOAD_CHUNK_SIZE_MB", 8, minimum=1)
 
 # Storage provider
 STORAGE_PROVIDER = (env_text("STORAGE_PROVIDER", "supabase") or "supabase").strip().lower() or "supabase"
+# STORAGE_PROVIDER=local serves a directory tree; latency/error injection is for offline benchmarks.
+LOCAL_STORAGE_ROOT = env_text("LOCAL_STORAGE_ROOT", "") or str(BASE_DIR / "local_storage")
+LOCAL_STORAGE_LATENCY_MS = env_int("LOCAL_STORAGE_LATENCY_MS", 0, minimum=0)
+LOCAL_STORAGE_LATENCY_JITTER_MS = env_int("LOCAL_STORAGE_LATENCY_JITTER_MS", 0, minimum=0)
+LOCAL_STORAGE_ERROR_RATE = env_text("LOCAL_STORAGE_ERROR_RATE", "0")
+# Wrappers around the storage provider, outermost first (see storage/backends.py).
+STORAGE_MIDDLEWARE = env_list(
+    "STORAGE_MIDDLEWARE",
+    "storage.backends.MetricsMiddleware,storage.backends.RetryMiddleware,"
+    "storage.backends.CircuitBreakerMiddleware,storage.backends.DiskCacheMiddleware",
+)
+STORAGE_RETRY_ATTEMPTS = env_int("STORAGE_RETRY_ATTEMPTS", 2, minimum=0)
+STORAGE_RETRY_BACKOFF_MS = env_int("STORAGE_RETRY_BACKOFF_MS", 100, minimum=0)
+# No further retry once a call has been failing for this long (timeouts already stack per attempt).
+STORAGE_RETRY_BUDGET_SECONDS = env_int("STORAGE_RETRY_BUDGET_SECONDS", 10, minimum=0)
+STORAGE_BREAKER_FAILURES = env_int("STORAGE_BREAKER_FAILURES", 5, minimum=0)
+STORAGE_BREAKER_RESET_SECONDS = env_int("STORAGE_BREAKER_RESET_SECONDS", 30, minimum=1)
+STORAGE_METRICS_TOKEN = env_text("STORAGE_METRICS_TOKEN", "") or ""
+# Send Server-Timing storage entries to every client instead of only to staff.
+STORAGE_SERVER_TIMING = env_bool("STORAGE_SERVER_TIMING", False)
 SUPABASE_URL = (
     env_text("SUPABASE_URL", "https://amjhgookahipybmbtfqx.supabase.co") or ""
 ).strip().rstrip("/")
@@ -151,6 +172,25 @@ SUPABASE_STORAGE_PUBLIC = env_bool("SUPABASE_STORAGE_PUBLIC", False)
 SUPABASE_SERVICE_ROLE_KEY = (env_text("SUPABASE_SERVICE_ROLE_KEY", "") or "").strip()
 SUPABASE_SIGNED_URL_TTL_SECONDS = env_int("SUPABASE_SIGNED_URL_TTL_SECONDS", 3600, minimum=60)
 SUPABASE_REQUEST_TIMEOUT_SECONDS = env_int("SUPABASE_REQUEST_TIMEOUT_SECONDS", 45, minimum=5)
+SUPABASE_LIST_CONCURRENCY = env_int("SUPABASE_LIST_CONCURRENCY", 8, minimum=1)
+SUPABASE_LIST_DEADLINE_SECONDS = env_int("SUPABASE_LIST_DEADLINE_SECONDS", 120, minimum=5)
+SUPABASE_CONNECT_TIMEOUT_SECONDS = env_int("SUPABASE_CONNECT_TIMEOUT_SECONDS", 5, minimum=1)
+SUPABASE_HTTP_POOL_SIZE = env_int("SUPABASE_HTTP_POOL_SIZE", 16, minimum=1)
+SUPABASE_HTTP_RETRIES = env_int("SUPABASE_HTTP_RETRIES", 2, minimum=0)
+SUPABASE_HEDGED_READS = env_bool("SUPABASE_HEDGED_READS", True)
+SUPABASE_HEDGE_DELAY_MS = env_int("SUPABASE_HEDGE_DELAY_MS", 250, minimum=10)
+SUPABASE_BATCH_CONCURRENCY = env_int("SUPABASE_BATCH_CONCURRENCY", 4, minimum=1)
+SUPABASE_DELETE_BATCH_SIZE = env_int("SUPABASE_DELETE_BATCH_SIZE", 100, minimum=1)
+SUPABASE_MOVE_CONCURRENCY = env_int("SUPABASE_MOVE_CONCURRENCY", 8, minimum=1)
+# A running move journal untouched for this long belongs to a dead worker and may be resumed.
+SUPABASE_MOVE_STALE_SECONDS = env_int("SUPABASE_MOVE_STALE_SECONDS", 600, minimum=60)
+SUPABASE_UPLOAD_RESUME_ATTEMPTS = env_int("SUPABASE_UPLOAD_RESUME_ATTEMPTS", 3, minimum=0)
+# Per-operation read timeouts, e.g. "list=15,sign=10,download=60" (head, list, sign, download, upload, delete, move).
+SUPABASE_OPERATION_TIMEOUTS = {
+    name.strip().lower(): int(seconds.strip())
+    for name, _, seconds in (item.partition("=") for item in env_list("SUPABASE_OPERATION_TIMEOUTS"))
+    if name.strip() and seconds.strip().isdigit()
+}
 
 INSTALLED_APPS = [
     "django.contrib.admin",
@@ -175,10 +215,11 @@ if importlib.util.find_spec("import_export"):
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
-    "django.middleware.gzip.GZipMiddleware",
+    "storage.file_responses.RangeAwareGZipMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
+    "storage.metrics.StorageTimingMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
@@ -336,6 +377,12 @@ DROPBOX_LIST_CACHE_STALE_TTL_SECONDS = env_int(
     minimum=DROPBOX_LIST_CACHE_TTL_SECONDS,
 )
 DROPBOX_ALLOW_PUBLIC_LISTING = env_bool("DROPBOX_ALLOW_PUBLIC_LISTING", False)
+# proxy streams files through Django; redirect/link hand out a short-lived object-store URL instead.
+STORAGE_FILE_DELIVERY_MODE = (env_text("STORAGE_FILE_DELIVERY_MODE", "proxy") or "proxy").strip().lower()
+# Modes non-staff clients may pick with ?delivery=; staff may always override.
+STORAGE_CLIENT_DELIVERY_MODES = env_list("STORAGE_CLIENT_DELIVERY_MODES", "")
+STORAGE_DISK_CACHE_DIR = env_text("STORAGE_DISK_CACHE_DIR", "")
+STORAGE_DISK_CACHE_MAX_MB = env_int("STORAGE_DISK_CACHE_MAX_MB", 256, minimum=0)
 DROPBOX_OBJECTIVE_COUNT_CACHE_TTL_SECONDS = env_int(
     "DROPBOX_OBJECTIVE_COUNT_CACHE_TTL_SECONDS",
     1800,
@@ -1,7 +1,7 @@
 import mimetypes
 
 from django.db.models import Count
-from django.http import FileResponse, HttpResponse
+from django.http import FileResponse
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
@@ -9,7 +9,8 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from exams.models import ExamPurchase, ExamSet
-from storage.dropbox_service import download_file, upload_file
+from storage.dropbox_service import upload_file
+from storage.file_responses import storage_file_response
 from .models import (
     Contribution,
     ContributionComment,
@@ -243,20 +244,22 @@ class ContributionFileView(APIView):
 
         if file_handle is None:
             dropbox_path = contribution.dropbox_path or _build_contribution_storage_path(contribution, filename)
+            guessed_type, _ = mimetypes.guess_type(filename)
             try:
-                file_content = download_file(dropbox_path)
+                response = storage_file_response(
+                    request,
+                    dropbox_path,
+                    content_type=guessed_type or "application/octet-stream",
+                    disposition="attachment" if download_requested else "inline",
+                    filename=filename,
+                    cache_control="private, max-age=300",
+                )
             except Exception:
                 return Response({"error": "File not found on server"}, status=status.HTTP_404_NOT_FOUND)
 
             if not contribution.dropbox_path:
                 contribution.dropbox_path = dropbox_path
                 contribution.save(update_fields=["dropbox_path", "updated_at"])
-
-            guessed_type, _ = mimetypes.guess_type(filename)
-            response = HttpResponse(file_content, content_type=guessed_type or "application/octet-stream")
-            content_disposition = "attachment" if download_requested else "inline"
-            response["Content-Disposition"] = f'{content_disposition}; filename="{filename}"'
-            response["Cache-Control"] = "private, max-age=300"
             return response
 
         guessed_type, _ = mimetypes.guess_type(filename)
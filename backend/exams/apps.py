@@ -5,3 +5,16 @@ class ExamsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'exams'
     verbose_name = "Folders"
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from .content_version import bump_exam_sets_version
+        from .models import ExamPurchase, ExamQuestion, ExamSet, InstitutionFolder
+
+        # Exam set listings show set fields, question counts and marks, institution folders and unlock state.
+        for model in (ExamSet, ExamQuestion, ExamPurchase, InstitutionFolder):
+            post_save.connect(bump_exam_sets_version, sender=model, dispatch_uid=f"exam-sets-version-save-{model.__name__}")
+            post_delete.connect(
+                bump_exam_sets_version, sender=model, dispatch_uid=f"exam-sets-version-delete-{model.__name__}"
+            )
@@ -0,0 +1,19 @@
+import time
+
+from django.core.cache import cache
+
+EXAM_SETS_VERSION_KEY = "exams:exam-sets:version"
+
+
+def exam_sets_version():
+    """Opaque token that changes whenever anything shown in exam set listings changes."""
+    version = cache.get(EXAM_SETS_VERSION_KEY)
+    if version is None:
+        # A fresh value, not a constant, so a cleared cache can never revive an ETag issued before the clear.
+        cache.add(EXAM_SETS_VERSION_KEY, str(time.time_ns()), timeout=None)
+        version = cache.get(EXAM_SETS_VERSION_KEY)
+    return str(version)
+
+
+def bump_exam_sets_version(**_kwargs):
+    cache.set(EXAM_SETS_VERSION_KEY, str(time.time_ns()), timeout=None)
@@ -10,8 +10,10 @@ from django.db.models import Max
 from django.utils import timezone
 
 from storage.dropbox_service import list_folder_with_metadata
+from storage.listing_delta import list_folder_delta
 
 from .import_utils import DJANGO_IMPORT_EXPORT_AVAILABLE, SUPPORTED_IMPORT_EXTENSIONS, parse_rows_from_path
+from .content_version import bump_exam_sets_version
 from .exam_file_metadata import build_exam_set_update_payload, extract_exam_rows_and_metadata
 from .models import Chapter, ExamQuestion, ExamSet, InstitutionFolder, MCQQuestion, Subject
 from .path_utils import GENERAL_INSTITUTION, parse_exam_source_path, parse_objective_file_path
@@ -65,6 +67,8 @@ def _list_supported_files(root_path: str, source_path: str = "") -> list[str]:
     try:
         if _is_supported_file(scan_path):
             entries = [{"path": scan_path, "is_dir": False}]
+        elif scan_path == _normalize_storage_path(root_path):
+            entries = list_folder_delta(scan_path, consumer="questions")["entries"]
         else:
             entries = list_folder_with_metadata(scan_path, include_dirs=False, recursive=True)
     except Exception as exc:
@@ -91,8 +95,9 @@ def _parent_path(path: str) -> str:
 
 
 def _folder_signature(root_path: str) -> str:
+    # The cursor-backed listing costs one provider call when nothing under the root changed.
     try:
-        entries = list_folder_with_metadata(root_path, include_dirs=False, recursive=True)
+        entries = list_folder_delta(root_path, consumer="questions")["entries"]
     except Exception as exc:
         lowered = str(exc).lower()
         if "not_found" in lowered or "path" in lowered:
@@ -200,6 +205,7 @@ def _manual_import_exam_set(exam_set: ExamSet, normalized_rows: list[dict]) -> d
         )
     if questions:
         ExamQuestion.objects.bulk_create(questions, batch_size=500)
+        bump_exam_sets_version()
     created = len(questions)
     return {"new": created, "updated": 0, "imported": created, "skipped": skipped, "error_rows": 0}
 
@@ -5,8 +5,11 @@ import shutil
 from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APIClient
 from openpyxl import Workbook
@@ -18,6 +21,7 @@ from .import_utils import parse_rows_from_uploaded_file
 from .models import Chapter, ExamPurchase, ExamSet, MCQQuestion, Subject, SubjectiveSubmission
 from .path_utils import parse_objective_file_path
 from .question_normalizers import normalize_mcq_payload
+from storage.models import FileMetadata
 
 User = get_user_model()
 TEST_MEDIA_ROOT = os.path.join(os.getcwd(), "tmp_test_media")
@@ -270,6 +274,18 @@ class SubjectLookupApiTests(TestCase):
         self.assertEqual(len(response.data), 1)
         self.assertEqual(response.data[0]["name"], "Chapter 1")
 
+    def test_chapter_endpoint_answers_revalidation_with_304(self):
+        cache.clear()
+        url = f"/api/exams/subjects/{self.subject.id}/chapters/"
+        first = self.client.get(url, {"branch": "Civil Engineering"})
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {"branch": "Civil Engineering"}, HTTP_IF_NONE_MATCH=first["ETag"])
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b"")
+
     def test_chapter_endpoint_accepts_full_subject_name(self):
         response = self.client.get(
             "/api/exams/subjects/Nepal%20Engineering%20Council%20(NEC)%20%3A%3A%201.%20Basic%20Civil%20Engineering/chapters/",
@@ -301,6 +317,51 @@ class SubjectLookupApiTests(TestCase):
         self.assertEqual(response.data["results"][0]["explanation"], "basic math")
 
 
+class DeleteSubjectSourceTests(TestCase):
+    root = "/bridge4ER/Civil Engineering/Objective MCQs/Hydraulics"
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_user(
+            username="subject_delete_admin",
+            password="secret123",
+            email="subject_delete_admin@example.com",
+            full_name="Subject Delete Admin",
+            mobile_number="9800000002",
+            is_staff=True,
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.subject = Subject.objects.create(name="Hydraulics", branch="Civil Engineering")
+        for name in ("Chapter 1.json", "Chapter 2.json"):
+            FileMetadata.objects.create(
+                name=name,
+                dropbox_path=f"{self.root}/{name}",
+                content_type="objective_mcq",
+                branch="Civil Engineering",
+                file_size=1,
+            )
+
+    def test_objects_that_failed_to_delete_keep_their_metadata(self):
+        def fake_delete(path):
+            if path != self.root:
+                return {"deleted": [], "missing": [path], "failed": {}}
+            return {
+                "deleted": [f"{self.root}/Chapter 1.json"],
+                "missing": [self.root],
+                "failed": {f"{self.root}/Chapter 2.json": "connection reset"},
+            }
+
+        with patch("exams.views_mcq.delete_file", side_effect=fake_delete):
+            response = self.client.post(f"/api/exams/subjects/{self.subject.id}/delete/", {}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn(self.root, response.data["source_folders_deleted"])
+        self.assertEqual(len(response.data["source_delete_errors"]), 1)
+        self.assertEqual(
+            list(FileMetadata.objects.values_list("dropbox_path", flat=True)), [f"{self.root}/Chapter 2.json"]
+        )
+
+
 class QuestionNormalizerTests(TestCase):
     def test_normalize_mcq_payload_accepts_spaced_headers(self):
         raw = {
@@ -519,6 +580,44 @@ class ReviewSubjectiveSubmissionAdminUpdateTests(TestCase):
         self.assertIn("not found", str(response.data.get("error", "")).lower())
 
 
+@override_settings(ENABLE_DEMO_EXAM_SETS=False, DROPBOX_AUTO_SYNC_ENABLED=False)
+class ExamSetListConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username="exam-set-etag",
+            password="secret123",
+            email="exam-set-etag@example.com",
+            mobile_number="9833333334",
+            full_name="Exam Set Etag",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.exam_set = ExamSet.objects.create(
+            name="Paid Set",
+            branch="Civil Engineering",
+            exam_type="mcq",
+            is_free=False,
+            fee=Decimal("100.00"),
+            is_active=True,
+        )
+
+    def test_revalidation_skips_the_exam_set_query_until_something_changes(self):
+        first = self.client.get("/api/exams/sets/", {"exam_type": "mcq"})
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertFalse(first.data[0]["is_unlocked"])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/exams/sets/", {"exam_type": "mcq"}, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertFalse(any("exams_examset" in query["sql"] for query in queries.captured_queries))
+
+        ExamPurchase.objects.create(user=self.user, exam_set=self.exam_set, exam_type="mcq", set_name="Paid Set")
+        response = self.client.get("/api/exams/sets/", {"exam_type": "mcq"}, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data[0]["is_unlocked"])
+
+
 class ExamSetFeeLockTests(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -8,7 +8,7 @@ from django.conf import settings
 from django.core.mail import send_mail
 from django.db import transaction
 from django.db.models import Avg, Count
-from django.http import FileResponse, HttpResponse
+from django.http import FileResponse
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
@@ -21,6 +21,7 @@ from .import_utils import (
     parse_rows_from_uploaded_file,
 )
 from .exam_file_metadata import build_exam_set_update_payload, extract_exam_rows_and_metadata
+from .content_version import exam_sets_version
 from .dropbox_sync import auto_sync_dropbox_for_branch, clear_question_content_caches
 from .models import (
     ExamAttempt,
@@ -32,7 +33,9 @@ from .models import (
 from .question_normalizers import normalize_exam_question_payload
 from .resources import ExamQuestionResource
 from .serializers import ExamQuestionSerializer, ExamSetSerializer, SubjectiveSubmissionSerializer
-from storage.dropbox_service import download_file, upload_file
+from storage.dropbox_service import upload_file
+from storage.etags import etag_response, not_modified, token_etag
+from storage.file_responses import storage_file_response
 
 if DJANGO_IMPORT_EXPORT_AVAILABLE:
     from tablib import Dataset
@@ -608,13 +611,20 @@ class ExamSetListView(APIView):
         _maybe_sync_exam_sets_on_read(branch=branch, user=request.user, force_refresh=force_refresh)
         _maybe_seed_demo_exam_sets(branch, exam_type)
 
+        # The content version moves on every write the listing shows and unlock state is per user, so a
+        # matching If-None-Match is answered before the exam sets are queried or serialized.
+        etag = token_etag(exam_sets_version(), request.user.pk, branch, exam_type or "")
+        unchanged = not_modified(request, etag)
+        if unchanged is not None:
+            return unchanged
+
         queryset = ExamSet.objects.filter(branch=branch, is_active=True)
         if exam_type:
             queryset = queryset.filter(exam_type=exam_type)
         queryset = queryset.order_by("display_order", "name", "id")
 
         serializer = ExamSetSerializer(queryset, many=True, context={"request": request})
-        return Response(serializer.data)
+        return etag_response(request, serializer.data, etag)
 
 
 class CreateExamSetView(APIView):
@@ -1365,18 +1375,20 @@ class SubjectiveSubmissionFileView(APIView):
                 False,
             )
             try:
-                file_content = download_file(dropbox_path)
+                response = storage_file_response(
+                    request,
+                    dropbox_path,
+                    content_type="application/pdf",
+                    disposition="attachment" if download_requested else "inline",
+                    filename=filename,
+                    cache_control="private, max-age=300",
+                )
             except Exception:
                 return Response({"error": "PDF file not found on server"}, status=status.HTTP_404_NOT_FOUND)
 
             if not submission.dropbox_answer_path:
                 submission.dropbox_answer_path = dropbox_path
                 submission.save(update_fields=["dropbox_answer_path"])
-
-            response = HttpResponse(file_content, content_type="application/pdf")
-            content_disposition = "attachment" if download_requested else "inline"
-            response["Content-Disposition"] = f'{content_disposition}; filename="{filename}"'
-            response["Cache-Control"] = "private, max-age=300"
             return response
 
         response = FileResponse(file_handle, content_type="application/pdf")
@@ -1421,18 +1433,20 @@ class SubjectiveSubmissionReviewedFileView(APIView):
                 True,
             )
             try:
-                file_content = download_file(dropbox_path)
+                response = storage_file_response(
+                    request,
+                    dropbox_path,
+                    content_type="application/pdf",
+                    disposition="attachment" if download_requested else "inline",
+                    filename=filename,
+                    cache_control="private, max-age=300",
+                )
             except Exception:
                 return Response({"error": "Reviewed file not found on server"}, status=status.HTTP_404_NOT_FOUND)
 
             if not submission.dropbox_reviewed_path:
                 submission.dropbox_reviewed_path = dropbox_path
                 submission.save(update_fields=["dropbox_reviewed_path"])
-
-            response = HttpResponse(file_content, content_type="application/pdf")
-            content_disposition = "attachment" if download_requested else "inline"
-            response["Content-Disposition"] = f'{content_disposition}; filename="{filename}"'
-            response["Cache-Control"] = "private, max-age=300"
             return response
 
         response = FileResponse(file_handle, content_type="application/pdf")
@@ -7,7 +7,7 @@ from pathlib import Path
 from django.conf import settings
 from django.core.cache import cache
 from django.db import transaction
-from django.db.models import Max
+from django.db.models import Max, Q
 from rest_framework import status
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
@@ -25,6 +25,7 @@ from .question_normalizers import normalize_mcq_payload
 from .resources import MCQQuestionResource
 from .serializers import MCQQuestionPublicSerializer, MCQQuestionSerializer
 from storage.dropbox_service import delete_file, list_folder_with_metadata, upload_file, _is_supabase_provider
+from storage.etags import cached_payload, etag_response, remember_etag
 from storage.models import FileMetadata
 
 if DJANGO_IMPORT_EXPORT_AVAILABLE:
@@ -289,6 +290,19 @@ def _is_not_found_error(exc):
     return "not_found" in lowered or "path_lookup/not_found" in lowered
 
 
+def _forget_deleted_metadata(report):
+    """Drop FileMetadata for what a delete report removed; objects that failed to delete keep theirs."""
+    removed = Q()
+    for path in [*report.get("deleted", []), *report.get("missing", [])]:
+        removed |= Q(dropbox_path=path) | Q(dropbox_path__startswith=f"{path}/")
+    if not removed:
+        return
+    surviving = Q()
+    for path in report.get("failed", {}):
+        surviving |= Q(dropbox_path=path) | Q(dropbox_path__startswith=f"{path}/")
+    FileMetadata.objects.filter(removed).exclude(surviving).delete()
+
+
 def _objective_subject_root_paths(branch, subject_name):
     return objective_subject_roots(branch, subject_name)
 
@@ -317,6 +331,13 @@ def _can_return_objective_cache(value):
     return True
 
 
+def _objective_list_response(request, cache_key, payload):
+    etag = None
+    if _can_return_objective_cache(payload):
+        etag = remember_etag(cache_key, payload, OBJECTIVE_LIST_CACHE_TTL_SECONDS)
+    return etag_response(request, payload, etag)
+
+
 def _resolve_subject_record(branch, subject_value):
     token = str(subject_value or "").strip()
     if not token:
@@ -423,9 +444,9 @@ class SubjectListView(APIView):
 
         cache_key = _objective_cache_key("subjects", branch)
         if not force_refresh:
-            cached = cache.get(cache_key)
+            cached, cached_etag = cached_payload(cache_key)
             if _can_return_objective_cache(cached):
-                return Response(cached)
+                return etag_response(request, cached, cached_etag)
 
         _maybe_sync_objective_on_read(branch=branch, user=request.user, force_refresh=force_refresh)
         folder_rows = (
@@ -475,7 +496,7 @@ class SubjectListView(APIView):
             )
         )
         cache.set(cache_key, records, timeout=OBJECTIVE_LIST_CACHE_TTL_SECONDS)
-        return Response(records)
+        return _objective_list_response(request, cache_key, records)
 
 
 class ChapterListView(APIView):
@@ -489,9 +510,9 @@ class ChapterListView(APIView):
 
         cache_key = _objective_cache_key("chapters", branch, subject)
         if not force_refresh:
-            cached = cache.get(cache_key)
+            cached, cached_etag = cached_payload(cache_key)
             if _can_return_objective_cache(cached):
-                return Response(cached)
+                return etag_response(request, cached, cached_etag)
 
         _maybe_sync_objective_on_read(branch=branch, user=request.user, force_refresh=force_refresh)
         subject_obj = _resolve_subject_record(branch=branch, subject_value=subject)
@@ -505,7 +526,7 @@ class ChapterListView(APIView):
         )
         payload = list(chapters)
         cache.set(cache_key, payload, timeout=OBJECTIVE_LIST_CACHE_TTL_SECONDS)
-        return Response(payload)
+        return _objective_list_response(request, cache_key, payload)
 
 
 class QuestionListView(APIView):
@@ -531,9 +552,9 @@ class QuestionListView(APIView):
 
         cache_key = _objective_cache_key("questions", branch, subject, chapter, page, page_size)
         if not force_refresh:
-            cached = cache.get(cache_key)
+            cached, cached_etag = cached_payload(cache_key)
             if _can_return_objective_cache(cached):
-                return Response(cached)
+                return etag_response(request, cached, cached_etag)
 
         _maybe_sync_objective_on_read(branch=branch, user=request.user, force_refresh=force_refresh)
 
@@ -566,7 +587,7 @@ class QuestionListView(APIView):
             "results": serializer.data,
         }
         cache.set(cache_key, payload, timeout=OBJECTIVE_LIST_CACHE_TTL_SECONDS)
-        return Response(payload)
+        return _objective_list_response(request, cache_key, payload)
 
 
 class QuestionDetailView(APIView):
@@ -840,13 +861,16 @@ class DeleteChapterView(APIView):
                 matching_paths = _list_matching_chapter_paths(branch, subject_name, chapter.name)
                 for path in matching_paths:
                     try:
-                        delete_file(path)
-                        deleted_paths.append(path)
+                        report = delete_file(path) or {}
+                        _forget_deleted_metadata(report)
+                        source_errors.extend(
+                            f"{key}: {error}" for key, error in report.get("failed", {}).items()
+                        )
+                        if not report.get("failed"):
+                            deleted_paths.append(path)
                     except Exception as exc:
                         if not _is_not_found_error(exc):
                             source_errors.append(str(exc))
-                if deleted_paths:
-                    FileMetadata.objects.filter(dropbox_path__in=deleted_paths).delete()
             except Exception as exc:
                 if not _is_not_found_error(exc):
                     source_errors.append(str(exc))
@@ -882,10 +906,13 @@ class DeleteSubjectView(APIView):
         if delete_source_folder:
             for source_path in source_paths:
                 try:
-                    delete_file(source_path)
-                    source_deleted_paths.append(source_path)
-                    FileMetadata.objects.filter(dropbox_path=source_path).delete()
-                    FileMetadata.objects.filter(dropbox_path__startswith=f"{source_path}/").delete()
+                    report = delete_file(source_path) or {}
+                    _forget_deleted_metadata(report)
+                    source_errors.extend(
+                        f"{key}: {error}" for key, error in report.get("failed", {}).items()
+                    )
+                    if not report.get("failed"):
+                        source_deleted_paths.append(source_path)
                 except Exception as exc:
                     if not _is_not_found_error(exc):
                         source_errors.append(str(exc))
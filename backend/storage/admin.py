@@ -1,10 +1,13 @@
 from urllib.parse import urlencode
 
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.urls import reverse
 from django.utils.html import format_html
 
-from .models import FileMetadata, FileSyncLog, FolderMetadata, PlatformMetrics
+from .dropbox_service import rollback_move
+from .models import FileMetadata, FileSyncLog, FolderMetadata, PlatformMetrics, StorageMoveJournal
+from .search_index import index_files
+from .views import _refresh_derived_metadata
 
 
 def _parent_path(path: str) -> str:
@@ -14,6 +17,11 @@ def _parent_path(path: str) -> str:
     return "/" + "/".join(parts[:-1])
 
 
+def _refresh_selected_roots(queryset):
+    for content_type, branch in queryset.order_by().values_list("content_type", "branch").distinct():
+        _refresh_derived_metadata(content_type, branch)
+
+
 @admin.register(FileMetadata)
 class FileMetadataAdmin(admin.ModelAdmin):
     list_display = (
@@ -36,6 +44,13 @@ class FileMetadataAdmin(admin.ModelAdmin):
     readonly_fields = ("dropbox_path",)
     actions = ("mark_visible", "mark_hidden")
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if {"sort_order", "is_visible"} & set(form.changed_data):
+            _refresh_derived_metadata(obj.content_type, obj.branch, prefix=obj.dropbox_path)
+        if not change or {"name", "display_name"} & set(form.changed_data):
+            index_files(FileMetadata.objects.filter(pk=obj.pk))
+
     @admin.display(description="Parent Folder")
     def parent_folder_link(self, obj):
         parent = _parent_path(getattr(obj, "dropbox_path", ""))
@@ -48,10 +63,12 @@ class FileMetadataAdmin(admin.ModelAdmin):
     @admin.action(description="Show selected files on website")
     def mark_visible(self, request, queryset):
         queryset.update(is_visible=True)
+        _refresh_selected_roots(queryset)
 
     @admin.action(description="Hide selected files on website")
     def mark_hidden(self, request, queryset):
         queryset.update(is_visible=False)
+        _refresh_selected_roots(queryset)
 
 
 @admin.register(FolderMetadata)
@@ -77,6 +94,11 @@ class FolderMetadataAdmin(admin.ModelAdmin):
     actions = ("mark_visible", "mark_hidden")
     ordering = ("branch", "content_type", "depth", "sort_order", "name")
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if {"sort_order", "is_visible"} & set(form.changed_data):
+            _refresh_derived_metadata(obj.content_type, obj.branch, prefix=obj.dropbox_path)
+
     @admin.display(description="Contents")
     def contents_link(self, obj):
         folder_path = str(getattr(obj, "dropbox_path", "") or "").rstrip("/")
@@ -97,10 +119,12 @@ class FolderMetadataAdmin(admin.ModelAdmin):
     @admin.action(description="Show selected folders on website")
     def mark_visible(self, request, queryset):
         queryset.update(is_visible=True)
+        _refresh_selected_roots(queryset)
 
     @admin.action(description="Hide selected folders from website")
     def mark_hidden(self, request, queryset):
         queryset.update(is_visible=False)
+        _refresh_selected_roots(queryset)
 
 
 @admin.register(FileSyncLog)
@@ -109,6 +133,40 @@ class FileSyncLogAdmin(admin.ModelAdmin):
     search_fields = ("branch",)
 
 
+@admin.register(StorageMoveJournal)
+class StorageMoveJournalAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "from_path",
+        "to_path",
+        "status",
+        "moved_count",
+        "failed_count",
+        "elapsed_seconds",
+        "updated_at",
+    )
+    list_filter = ("status",)
+    search_fields = ("from_path", "to_path")
+    readonly_fields = ("entries", "created_at", "updated_at")
+    actions = ("roll_back",)
+
+    @admin.action(description="Roll back selected failed moves")
+    def roll_back(self, request, queryset):
+        # Completed renames have already rewritten metadata and running ones are still being advanced.
+        for journal in queryset.filter(status="failed"):
+            try:
+                report = rollback_move(journal.id)
+            except Exception as exc:
+                self.message_user(request, f"Journal {journal.id}: {exc}", level=messages.ERROR)
+                continue
+            level = messages.WARNING if report["failed"] else messages.SUCCESS
+            self.message_user(
+                request,
+                f"Journal {journal.id}: {report['restored']} of {report['total']} objects restored.",
+                level=level,
+            )
+
+
 @admin.register(PlatformMetrics)
 class PlatformMetricsAdmin(admin.ModelAdmin):
     list_display = (
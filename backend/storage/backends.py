@@ -0,0 +1,552 @@
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connections
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+from django.utils.module_loading import import_string
+
+from storage import disk_cache, dropbox_service, metrics
+
+OPERATIONS = frozenset(
+    {
+        "list_folder",
+        "list_folder_with_metadata",
+        "list_folder_changes",
+        "download_file",
+        "download_file_stream",
+        "get_file_metadata",
+        "upload_file",
+        "delete_file",
+        "search_files",
+        "get_shareable_link",
+        "get_temporary_link",
+        "create_folder",
+        "move_path",
+    }
+)
+# Reads can be repeated safely; writes are left to the provider's own retry rules.
+RETRYABLE_OPERATIONS = frozenset(
+    {
+        "list_folder",
+        "list_folder_with_metadata",
+        "list_folder_changes",
+        "download_file",
+        "download_file_stream",
+        "get_file_metadata",
+        "search_files",
+        "get_shareable_link",
+        "get_temporary_link",
+    }
+)
+DEFAULT_BACKENDS = {
+    "dropbox": "storage.backends.DropboxBackend",
+    "supabase": "storage.backends.SupabaseBackend",
+    "local": "storage.backends.LocalBackend",
+}
+# Retries sit outside the breaker so every attempt counts towards opening it, and an open breaker
+# answers the remaining attempts immediately.
+DEFAULT_MIDDLEWARE = (
+    "storage.backends.MetricsMiddleware",
+    "storage.backends.RetryMiddleware",
+    "storage.backends.CircuitBreakerMiddleware",
+    "storage.backends.DiskCacheMiddleware",
+)
+
+
+class StorageBackend(ABC):
+    """One storage provider; ``call`` dispatches an operation name to the method of the same name.
+
+    Subclasses must implement every abstract operation. The provider-specific code itself still lives in
+    storage.dropbox_service; the backends here adapt it to this interface.
+    """
+
+    name = ""
+
+    def call(self, operation, *args, **kwargs):
+        if operation not in OPERATIONS:
+            raise ValueError(f"Unknown storage operation: {operation}")
+        return getattr(self, operation)(*args, **kwargs)
+
+    def list_folder(self, path):
+        return self.list_folder_with_metadata(path, include_dirs=True, recursive=False)
+
+    @abstractmethod
+    def list_folder_with_metadata(self, path, include_dirs=True, recursive=False):
+        raise NotImplementedError
+
+    def list_folder_changes(self, path, cursor=None):
+        # Providers without a change feed answer every call with a full listing.
+        entries = self.list_folder_with_metadata(path, include_dirs=True, recursive=True)
+        return {"entries": entries, "cursor": "", "reset": True}
+
+    @abstractmethod
+    def download_file(self, path):
+        raise NotImplementedError
+
+    @abstractmethod
+    def download_file_stream(self, path, byte_range=None, if_range=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_file_metadata(self, path):
+        raise NotImplementedError
+
+    @abstractmethod
+    def upload_file(self, path, file_obj):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_file(self, path):
+        raise NotImplementedError
+
+    @abstractmethod
+    def search_files(self, path, query):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_shareable_link(self, path):
+        raise NotImplementedError
+
+    def get_temporary_link(self, path):
+        return self.get_shareable_link(path)
+
+    def create_folder(self, path):
+        return True
+
+    @abstractmethod
+    def move_path(self, from_path, to_path):
+        raise NotImplementedError
+
+
+class SupabaseBackend(StorageBackend):
+    name = "supabase"
+
+    def list_folder_with_metadata(self, path, include_dirs=True, recursive=False):
+        return dropbox_service._supabase_list_folder_with_metadata(path, include_dirs=include_dirs, recursive=recursive)
+
+    def download_file(self, path):
+        return dropbox_service._supabase_download_file(path)
+
+    def download_file_stream(self, path, byte_range=None, if_range=None):
+        return dropbox_service._supabase_download_stream(path, byte_range=byte_range, if_range=if_range)
+
+    def get_file_metadata(self, path):
+        return dropbox_service._supabase_get_file_metadata(path)
+
+    def upload_file(self, path, file_obj):
+        return dropbox_service._supabase_upload_file(path, file_obj)
+
+    def delete_file(self, path):
+        return dropbox_service._supabase_delete_file(path)
+
+    def search_files(self, path, query):
+        return dropbox_service._supabase_search_files(path, query)
+
+    def get_shareable_link(self, path):
+        return dropbox_service._supabase_get_shareable_link(path)
+
+    def get_temporary_link(self, path):
+        return dropbox_service._supabase_get_temporary_link(path)
+
+    def create_folder(self, path):
+        # Supabase folders are implicit; they appear once an object is uploaded below them.
+        return True
+
+    def move_path(self, from_path, to_path):
+        return dropbox_service._supabase_move_path(from_path, to_path)
+
+
+class DropboxBackend(StorageBackend):
+    name = "dropbox"
+
+    def list_folder(self, path):
+        return dropbox_service._dropbox_list_folder(path)
+
+    def list_folder_with_metadata(self, path, include_dirs=True, recursive=False):
+        return dropbox_service._dropbox_list_folder_with_metadata(path, include_dirs=include_dirs, recursive=recursive)
+
+    def list_folder_changes(self, path, cursor=None):
+        return dropbox_service._dropbox_list_folder_changes(path, cursor=cursor)
+
+    def download_file(self, path):
+        return dropbox_service._dropbox_download_file(path)
+
+    def download_file_stream(self, path, byte_range=None, if_range=None):
+        return dropbox_service._dropbox_download_stream(path, byte_range=byte_range, if_range=if_range)
+
+    def get_file_metadata(self, path):
+        return dropbox_service._dropbox_get_file_metadata(path)
+
+    def upload_file(self, path, file_obj):
+        return dropbox_service._dropbox_upload_file(path, file_obj)
+
+    def delete_file(self, path):
+        return dropbox_service._dropbox_delete_file(path)
+
+    def search_files(self, path, query):
+        return dropbox_service._dropbox_search_files(path, query)
+
+    def get_shareable_link(self, path):
+        return dropbox_service._dropbox_get_shareable_link(path)
+
+    def get_temporary_link(self, path):
+        return dropbox_service._dropbox_get_temporary_link(path)
+
+    def create_folder(self, path):
+        return dropbox_service._dropbox_create_folder(path)
+
+    def move_path(self, from_path, to_path):
+        return dropbox_service._dropbox_move_path(from_path, to_path)
+
+
+class LocalBackend(StorageBackend):
+    name = "local"
+
+    def list_folder_with_metadata(self, path, include_dirs=True, recursive=False):
+        return dropbox_service._local_list_folder_with_metadata(path, include_dirs=include_dirs, recursive=recursive)
+
+    def download_file(self, path):
+        return dropbox_service._local_download_file(path)
+
+    def download_file_stream(self, path, byte_range=None, if_range=None):
+        return dropbox_service._local_download_stream(path, byte_range=byte_range, if_range=if_range)
+
+    def get_file_metadata(self, path):
+        return dropbox_service._local_get_file_metadata(path)
+
+    def upload_file(self, path, file_obj):
+        return dropbox_service._local_upload_file(path, file_obj)
+
+    def delete_file(self, path):
+        return dropbox_service._local_delete_file(path)
+
+    def search_files(self, path, query):
+        return dropbox_service._local_search_files(path, query)
+
+    def get_shareable_link(self, path):
+        return dropbox_service._local_get_link(path)
+
+    def create_folder(self, path):
+        return dropbox_service._local_create_folder(path)
+
+    def move_path(self, from_path, to_path):
+        return dropbox_service._local_move_path(from_path, to_path)
+
+
+class StorageMiddleware:
+    """Wraps the next stage of the pipeline; subclasses override ``call`` to act around it."""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.name = inner.name
+
+    def call(self, operation, *args, **kwargs):
+        return self.inner.call(operation, *args, **kwargs)
+
+
+def _payload_size(operation, args, result):
+    if operation == "download_file" and isinstance(result, (bytes, bytearray)):
+        return len(result)
+    if operation == "upload_file" and len(args) > 1:
+        try:
+            return dropbox_service._upload_file_size(args[1]) or 0
+        except Exception:
+            return 0
+    return 0
+
+
+def _counted_chunks(provider, chunks):
+    total = 0
+    try:
+        for chunk in chunks:
+            total += len(chunk)
+            yield chunk
+    finally:
+        metrics.record_bytes(provider, "download_file_stream", total)
+
+
+class MetricsMiddleware(StorageMiddleware):
+    """Feeds storage.metrics: latency histograms, byte counts and error classes per provider and operation."""
+
+    def call(self, operation, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = self.inner.call(operation, *args, **kwargs)
+        except Exception as exc:
+            metrics.record_operation(self.name, operation, time.perf_counter() - started, error=exc)
+            raise
+        metrics.record_operation(
+            self.name,
+            operation,
+            time.perf_counter() - started,
+            byte_count=_payload_size(operation, args, result),
+        )
+        if operation == "download_file_stream" and isinstance(result, dict) and result.get("chunks") is not None:
+            # Streamed bodies are counted as the response is written, not when the call returns.
+            result = {**result, "chunks": _counted_chunks(self.name, result["chunks"])}
+        return result
+
+
+def _retry_attempts():
+    value = getattr(settings, "STORAGE_RETRY_ATTEMPTS", 2)
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return 2
+
+
+def _retry_backoff_seconds():
+    value = getattr(settings, "STORAGE_RETRY_BACKOFF_MS", 100)
+    try:
+        return max(0, int(value)) / 1000
+    except (TypeError, ValueError):
+        return 0.1
+
+
+def _retry_budget_seconds():
+    value = getattr(settings, "STORAGE_RETRY_BUDGET_SECONDS", 10)
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return 10
+
+
+def _is_retryable_error(exc):
+    if isinstance(exc, (dropbox_service.StorageRangeNotSatisfiable, FileNotFoundError, PermissionError, ValueError)):
+        return False
+    lowered = str(exc).lower()
+    return not any(marker in lowered for marker in ("not_found", "not found", "invalid"))
+
+
+class RetryMiddleware(StorageMiddleware):
+    def call(self, operation, *args, **kwargs):
+        if operation not in RETRYABLE_OPERATIONS:
+            return self.inner.call(operation, *args, **kwargs)
+        attempts = _retry_attempts()
+        started = time.monotonic()
+        for attempt in range(attempts + 1):
+            try:
+                return self.inner.call(operation, *args, **kwargs)
+            except dropbox_service.StorageUnavailable:
+                raise
+            except Exception as exc:
+                if attempt >= attempts or not _is_retryable_error(exc):
+                    raise
+                # An attempt that already burnt the budget (a timeout, or the HTTP session's own retries)
+                # is not repeated; fast failures such as connection resets are.
+                if time.monotonic() - started >= _retry_budget_seconds():
+                    raise
+                metrics.record_retry(self.name, operation)
+                time.sleep(_retry_backoff_seconds() * (2**attempt))
+
+
+def _breaker_failure_threshold():
+    value = getattr(settings, "STORAGE_BREAKER_FAILURES", 5)
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return 5
+
+
+def _breaker_reset_seconds():
+    value = getattr(settings, "STORAGE_BREAKER_RESET_SECONDS", 30)
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError):
+        return 30
+
+
+_breakers_lock = threading.Lock()
+_breakers = {}
+
+
+def breaker_states():
+    """Per (provider, operation): "closed", "open" or "half_open" (a recovery probe is in flight)."""
+    with _breakers_lock:
+        return {
+            key: "closed" if state["opened_at"] is None else ("half_open" if state["probing"] else "open")
+            for key, state in _breakers.items()
+        }
+
+
+def reset_breakers():
+    with _breakers_lock:
+        _breakers.clear()
+
+
+class CircuitBreakerMiddleware(StorageMiddleware):
+    """Fails fast with StorageUnavailable after repeated provider failures, until a probe call succeeds.
+
+    Once STORAGE_BREAKER_RESET_SECONDS have passed, a get_file_metadata probe on the caller's path runs on a
+    background thread while callers keep failing fast. The caller's own call is never replayed: streams and
+    sessions it opens would be left unconsumed, and writes would repeat their side effects.
+    """
+
+    def call(self, operation, *args, **kwargs):
+        threshold = _breaker_failure_threshold()
+        if threshold <= 0:
+            return self.inner.call(operation, *args, **kwargs)
+        key = (self.name, operation)
+        with _breakers_lock:
+            state = _breakers.setdefault(key, {"failures": 0, "opened_at": None, "probing": False})
+            if state["opened_at"] is not None:
+                cooling_down = time.monotonic() - state["opened_at"] < _breaker_reset_seconds()
+                if cooling_down or state["probing"]:
+                    raise self._unavailable(operation)
+                state["probing"] = True
+                probe_path = args[0] if args else kwargs.get("path", "")
+                threading.Thread(target=self._probe, args=(operation, probe_path), daemon=True).start()
+                raise self._unavailable(operation)
+
+        try:
+            result = self.inner.call(operation, *args, **kwargs)
+        except Exception as exc:
+            self._record(operation, exc, threshold)
+            raise
+        self._record(operation, None, threshold)
+        return result
+
+    def _unavailable(self, operation):
+        return dropbox_service.StorageUnavailable(f"{self.name} {operation} is failing; circuit breaker is open.")
+
+    def _probe(self, operation, path):
+        try:
+            # Cheap, idempotent and side-effect free; not-found still proves the provider answers.
+            self.inner.call("get_file_metadata", path)
+        except Exception as exc:
+            self._record(operation, exc, _breaker_failure_threshold())
+        else:
+            self._record(operation, None, _breaker_failure_threshold())
+        finally:
+            connections.close_all()
+
+    def _record(self, operation, error, threshold):
+        # Not-found and validation errors mean the provider answered, so they count as healthy calls.
+        failed = error is not None and _is_retryable_error(error)
+        with _breakers_lock:
+            state = _breakers.get((self.name, operation))
+            if state is None:
+                return
+            if not failed:
+                state.update(failures=0, opened_at=None, probing=False)
+                return
+            state["failures"] += 1
+            if state["probing"] or state["failures"] >= threshold:
+                state.update(opened_at=time.monotonic(), probing=False)
+
+
+def _http_date(modified):
+    moment = parse_datetime(str(modified or ""))
+    if moment is None:
+        return ""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=dt_timezone.utc)
+    return http_date(moment.timestamp())
+
+
+class DiskCacheMiddleware(StorageMiddleware):
+    """Serves download_file and download_file_stream from storage.disk_cache and invalidates it on every write."""
+
+    def call(self, operation, *args, **kwargs):
+        if operation == "download_file" and disk_cache.is_enabled():
+            return self._download_file(*args, **kwargs)
+        if operation == "download_file_stream" and disk_cache.is_enabled():
+            return self._download_file_stream(*args, **kwargs)
+        if operation not in {"upload_file", "delete_file", "move_path"}:
+            return self.inner.call(operation, *args, **kwargs)
+        result = self.inner.call(operation, *args, **kwargs)
+        # Entries are keyed by object version, so a failed write cannot leave a stale entry behind; and a
+        # cache directory that cannot be locked must not hide the outcome of a write that succeeded.
+        touched = (args[0], args[1]) if operation == "move_path" else (args[0],)
+        try:
+            disk_cache.invalidate(*touched, descendants=operation != "upload_file")
+        except OSError:
+            pass
+        return result
+
+    def _metadata(self, path):
+        try:
+            return self.inner.call("get_file_metadata", path)
+        except Exception:
+            return None
+
+    def _download_file_stream(self, path, byte_range=None, if_range=None):
+        metadata = self._metadata(path)
+        if not metadata or not disk_cache.fits(metadata.get("size")):
+            return self.inner.call("download_file_stream", path, byte_range=byte_range, if_range=if_range)
+
+        modified, size = metadata.get("modified"), metadata.get("size")
+        # Cached objects carry validators derived from their version, so they stay the same whether a
+        # response comes from disk or from the provider and If-Range keeps working across both.
+        validators = {"etag": disk_cache.version_etag(modified, size), "last_modified": _http_date(modified)}
+        handle = disk_cache.open_entry(path, modified, size)
+        if handle is None:
+            upstream = self.inner.call("download_file_stream", path)
+            chunks = disk_cache.write_through(path, modified, size, upstream["chunks"])
+            if not byte_range:
+                return {**upstream, **validators, "chunks": chunks, "start": None, "end": None}
+            # Fill the cache first so the range can be cut from the stored copy.
+            for _chunk in chunks:
+                pass
+            handle = disk_cache.open_entry(path, modified, size)
+            if handle is None:
+                return self.inner.call("download_file_stream", path, byte_range=byte_range, if_range=if_range)
+
+        total_size = os.fstat(handle.fileno()).st_size
+        stream = {**validators, "start": None, "end": None, "total_size": total_size}
+        if byte_range and dropbox_service._if_range_matches(if_range, validators["etag"], validators["last_modified"]):
+            try:
+                start, end = dropbox_service._resolve_byte_range(byte_range, total_size)
+            except dropbox_service.StorageRangeNotSatisfiable:
+                handle.close()
+                raise
+            stream["start"], stream["end"] = start, end
+            stream["chunks"] = disk_cache.iter_entry(handle, start=start, length=end - start + 1)
+        else:
+            stream["chunks"] = disk_cache.iter_entry(handle)
+        return stream
+
+    def _download_file(self, path):
+        metadata = self._metadata(path)
+        if not metadata:
+            return self.inner.call("download_file", path)
+
+        modified, size = metadata.get("modified"), metadata.get("size")
+        cached = disk_cache.read(path, modified, size)
+        if cached is not None:
+            return cached
+
+        payload = self.inner.call("download_file", path)
+        disk_cache.write(path, modified, size, payload)
+        return payload
+
+
+_pipelines_lock = threading.Lock()
+_pipelines = {}
+
+
+def configured_backends():
+    return {**DEFAULT_BACKENDS, **(getattr(settings, "STORAGE_BACKENDS", None) or {})}
+
+
+def get_storage_backend():
+    """Return the configured provider wrapped in STORAGE_MIDDLEWARE (first entry outermost)."""
+    provider = dropbox_service._storage_provider()
+    backend_path = configured_backends()[provider]
+    middleware = tuple(getattr(settings, "STORAGE_MIDDLEWARE", DEFAULT_MIDDLEWARE) or ())
+    key = (provider, backend_path, middleware)
+    pipeline = _pipelines.get(key)
+    if pipeline is None:
+        with _pipelines_lock:
+            pipeline = _pipelines.get(key)
+            if pipeline is None:
+                pipeline = import_string(backend_path)()
+                for middleware_path in reversed(middleware):
+                    pipeline = import_string(middleware_path)(pipeline)
+                _pipelines[key] = pipeline
+    return pipeline
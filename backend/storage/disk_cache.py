@@ -0,0 +1,288 @@
+import errno
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    try:
+        import msvcrt
+    except ImportError:
+        msvcrt = None
+else:
+    msvcrt = None
+
+_ENTRY_SUFFIX = ".bin"
+_PATH_SUFFIX = ".path"
+_LOCK_NAME = ".lock"
+
+# Directories that could not be created or written to; the cache stays off for them in this process.
+_unwritable_dirs = set()
+_UNWRITABLE_ERRNOS = {errno.EROFS, errno.EACCES, errno.EPERM}
+
+
+def _cache_dir():
+    value = str(getattr(settings, "STORAGE_DISK_CACHE_DIR", "") or "").strip()
+    return Path(value) if value else None
+
+
+def _max_bytes():
+    value = getattr(settings, "STORAGE_DISK_CACHE_MAX_MB", 256)
+    try:
+        return max(0, int(value)) * 1024 * 1024
+    except (TypeError, ValueError):
+        return 0
+
+
+def _writable(directory):
+    key = str(directory)
+    if key in _unwritable_dirs:
+        return False
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+    except OSError:
+        _unwritable_dirs.add(key)
+        return False
+    if not os.access(directory, os.W_OK):
+        _unwritable_dirs.add(key)
+        return False
+    return True
+
+
+def is_enabled():
+    """True when a cache directory is configured, writable and a file lock is available on this platform."""
+    if fcntl is None and msvcrt is None:
+        return False
+    directory = _cache_dir()
+    return directory is not None and _max_bytes() > 0 and _writable(directory)
+
+
+def _normalize_path(path):
+    parts = [segment for segment in str(path or "").strip().replace("\\", "/").split("/") if segment]
+    return ("/" + "/".join(parts)).lower() if parts else ""
+
+
+def _path_digest(path):
+    return hashlib.sha1(_normalize_path(path).encode("utf-8")).hexdigest()
+
+
+def _entry_name(path, modified, size):
+    version = hashlib.sha1(f"{modified}|{size}".encode("utf-8")).hexdigest()[:16]
+    return f"{_path_digest(path)}-{version}{_ENTRY_SUFFIX}"
+
+
+@contextmanager
+def _locked(directory):
+    # flock on a shared file serialises writers across every gunicorn worker on this host.
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / _LOCK_NAME, "a+") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        else:
+            # msvcrt locks a byte range; LK_LOCK retries for ~10s before raising OSError.
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _remove_entries(directory, digest):
+    for entry in directory.glob(f"{digest}-*{_ENTRY_SUFFIX}"):
+        entry.unlink(missing_ok=True)
+
+
+def _evict(directory, budget):
+    entries = []
+    for entry in directory.glob(f"*{_ENTRY_SUFFIX}"):
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry))
+    total = sum(size for _mtime, size, _entry in entries)
+    # Hits refresh mtime, so the oldest mtime is the least recently used entry.
+    for _mtime, size, entry in sorted(entries, key=lambda item: item[0]):
+        if total <= budget:
+            break
+        entry.unlink(missing_ok=True)
+        total -= size
+        digest = entry.name.split("-", 1)[0]
+        if not any(directory.glob(f"{digest}-*{_ENTRY_SUFFIX}")):
+            (directory / f"{digest}{_PATH_SUFFIX}").unlink(missing_ok=True)
+
+
+_READ_CHUNK_SIZE = 64 * 1024
+
+
+def _expected_size(size):
+    try:
+        return int(size)
+    except (TypeError, ValueError):
+        return None
+
+
+def _mark_unwritable(directory, exc):
+    # A read-only mount never fills, so stop paying the metadata round trip in front of every download.
+    if exc.errno in _UNWRITABLE_ERRNOS:
+        _unwritable_dirs.add(str(directory))
+
+
+def fits(size):
+    """True when an object of ``size`` bytes can be cached at all."""
+    expected = _expected_size(size)
+    return expected is not None and expected <= _max_bytes()
+
+
+def version_etag(modified, size):
+    """Strong ETag of one cached object version, the same whether it is served from disk or upstream."""
+    return f'"{hashlib.sha1(f"{modified}|{size}".encode("utf-8")).hexdigest()[:16]}"'
+
+
+def open_entry(path, modified, size):
+    """Open the cached copy of this object version for reading, or return None when it is not cached."""
+    directory = _cache_dir()
+    if directory is None:
+        return None
+    entry = directory / _entry_name(path, modified, size)
+    try:
+        handle = open(entry, "rb")
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(entry)
+    except OSError:
+        pass
+    return handle
+
+
+def iter_entry(handle, start=0, length=None):
+    """Yield ``length`` bytes (or the rest) of an opened entry from ``start``, closing it at the end."""
+    with handle:
+        handle.seek(start)
+        remaining = length
+        while remaining is None or remaining > 0:
+            chunk = handle.read(_READ_CHUNK_SIZE if remaining is None else min(_READ_CHUNK_SIZE, remaining))
+            if not chunk:
+                return
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+def read(path, modified, size):
+    """Return the cached bytes of this object version, or None when it is not cached."""
+    handle = open_entry(path, modified, size)
+    if handle is None:
+        return None
+    with handle:
+        return handle.read()
+
+
+def write(path, modified, size, payload):
+    """Store one object version atomically, replacing older versions and trimming to the byte budget."""
+    for _chunk in write_through(path, modified, size, [payload]):
+        pass
+
+
+def write_through(path, modified, size, chunks):
+    """Yield ``chunks`` unchanged while storing them as this object version.
+
+    The copy is installed only once the stream ends at exactly ``size`` bytes; a stream that is closed
+    early, fails or comes up short leaves nothing behind. Cache errors never interrupt the stream.
+    """
+    directory = _cache_dir()
+    expected = _expected_size(size)
+    if directory is None or not fits(size) or not _writable(directory):
+        yield from chunks
+        return
+    try:
+        handle, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    except OSError as exc:
+        _mark_unwritable(directory, exc)
+        yield from chunks
+        return
+    temp_file = os.fdopen(handle, "wb")
+    written = 0
+    complete = False
+    try:
+        for chunk in chunks:
+            if temp_file is not None:
+                try:
+                    temp_file.write(chunk)
+                except OSError as exc:
+                    _mark_unwritable(directory, exc)
+                    temp_file.close()
+                    temp_file = None
+            written += len(chunk)
+            yield chunk
+        complete = True
+    finally:
+        if not complete:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+        installed = False
+        if temp_file is not None:
+            try:
+                if complete and written == expected:
+                    temp_file.flush()
+                    os.fsync(temp_file.fileno())
+                    temp_file.close()
+                    _install(directory, path, modified, size, temp_path)
+                    installed = True
+            except OSError as exc:
+                _mark_unwritable(directory, exc)
+            finally:
+                temp_file.close()
+        if not installed:
+            Path(temp_path).unlink(missing_ok=True)
+
+
+def _install(directory, path, modified, size, temp_path):
+    digest = _path_digest(path)
+    with _locked(directory):
+        _remove_entries(directory, digest)
+        os.replace(temp_path, directory / _entry_name(path, modified, size))
+        (directory / f"{digest}{_PATH_SUFFIX}").write_text(_normalize_path(path), encoding="utf-8")
+        _evict(directory, _max_bytes())
+
+
+def invalidate(*paths, descendants=True):
+    """Drop cached objects at, or (with ``descendants``) anywhere below, the given storage paths."""
+    directory = _cache_dir()
+    targets = {_normalize_path(path) for path in paths if _normalize_path(path)}
+    if directory is None or not targets or str(directory) in _unwritable_dirs or not directory.is_dir():
+        return
+    with _locked(directory):
+        folders = set()
+        for target in targets:
+            digest = _path_digest(target)
+            sidecar = directory / f"{digest}{_PATH_SUFFIX}"
+            if sidecar.exists():
+                # A cached object is a file, so nothing can be cached below it.
+                _remove_entries(directory, digest)
+                sidecar.unlink(missing_ok=True)
+            elif descendants:
+                folders.add(target)
+        if not folders:
+            return
+        for sidecar in directory.glob(f"*{_PATH_SUFFIX}"):
+            try:
+                cached_path = sidecar.read_text(encoding="utf-8")
+            except OSError:
+                continue
+            if any(cached_path.startswith(f"{folder}/") for folder in folders):
+                _remove_entries(directory, sidecar.name[: -len(_PATH_SUFFIX)])
+                sidecar.unlink(missing_ok=True)
@@ -1,21 +1,72 @@
+import base64
+import hashlib
+import itertools
 import os
+import random
+import shutil
+import tempfile
 import threading
-from urllib.parse import quote
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from urllib.parse import quote, urlencode, urljoin
 
 import dropbox
 import requests
 from django.conf import settings
-from django.db import connection
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.urls import reverse
+from django.utils.http import http_date
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from storage import metrics
+from storage.models import StorageKeyMap, StorageMoveJournal
 
 _DROPBOX_PROVIDER = "dropbox"
 _SUPABASE_PROVIDER = "supabase"
+_LOCAL_PROVIDER = "local"
 _DEFAULT_APP_ROOT = "bridge4ER"
 _SUPABASE_BUCKET_PUBLIC_CACHE_SECONDS = 300
+_STREAM_CHUNK_SIZE = 64 * 1024
+_SIGNED_URL_CACHE_KEY_PREFIX = "storage:signed-url:v1"
+_MOVE_JOURNAL_CHECKPOINT_EVERY = 50
+_MOVE_IN_PROGRESS_MESSAGE = "This path is already being moved; retry once the current move finishes."
+# Supabase's resumable endpoint only accepts 6 MB chunks (the last one may be shorter).
+_SUPABASE_TUS_CHUNK_SIZE = 6 * 1024 * 1024
+
+
+class StorageRangeNotSatisfiable(Exception):
+    """Raised when a requested byte range starts beyond the end of the object."""
+
+    def __init__(self, total_size):
+        super().__init__("Requested range not satisfiable.")
+        self.total_size = total_size
+
+
+class StorageMoveIncomplete(Exception):
+    """Raised when a journaled folder move leaves objects behind; retrying the same rename resumes it."""
+
+    def __init__(self, report):
+        super().__init__(
+            f"Moved {report['moved']} of {report['total']} objects; {report['failed']} failed "
+            f"(move journal {report['journal_id']})."
+        )
+        self.report = report
+
+
+class StorageUnavailable(Exception):
+    """Raised without contacting the provider while its circuit breaker for the operation is open."""
 
 
 def _storage_provider():
     configured = str(getattr(settings, "STORAGE_PROVIDER", _DROPBOX_PROVIDER) or _DROPBOX_PROVIDER).strip().lower()
-    if configured in {_DROPBOX_PROVIDER, _SUPABASE_PROVIDER}:
+    if configured in {_DROPBOX_PROVIDER, _SUPABASE_PROVIDER, _LOCAL_PROVIDER}:
+        return configured
+    if configured in (getattr(settings, "STORAGE_BACKENDS", None) or {}):
         return configured
     return _DROPBOX_PROVIDER
 
@@ -24,6 +75,10 @@ def _is_supabase_provider():
     return _storage_provider() == _SUPABASE_PROVIDER
 
 
+def _is_local_provider():
+    return _storage_provider() == _LOCAL_PROVIDER
+
+
 def _normalize_path(path):
     if not isinstance(path, str):
         return ""
@@ -77,10 +132,41 @@ def _supabase_timeout_seconds():
         return 45
 
 
+def _supabase_operation_timeout(operation):
+    """(connect, read) timeout for one Supabase operation; SUPABASE_OPERATION_TIMEOUTS overrides the read part."""
+    read_timeout = _supabase_timeout_seconds()
+    overrides = getattr(settings, "SUPABASE_OPERATION_TIMEOUTS", None) or {}
+    try:
+        read_timeout = max(1, int(overrides.get(operation, read_timeout)))
+    except (TypeError, ValueError):
+        pass
+    try:
+        connect_timeout = max(1, int(getattr(settings, "SUPABASE_CONNECT_TIMEOUT_SECONDS", 5)))
+    except (TypeError, ValueError):
+        connect_timeout = 5
+    return min(connect_timeout, read_timeout), read_timeout
+
+
 def _supabase_list_api_limit():
     return 1000
 
 
+def _supabase_list_concurrency():
+    value = getattr(settings, "SUPABASE_LIST_CONCURRENCY", 8)
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError):
+        return 8
+
+
+def _supabase_list_deadline_seconds():
+    value = getattr(settings, "SUPABASE_LIST_DEADLINE_SECONDS", 120)
+    try:
+        return max(5, int(value))
+    except (TypeError, ValueError):
+        return 120
+
+
 def _normalize_key(key):
     return str(key or "").strip().replace("\\", "/").strip("/")
 
@@ -157,6 +243,129 @@ def _app_path_from_supabase_key(key):
     return f"/{_DEFAULT_APP_ROOT}/{normalized}"
 
 
+_supabase_key_map_lock = threading.Lock()
+# app path -> canonical key, or "" once StorageKeyMap is known to have no row for the path.
+_supabase_key_map = {}
+_supabase_key_map_generation = None
+_SUPABASE_KEY_MAP_MEMO_LIMIT = 50000
+# Bumped in the shared cache whenever keys are forgotten, so every process drops its memo.
+_SUPABASE_KEY_MAP_GENERATION_KEY = "storage:supabase-key-map:generation"
+
+
+def _key_map_path(path):
+    normalized = _normalize_path(path)
+    return normalized.lower() if normalized not in {"", "/"} else ""
+
+
+def _sync_supabase_key_map_generation():
+    global _supabase_key_map_generation
+    try:
+        generation = cache.get(_SUPABASE_KEY_MAP_GENERATION_KEY, 0)
+    except Exception:
+        return
+    if generation != _supabase_key_map_generation:
+        with _supabase_key_map_lock:
+            _supabase_key_map.clear()
+            _supabase_key_map_generation = generation
+
+
+def _memoize_supabase_keys(entries):
+    with _supabase_key_map_lock:
+        _supabase_key_map.update(entries)
+        # Drop the oldest entries rather than the whole memo, so the hot paths stay cached.
+        overflow = len(_supabase_key_map) - _SUPABASE_KEY_MAP_MEMO_LIMIT
+        for app_path in list(itertools.islice(_supabase_key_map, max(0, overflow))):
+            _supabase_key_map.pop(app_path, None)
+
+
+def _known_supabase_key(path):
+    """Canonical object key recorded for path, from this process's memo or StorageKeyMap; "" when unknown."""
+    app_path = _key_map_path(path)
+    if not app_path:
+        return ""
+    _sync_supabase_key_map_generation()
+    key = _supabase_key_map.get(app_path)
+    if key is None:
+        try:
+            key = StorageKeyMap.objects.filter(app_path=app_path).values_list("storage_key", flat=True).first()
+        except Exception:
+            return ""
+        _memoize_supabase_keys({app_path: key or ""})
+    return key or ""
+
+
+def _remember_supabase_keys(keys):
+    """Record the object keys that really exist, keyed by the app path each one serves.
+
+    Called after uploads and after alias probing had to find a key; keys the memo already holds are
+    skipped, so repeated reads of a known path never write.
+    """
+    pending = {}
+    for key in keys:
+        normalized = _normalize_key(key)
+        if not normalized:
+            continue
+        app_path = _key_map_path(_app_path_from_supabase_key(normalized))
+        existing = pending.get(app_path)
+        if existing is not None and existing != normalized:
+            # Two spellings of one path exist; keep the one alias probing would have found first.
+            order = _supabase_candidate_keys_from_app_path(app_path)
+            rank = {candidate.lower(): index for index, candidate in enumerate(order)}
+            if rank.get(normalized.lower(), len(order)) >= rank.get(existing.lower(), len(order)):
+                continue
+        pending[app_path] = normalized
+    pending = {app_path: key for app_path, key in pending.items() if _supabase_key_map.get(app_path) != key}
+    if not pending:
+        return
+    # The map is only a shortcut; a failed write leaves alias probing in charge.
+    try:
+        with transaction.atomic():
+            StorageKeyMap.objects.bulk_create(
+                [StorageKeyMap(app_path=app_path, storage_key=key) for app_path, key in pending.items()],
+                update_conflicts=True,
+                unique_fields=["app_path"],
+                update_fields=["storage_key", "updated_at"],
+                batch_size=500,
+            )
+    except Exception:
+        return
+    _memoize_supabase_keys(pending)
+
+
+def _forget_supabase_keys(*paths):
+    """Drop recorded keys at, or anywhere below, the given app paths, in the database and in every process."""
+    targets = [app_path for app_path in (_key_map_path(path) for path in paths) if app_path]
+    if not targets:
+        return
+    query = Q()
+    for app_path in targets:
+        query |= Q(app_path=app_path) | Q(app_path__startswith=f"{app_path}/")
+    try:
+        with transaction.atomic():
+            StorageKeyMap.objects.filter(query).delete()
+    except Exception:
+        pass
+    try:
+        cache.incr(_SUPABASE_KEY_MAP_GENERATION_KEY)
+    except ValueError:
+        cache.add(_SUPABASE_KEY_MAP_GENERATION_KEY, 1, timeout=None)
+    except Exception:
+        pass
+    with _supabase_key_map_lock:
+        for app_path in list(_supabase_key_map):
+            if any(app_path == target or app_path.startswith(f"{target}/") for target in targets):
+                _supabase_key_map.pop(app_path, None)
+
+
+def _supabase_resolved_keys(path):
+    """Candidate keys for path with the recorded canonical key first; the aliases behind it only matter on a miss."""
+    candidates = _supabase_candidate_keys_from_app_path(path)
+    known = _known_supabase_key(path)
+    if not known:
+        return candidates
+    return [known, *[candidate for candidate in candidates if candidate != known]]
+
+
 def _supabase_headers(require_service_key=False, content_type=None):
     headers = {}
     service_key = _supabase_service_role_key()
@@ -179,6 +388,49 @@ def _supabase_object_public_url(key):
     return f"{supabase_url}/storage/v1/object/public/{bucket}/{encoded_key}"
 
 
+_supabase_http_lock = threading.Lock()
+_supabase_http_session = None
+
+
+def _build_supabase_http_session():
+    try:
+        pool_size = max(1, int(getattr(settings, "SUPABASE_HTTP_POOL_SIZE", 16)))
+    except (TypeError, ValueError):
+        pool_size = 16
+    try:
+        retries = max(0, int(getattr(settings, "SUPABASE_HTTP_RETRIES", 2)))
+    except (TypeError, ValueError):
+        retries = 2
+    # Connection failures are retried for every verb; read/status retries only for idempotent ones
+    # (urllib3's default allowed_methods excludes POST).
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        raise_on_status=False,
+        respect_retry_after_header=True,
+    )
+    # pool_block keeps the number of open sockets at pool_size when many threads share the session.
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry, pool_block=True)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _supabase_http():
+    """Shared keep-alive session for every Supabase storage request."""
+    global _supabase_http_session
+    if _supabase_http_session is None:
+        with _supabase_http_lock:
+            if _supabase_http_session is None:
+                _supabase_http_session = _build_supabase_http_session()
+    return _supabase_http_session
+
+
 _supabase_bucket_public_lock = threading.Lock()
 _supabase_bucket_public_cached_value = None
 _supabase_bucket_public_checked_at = 0.0
@@ -190,8 +442,6 @@ def _supabase_bucket_is_public():
 
     global _supabase_bucket_public_cached_value, _supabase_bucket_public_checked_at
     with _supabase_bucket_public_lock:
-        import time
-
         current_time = time.time()
         if (
             _supabase_bucket_public_cached_value is not None
@@ -220,16 +470,74 @@ def _coerce_size(value):
         return 0
 
 
+_supabase_hedge_lock = threading.Lock()
+_supabase_hedge_executor = None
+# Below this many samples the p95 is noise; hedge after the configured floor instead.
+_HEDGE_MIN_SAMPLES = 20
+
+
+def _supabase_hedged_reads_enabled():
+    return bool(getattr(settings, "SUPABASE_HEDGED_READS", True))
+
+
+def _supabase_hedge_delay_seconds(operation):
+    value = getattr(settings, "SUPABASE_HEDGE_DELAY_MS", 250)
+    try:
+        floor = max(10, int(value)) / 1000
+    except (TypeError, ValueError):
+        floor = 0.25
+    p95 = metrics.percentile(_SUPABASE_PROVIDER, operation, 0.95, min_samples=_HEDGE_MIN_SAMPLES)
+    return max(floor, p95 or 0)
+
+
+def _supabase_hedge_pool():
+    global _supabase_hedge_executor
+    if _supabase_hedge_executor is None:
+        with _supabase_hedge_lock:
+            if _supabase_hedge_executor is None:
+                _supabase_hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="supabase-hedge")
+    return _supabase_hedge_executor
+
+
+def _supabase_hedged(operation, send):
+    """Run an idempotent Supabase request; if it outlives the operation's p95, race a second copy against it."""
+
+    @metrics.bind_request
+    def attempt():
+        with metrics.observe(_SUPABASE_PROVIDER, operation):
+            return send()
+
+    if not _supabase_hedged_reads_enabled():
+        return attempt()
+    pending = {_supabase_hedge_pool().submit(attempt)}
+    done, pending = wait(pending, timeout=_supabase_hedge_delay_seconds(operation))
+    if not done:
+        metrics.record_hedge(_SUPABASE_PROVIDER, operation)
+        pending.add(_supabase_hedge_pool().submit(attempt))
+    error = None
+    while True:
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+        if not pending:
+            raise error
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+
 def _supabase_object_row_from_api_head(key):
     normalized_key = _normalize_key(key)
     if not normalized_key or not _supabase_url():
         return None
     endpoint = f"{_supabase_url()}/storage/v1/object/{quote(_supabase_bucket(), safe='')}/{quote(normalized_key, safe='/')}"
     try:
-        response = requests.head(
-            endpoint,
-            headers=_supabase_headers(require_service_key=True),
-            timeout=_supabase_timeout_seconds(),
+        response = _supabase_hedged(
+            "head",
+            lambda: _supabase_http().head(
+                endpoint,
+                headers=_supabase_headers(require_service_key=True),
+                timeout=_supabase_operation_timeout("head"),
+            ),
         )
     except Exception:
         return None
@@ -254,11 +562,11 @@ def _supabase_list_api_page(prefix_key="", offset=0):
         "offset": max(0, int(offset or 0)),
         "sortBy": {"column": "name", "order": "asc"},
     }
-    response = requests.post(
+    response = _supabase_http().post(
         endpoint,
         json=payload,
         headers=_supabase_headers(require_service_key=True, content_type="application/json"),
-        timeout=_supabase_timeout_seconds(),
+        timeout=_supabase_operation_timeout("list"),
     )
     response.raise_for_status()
     data = response.json() if response.content else []
@@ -296,6 +604,37 @@ def _supabase_item_modified(item):
     )
 
 
+def _supabase_list_api_prefix(prefix):
+    """List one prefix level (all pages); returns file rows and child folder keys."""
+    normalized_prefix = _normalize_key(prefix)
+    file_rows = []
+    child_prefixes = []
+    offset = 0
+    while True:
+        items = _supabase_list_api_page(normalized_prefix, offset=offset)
+        if not items:
+            break
+        for item in items:
+            name = str((item or {}).get("name") or "").strip().strip("/")
+            if not name:
+                continue
+            key = f"{normalized_prefix}/{name}" if normalized_prefix else name
+            if _supabase_item_is_file(item):
+                file_rows.append(
+                    {
+                        "key": _normalize_key(key),
+                        "size": _supabase_item_size(item),
+                        "modified": _supabase_item_modified(item),
+                    }
+                )
+                continue
+            child_prefixes.append(_normalize_key(key))
+        if len(items) < _supabase_list_api_limit():
+            break
+        offset += _supabase_list_api_limit()
+    return file_rows, child_prefixes
+
+
 def _supabase_query_object_rows_via_api(prefix_key=""):
     normalized_prefix = _normalize_key(prefix_key)
     rows = []
@@ -303,79 +642,156 @@ def _supabase_query_object_rows_via_api(prefix_key=""):
     if exact_row:
         rows.append(exact_row)
 
-    def collect(prefix):
-        offset = 0
-        while True:
-            items = _supabase_list_api_page(prefix, offset=offset)
-            if not items:
-                break
-            for item in items:
-                name = str((item or {}).get("name") or "").strip().strip("/")
-                if not name:
-                    continue
-                key = f"{_normalize_key(prefix)}/{name}".strip("/") if prefix else name
-                if _supabase_item_is_file(item):
-                    rows.append(
-                        {
-                            "key": _normalize_key(key),
-                            "size": _supabase_item_size(item),
-                            "modified": _supabase_item_modified(item),
-                        }
-                    )
-                    continue
-                collect(key)
-            if len(items) < _supabase_list_api_limit():
-                break
-            offset += _supabase_list_api_limit()
-
-    collect(normalized_prefix)
+    # Sibling prefixes are listed concurrently; each finished prefix schedules its children.
+    deadline = time.monotonic() + _supabase_list_deadline_seconds()
+    list_prefix = metrics.bind_request(_supabase_list_api_prefix)
+    executor = ThreadPoolExecutor(max_workers=_supabase_list_concurrency())
+    try:
+        pending = {executor.submit(list_prefix, normalized_prefix)}
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError("Supabase storage listing exceeded the crawl deadline.")
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_rows, child_prefixes = future.result()
+                rows.extend(file_rows)
+                for child_prefix in child_prefixes:
+                    pending.add(executor.submit(list_prefix, child_prefix))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    rows.sort(key=lambda row: row["key"])
     return _dedupe_rows_by_key(rows)
 
 
+# Rows fetched per round trip when streaming the whole bucket from a server-side cursor.
+_SUPABASE_STREAM_BATCH_SIZE = 2000
+
+
+def _each_supabase_bucket_row(consume):
+    """Feed every object of the bucket to ``consume`` in key order, deduplicated in SQL and fetched in batches.
+
+    The transaction and named cursor open and close inside this call (pooled connections cannot hold a
+    named cursor across commits). If the stream fails part way, the REST API listing takes over after
+    the last key already delivered.
+    """
+    state = {"last_key": None, "consuming": False}
+
+    def deliver(row):
+        state["consuming"] = True
+        consume(row)
+        state["consuming"] = False
+        state["last_key"] = row["key"]
+
+    try:
+        with transaction.atomic(), connection.chunked_cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT DISTINCT ON (object_key) object_key, size_text, updated_at
+                FROM (
+                    SELECT btrim(replace(btrim(name), '\\', '/'), '/') COLLATE "C" AS object_key,
+                        metadata->>'size' AS size_text,
+                        updated_at,
+                        name
+                    FROM storage.objects
+                    WHERE bucket_id = %s
+                ) AS bucket_objects
+                WHERE object_key <> ''
+                ORDER BY object_key ASC, name DESC
+                """,
+                [_supabase_bucket()],
+            )
+            while True:
+                batch = cursor.fetchmany(_SUPABASE_STREAM_BATCH_SIZE)
+                if not batch:
+                    return
+                for row in _supabase_rows_from_sql(batch):
+                    deliver(row)
+    except Exception:
+        if state["consuming"]:
+            raise
+    # Byte-ordered ("C") keys sort like Python strings, so everything past last_key is still owed.
+    last_key = state["last_key"]
+    for row in _supabase_query_object_rows_via_api(""):
+        if last_key is None or row["key"] > last_key:
+            deliver(row)
+
+
+def _supabase_rows_from_sql(rows):
+    for row in rows:
+        key = str(row[0] or "").strip()
+        if not key:
+            continue
+        modified_value = row[2].isoformat() if row[2] else ""
+        yield {
+            "key": key,
+            "size": _coerce_size(row[1]),
+            "modified": modified_value,
+        }
+
+
 def _supabase_query_object_rows(prefix_key=""):
+    """Object rows at or below prefix_key, or the whole bucket with no prefix (see _each_supabase_bucket_row)."""
     normalized_prefix = _normalize_key(prefix_key)
+    if not normalized_prefix:
+        rows = []
+        _each_supabase_bucket_row(rows.append)
+        return rows
     try:
         with connection.cursor() as cursor:
-            if normalized_prefix:
-                like_value = f"{normalized_prefix}/%"
-                cursor.execute(
-                    """
-                    SELECT name, metadata->>'size' AS size_text, updated_at
-                    FROM storage.objects
-                    WHERE bucket_id = %s
-                      AND (LOWER(name) = %s OR LOWER(name) LIKE %s)
-                    ORDER BY name ASC
-                    """,
-                    [_supabase_bucket(), normalized_prefix.lower(), like_value.lower()],
-                )
-            else:
-                cursor.execute(
-                    """
-                    SELECT name, metadata->>'size' AS size_text, updated_at
-                    FROM storage.objects
-                    WHERE bucket_id = %s
-                    ORDER BY name ASC
-                    """,
-                    [_supabase_bucket()],
-                )
+            like_value = f"{normalized_prefix}/%"
+            cursor.execute(
+                """
+                SELECT name, metadata->>'size' AS size_text, updated_at
+                FROM storage.objects
+                WHERE bucket_id = %s
+                  AND (LOWER(name) = %s OR LOWER(name) LIKE %s)
+                ORDER BY name ASC
+                """,
+                [_supabase_bucket(), normalized_prefix.lower(), like_value.lower()],
+            )
             rows = cursor.fetchall()
+        return list(_supabase_rows_from_sql(rows))
+    except Exception:
+        return _supabase_query_object_rows_via_api(normalized_prefix)
 
-        normalized_rows = []
-        for row in rows:
-            key = str(row[0] or "").strip()
-            if not key:
-                continue
-            modified_value = row[2].isoformat() if row[2] else ""
-            normalized_rows.append(
-                {
-                    "key": key,
-                    "size": _coerce_size(row[1]),
-                    "modified": modified_value,
-                }
+
+def _supabase_query_object_rows_for_prefixes(prefix_keys):
+    normalized_prefixes = []
+    for prefix_key in prefix_keys:
+        normalized = _normalize_key(prefix_key)
+        if normalized and normalized not in normalized_prefixes:
+            normalized_prefixes.append(normalized)
+    if not normalized_prefixes:
+        return _supabase_query_object_rows(prefix_key="")
+
+    # One statement for every root alias; each OR branch is served by the
+    # (bucket_id, lower(name) text_pattern_ops) index shipped in storage migration 0007.
+    conditions = []
+    params = [_supabase_bucket()]
+    for prefix in normalized_prefixes:
+        conditions.append("LOWER(name) = %s OR LOWER(name) LIKE %s")
+        params.extend([prefix.lower(), f"{prefix}/%".lower()])
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT name, metadata->>'size' AS size_text, updated_at
+                FROM storage.objects
+                WHERE bucket_id = %s
+                  AND ({" OR ".join(conditions)})
+                ORDER BY name ASC
+                """,
+                params,
             )
-        return normalized_rows
+            rows = cursor.fetchall()
+        return _dedupe_rows_by_key(_supabase_rows_from_sql(rows))
     except Exception:
-        return _supabase_query_object_rows_via_api(normalized_prefix)
+        rows = []
+        for prefix in normalized_prefixes:
+            rows.extend(_supabase_query_object_rows_via_api(prefix))
+        return _dedupe_rows_by_key(rows)
 
 
 def _dedupe_rows_by_key(rows):
@@ -388,7 +804,7 @@ def _dedupe_rows_by_key(rows):
             **(row or {}),
             "key": key,
         }
-    return list(deduped.values())
+    return sorted(deduped.values(), key=lambda row: row["key"])
 
 
 def _relative_for_prefix(key, prefix):
@@ -416,78 +832,74 @@ def _matching_destination_key(source_key, destination_candidates):
 
 
 def _first_existing_key(candidates):
-    normalized_candidates = [_normalize_key(item) for item in candidates if _normalize_key(item)]
+    normalized_candidates = []
+    for item in candidates:
+        normalized = _normalize_key(item)
+        if normalized and normalized not in normalized_candidates:
+            normalized_candidates.append(normalized)
     if not normalized_candidates:
         return ""
     try:
         with connection.cursor() as cursor:
-            for candidate in normalized_candidates:
-                cursor.execute(
-                    """
-                    SELECT 1
-                    FROM storage.objects
-                    WHERE bucket_id = %s AND LOWER(name) = %s
-                    LIMIT 1
-                    """,
-                    [_supabase_bucket(), candidate.lower()],
-                )
-                if cursor.fetchone():
-                    return candidate
-            for candidate in normalized_candidates:
-                like_value = f"{candidate}/%"
-                cursor.execute(
-                    """
-                    SELECT 1
-                    FROM storage.objects
-                    WHERE bucket_id = %s AND LOWER(name) LIKE %s
-                    LIMIT 1
-                    """,
-                    [_supabase_bucket(), like_value.lower()],
-                )
-                if cursor.fetchone():
-                    return candidate
+            # Exact object matches win over folder-prefix matches; ties go to candidate order.
+            # The ~>=~ / ~<~ range ('/' .. '0') is the index-friendly form of LIKE 'key/%'.
+            cursor.execute(
+                """
+                SELECT ranked.ord
+                FROM (
+                    SELECT candidate.ord,
+                        CASE
+                            WHEN EXISTS (
+                                SELECT 1 FROM storage.objects o
+                                WHERE o.bucket_id = %s AND LOWER(o.name) = candidate.key
+                            ) THEN 0
+                            WHEN EXISTS (
+                                SELECT 1 FROM storage.objects o
+                                WHERE o.bucket_id = %s
+                                  AND LOWER(o.name) ~>=~ (candidate.key || '/')
+                                  AND LOWER(o.name) ~<~ (candidate.key || '0')
+                            ) THEN 1
+                        END AS match_rank
+                    FROM unnest(%s::text[]) WITH ORDINALITY AS candidate(key, ord)
+                ) ranked
+                WHERE ranked.match_rank IS NOT NULL
+                ORDER BY ranked.match_rank, ranked.ord
+                LIMIT 1
+                """,
+                [
+                    _supabase_bucket(),
+                    _supabase_bucket(),
+                    [candidate.lower() for candidate in normalized_candidates],
+                ],
+            )
+            row = cursor.fetchone()
+        if row:
+            return normalized_candidates[int(row[0]) - 1]
     except Exception:
+        rows = _supabase_query_object_rows_for_prefixes(normalized_candidates)
+        lowered_keys = [str(row.get("key") or "").lower() for row in rows]
+        for candidate in normalized_candidates:
+            if candidate.lower() in lowered_keys:
+                return candidate
         for candidate in normalized_candidates:
-            rows = _supabase_query_object_rows(candidate)
-            candidate_lower = candidate.lower()
-            if any(
-                str(row.get("key") or "").lower() == candidate_lower
-                or str(row.get("key") or "").lower().startswith(f"{candidate_lower}/")
-                for row in rows
-            ):
+            folder_prefix = f"{candidate.lower()}/"
+            if any(key.startswith(folder_prefix) for key in lowered_keys):
                 return candidate
     return ""
 
 
 def _supabase_list_folder_with_metadata(path, include_dirs=True, recursive=False):
     prefix_candidates = _supabase_candidate_keys_from_app_path(path)
-    if prefix_candidates:
-        rows = []
-        for prefix_key in prefix_candidates:
-            rows.extend(_supabase_query_object_rows(prefix_key=prefix_key))
-        rows = _dedupe_rows_by_key(rows)
-    else:
-        rows = _supabase_query_object_rows(prefix_key="")
     entries = []
-    dir_seen = set()
-
-    def add_dir(dir_key):
-        normalized_dir = str(dir_key or "").strip("/")
-        if not normalized_dir or normalized_dir in dir_seen:
-            return
-        dir_seen.add(normalized_dir)
-        entries.append(
-            {
-                "name": normalized_dir.split("/")[-1],
-                "path": _app_path_from_supabase_key(normalized_dir),
-                "is_dir": True,
-            }
-        )
+    # Rows arrive in key order, so every key below a folder is contiguous: a folder is new exactly when
+    # the previous row did not have it as an ancestor, and only that row's ancestors need remembering.
+    previous_dirs = set()
 
-    for row in rows:
+    def add_row(row):
+        nonlocal previous_dirs
         key = _normalize_key(row.get("key"))
         if not key:
-            continue
+            return
 
         matched_prefix = ""
         relative = None
@@ -500,49 +912,50 @@ def _supabase_list_folder_with_metadata(path, include_dirs=True, recursive=False
                 relative = candidate_relative
                 break
             if relative is None:
-                continue
+                return
         else:
             relative = key
 
+        file_entry = {
+            "name": key.split("/")[-1],
+            "path": _app_path_from_supabase_key(key),
+            "size": int(row["size"]),
+            "modified": row["modified"],
+            "is_dir": False,
+        }
         if relative == "":
-            entries.append(
-                {
-                    "name": key.split("/")[-1],
-                    "path": _app_path_from_supabase_key(key),
-                    "size": int(row["size"]),
-                    "modified": row["modified"],
-                    "is_dir": False,
-                }
-            )
-            continue
+            entries.append(file_entry)
+            return
 
         segments = [segment for segment in relative.split("/") if segment]
         if not segments:
-            continue
-
-        if not recursive and len(segments) > 1:
-            if include_dirs:
-                first_level = segments[0]
-                dir_key = f"{matched_prefix}/{first_level}" if matched_prefix else first_level
-                add_dir(dir_key)
-            continue
+            return
 
-        if include_dirs and recursive and len(segments) > 1:
-            for depth in range(1, len(segments)):
+        depth_limit = len(segments) if recursive else min(2, len(segments))
+        row_dirs = []
+        if include_dirs:
+            for depth in range(1, depth_limit):
                 sub_path = "/".join(segments[:depth])
-                dir_key = f"{matched_prefix}/{sub_path}" if matched_prefix else sub_path
-                add_dir(dir_key)
+                row_dirs.append(f"{matched_prefix}/{sub_path}" if matched_prefix else sub_path)
+        for dir_key in row_dirs:
+            if dir_key not in previous_dirs:
+                entries.append(
+                    {
+                        "name": dir_key.split("/")[-1],
+                        "path": _app_path_from_supabase_key(dir_key),
+                        "is_dir": True,
+                    }
+                )
+        previous_dirs = set(row_dirs)
 
-        entries.append(
-            {
-                "name": key.split("/")[-1],
-                "path": _app_path_from_supabase_key(key),
-                "size": int(row["size"]),
-                "modified": row["modified"],
-                "is_dir": False,
-            }
-        )
+        if recursive or len(segments) == 1:
+            entries.append(file_entry)
 
+    if prefix_candidates:
+        for row in _supabase_query_object_rows_for_prefixes(prefix_candidates):
+            add_row(row)
+    else:
+        _each_supabase_bucket_row(add_row)
     entries.sort(key=lambda item: str(item.get("modified") or ""), reverse=True)
     return entries
 
@@ -557,13 +970,20 @@ def _supabase_create_signed_url(key, expires_in=None):
     ttl = _supabase_signed_ttl_seconds() if expires_in is None else max(60, int(expires_in))
     bucket = quote(_supabase_bucket(), safe="")
     endpoint = f"{supabase_url}/storage/v1/object/sign/{bucket}/{quote(str(key or '').strip(), safe='/')}"
-    response = requests.post(
-        endpoint,
-        json={"expiresIn": ttl},
-        headers=_supabase_headers(require_service_key=True, content_type="application/json"),
-        timeout=_supabase_timeout_seconds(),
-    )
-    response.raise_for_status()
+    headers = _supabase_headers(require_service_key=True, content_type="application/json")
+
+    def send():
+        response = _supabase_http().post(
+            endpoint,
+            json={"expiresIn": ttl},
+            headers=headers,
+            timeout=_supabase_operation_timeout("sign"),
+        )
+        response.raise_for_status()
+        return response
+
+    # Signing is idempotent and runs inside several public operations, so it is hedged and timed on its own.
+    response = _supabase_hedged("sign", send)
     payload = response.json() if response.content else {}
     signed_path = payload.get("signedURL") or payload.get("signedUrl") or ""
     if not signed_path:
@@ -575,21 +995,93 @@ def _supabase_create_signed_url(key, expires_in=None):
     return f"{supabase_url}/storage/v1/{signed_path}"
 
 
+def _signed_url_cache_key(key):
+    digest = hashlib.sha1(f"{_supabase_bucket()}|{_normalize_key(key)}".encode("utf-8")).hexdigest()
+    return f"{_SIGNED_URL_CACHE_KEY_PREFIX}:{digest}"
+
+
+_signed_url_flights_lock = threading.Lock()
+_signed_url_flights = {}
+
+
+def _single_flight(flight_key, producer):
+    """Run producer once per flight_key in this process; concurrent callers wait for and share its outcome.
+
+    Waiters re-raise the leader's error instead of retrying it. If the leader outlives the request
+    timeout, the first waiter to notice retires that flight and leads a new one for the rest.
+    """
+    while True:
+        with _signed_url_flights_lock:
+            flight = _signed_url_flights.get(flight_key)
+            if flight is None:
+                flight = {"done": threading.Event(), "result": None, "error": None}
+                _signed_url_flights[flight_key] = flight
+                break
+        if not flight["done"].wait(timeout=_supabase_timeout_seconds()):
+            with _signed_url_flights_lock:
+                if _signed_url_flights.get(flight_key) is flight:
+                    _signed_url_flights.pop(flight_key)
+            continue
+        if flight["error"] is not None:
+            raise flight["error"]
+        return flight["result"]
+    try:
+        flight["result"] = producer()
+        return flight["result"]
+    except Exception as exc:
+        flight["error"] = exc
+        raise
+    finally:
+        with _signed_url_flights_lock:
+            if _signed_url_flights.get(flight_key) is flight:
+                _signed_url_flights.pop(flight_key)
+        flight["done"].set()
+
+
+def _supabase_cached_signed_url(key, expires_in=None):
+    """Signed URL for key, reused until half of its lifetime is left so callers always get a usable link."""
+    normalized_key = _normalize_key(key)
+    requested_ttl = _supabase_signed_ttl_seconds() if expires_in is None else max(60, int(expires_in))
+    ttl = max(requested_ttl, _supabase_signed_ttl_seconds())
+    cache_key = _signed_url_cache_key(normalized_key)
+    cached_url = cache.get(cache_key)
+    if cached_url:
+        return cached_url
+
+    def mint():
+        # Another worker may have minted it while this one waited for the flight.
+        existing = cache.get(cache_key)
+        if existing:
+            return existing
+        signed_url = _supabase_create_signed_url(normalized_key, expires_in=ttl)
+        cache.set(cache_key, signed_url, timeout=max(30, ttl - max(60, ttl // 2)))
+        return signed_url
+
+    return _single_flight(cache_key, mint)
+
+
+def _evict_signed_urls(*keys):
+    cache_keys = [_signed_url_cache_key(key) for key in keys if _normalize_key(key)]
+    if cache_keys:
+        cache.delete_many(cache_keys)
+
+
 def _supabase_download_file(path):
-    candidate_keys = _supabase_candidate_keys_from_app_path(path)
+    candidate_keys = _supabase_resolved_keys(path)
     if not candidate_keys:
         raise RuntimeError("Invalid storage path.")
 
-    timeout = _supabase_timeout_seconds()
+    timeout = _supabase_operation_timeout("download")
     last_error = None
     if _supabase_bucket_is_public():
         for key in candidate_keys:
             try:
                 url = _supabase_object_public_url(key)
-                response = requests.get(url, timeout=timeout)
+                response = _supabase_http().get(url, timeout=timeout)
                 if response.status_code == 404:
                     continue
                 response.raise_for_status()
+                _remember_supabase_keys([key])
                 return response.content
             except Exception as exc:
                 last_error = exc
@@ -597,11 +1089,12 @@ def _supabase_download_file(path):
     else:
         for key in candidate_keys:
             try:
-                signed_url = _supabase_create_signed_url(key, expires_in=120)
-                response = requests.get(signed_url, timeout=timeout)
+                signed_url = _supabase_cached_signed_url(key, expires_in=120)
+                response = _supabase_http().get(signed_url, timeout=timeout)
                 if response.status_code == 404:
                     continue
                 response.raise_for_status()
+                _remember_supabase_keys([key])
                 return response.content
             except Exception as exc:
                 last_error = exc
@@ -612,55 +1105,196 @@ def _supabase_download_file(path):
     raise RuntimeError("File not found in Supabase storage.")
 
 
-def _supabase_get_file_metadata(path):
-    candidate_keys = _supabase_candidate_keys_from_app_path(path)
-    if not candidate_keys:
-        return None
+def _range_header_value(byte_range):
+    start, end = byte_range
+    return f"bytes={'' if start is None else int(start)}-{'' if end is None else int(end)}"
+
+
+def _resolve_byte_range(byte_range, total_size):
+    """Turn a parsed (start, end) pair into absolute inclusive offsets for an object of total_size."""
+    start, end = byte_range
+    total_size = int(total_size or 0)
+    if start is None:
+        suffix_length = int(end or 0)
+        if suffix_length <= 0 or total_size <= 0:
+            raise StorageRangeNotSatisfiable(total_size)
+        return max(0, total_size - suffix_length), total_size - 1
+    if start >= total_size:
+        raise StorageRangeNotSatisfiable(total_size)
+    last = total_size - 1 if end is None else min(int(end), total_size - 1)
+    return int(start), last
+
+
+def _parse_content_range(value):
+    # "bytes 0-99/1234" or "bytes 0-99/*"
     try:
-        with connection.cursor() as cursor:
-            for key in candidate_keys:
-                cursor.execute(
-                    """
-                    SELECT name, metadata->>'size' AS size_text, updated_at
-                    FROM storage.objects
-                    WHERE bucket_id = %s AND LOWER(name) = %s
-                    LIMIT 1
-                    """,
-                    [_supabase_bucket(), key.lower()],
-                )
-                row = cursor.fetchone()
-                if not row:
-                    continue
-                return {
-                    "name": str(row[0]).split("/")[-1],
-                    "path": _app_path_from_supabase_key(row[0]),
-                    "size": _coerce_size(row[1]),
-                    "modified": row[2].isoformat() if row[2] else "",
-                }
-    except Exception:
-        for key in candidate_keys:
-            row = _supabase_object_row_from_api_head(key)
-            if not row:
-                continue
-            return {
-                "name": str(row["key"]).split("/")[-1],
-                "path": _app_path_from_supabase_key(row["key"]),
-                "size": _coerce_size(row.get("size")),
-                "modified": row.get("modified") or "",
-            }
-    return None
+        unit, _, spec = str(value or "").strip().partition(" ")
+        if unit.lower() != "bytes":
+            return None
+        span, _, total = spec.partition("/")
+        first, _, last = span.partition("-")
+        return int(first), int(last), (None if total.strip() == "*" else int(total))
+    except (TypeError, ValueError):
+        return None
 
 
-def _supabase_search_files(path, query):
-    cleaned_query = str(query or "").strip().lower()
-    if not cleaned_query:
-        return []
-    prefix_candidates = _supabase_candidate_keys_from_app_path(path)
+def _if_range_matches(if_range, etag, last_modified):
+    value = str(if_range or "").strip()
+    if not value:
+        return True
+    if value.startswith('"') or value.startswith("W/"):
+        # Weak validators never satisfy If-Range.
+        return bool(etag) and not value.startswith("W/") and value == etag
+    return bool(last_modified) and value == last_modified
 
-    rows = []
+
+def _iter_response_chunks(response, skip=0, limit=None, chunk_size=_STREAM_CHUNK_SIZE):
+    remaining = limit
     try:
-        with connection.cursor() as cursor:
-            if prefix_candidates:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            if not chunk:
+                continue
+            if skip:
+                if len(chunk) <= skip:
+                    skip -= len(chunk)
+                    continue
+                chunk = chunk[skip:]
+                skip = 0
+            if remaining is not None:
+                if remaining <= 0:
+                    break
+                chunk = chunk[:remaining]
+                remaining -= len(chunk)
+            yield chunk
+            if remaining is not None and remaining <= 0:
+                break
+    finally:
+        response.close()
+
+
+def _supabase_stream_response(url, byte_range=None, if_range=None, timeout=None):
+    headers = {"Range": _range_header_value(byte_range)} if byte_range else {}
+    if byte_range and if_range:
+        # The validator came from this upstream's own ETag/Last-Modified, so it can decide in one round trip.
+        headers["If-Range"] = if_range
+    response = _supabase_http().get(url, headers=headers, stream=True, timeout=timeout)
+    if response.status_code == 206 and if_range and not _if_range_matches(
+        if_range,
+        response.headers.get("ETag", ""),
+        response.headers.get("Last-Modified", ""),
+    ):
+        # Only reached when a proxy in front of the bucket ignored If-Range.
+        response.close()
+        response = _supabase_http().get(url, stream=True, timeout=timeout)
+    return response
+
+
+def _supabase_download_stream(path, byte_range=None, if_range=None):
+    candidate_keys = _supabase_resolved_keys(path)
+    if not candidate_keys:
+        raise RuntimeError("Invalid storage path.")
+
+    timeout = _supabase_operation_timeout("download")
+    bucket_public = _supabase_bucket_is_public()
+    last_error = None
+    for key in candidate_keys:
+        try:
+            if bucket_public:
+                url = _supabase_object_public_url(key)
+            else:
+                url = _supabase_cached_signed_url(key, expires_in=120)
+            response = _supabase_stream_response(url, byte_range=byte_range, if_range=if_range, timeout=timeout)
+        except Exception as exc:
+            last_error = exc
+            continue
+        if response.status_code == 404:
+            response.close()
+            continue
+        if response.status_code == 416:
+            # Unsatisfied ranges report the full length as "bytes */<size>".
+            total_size = _coerce_size(str(response.headers.get("Content-Range", "")).rpartition("/")[2])
+            response.close()
+            raise StorageRangeNotSatisfiable(total_size)
+        try:
+            response.raise_for_status()
+        except Exception as exc:
+            response.close()
+            last_error = exc
+            continue
+
+        stream = {
+            "chunks": _iter_response_chunks(response),
+            "etag": response.headers.get("ETag", ""),
+            "last_modified": response.headers.get("Last-Modified", ""),
+            "start": None,
+            "end": None,
+            "total_size": None,
+        }
+        content_range = _parse_content_range(response.headers.get("Content-Range"))
+        if response.status_code == 206 and content_range:
+            stream["start"], stream["end"], stream["total_size"] = content_range
+        elif response.headers.get("Content-Length") and not response.headers.get("Content-Encoding"):
+            # requests decodes compressed bodies, so only an unencoded length matches the streamed bytes.
+            stream["total_size"] = _coerce_size(response.headers.get("Content-Length"))
+        _remember_supabase_keys([key])
+        return stream
+
+    if last_error:
+        raise last_error
+    raise RuntimeError("File not found in Supabase storage.")
+
+
+def _supabase_get_file_metadata(path):
+    candidate_keys = _supabase_resolved_keys(path)
+    if not candidate_keys:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT name, metadata->>'size' AS size_text, updated_at
+                FROM storage.objects
+                WHERE bucket_id = %s AND LOWER(name) = ANY(%s)
+                """,
+                [_supabase_bucket(), [key.lower() for key in candidate_keys]],
+            )
+            rows_by_key = {str(row[0] or "").lower(): row for row in cursor.fetchall()}
+        for key in candidate_keys:
+            row = rows_by_key.get(key.lower())
+            if not row:
+                continue
+            _remember_supabase_keys([row[0]])
+            return {
+                "name": str(row[0]).split("/")[-1],
+                "path": _app_path_from_supabase_key(row[0]),
+                "size": _coerce_size(row[1]),
+                "modified": row[2].isoformat() if row[2] else "",
+            }
+    except Exception:
+        for key in candidate_keys:
+            row = _supabase_object_row_from_api_head(key)
+            if not row:
+                continue
+            _remember_supabase_keys([row["key"]])
+            return {
+                "name": str(row["key"]).split("/")[-1],
+                "path": _app_path_from_supabase_key(row["key"]),
+                "size": _coerce_size(row.get("size")),
+                "modified": row.get("modified") or "",
+            }
+    return None
+
+
+def _supabase_search_files(path, query):
+    cleaned_query = str(query or "").strip().lower()
+    if not cleaned_query:
+        return []
+    prefix_candidates = _supabase_candidate_keys_from_app_path(path)
+
+    rows = []
+    try:
+        with connection.cursor() as cursor:
+            if prefix_candidates:
                 for prefix in prefix_candidates:
                     like_prefix = f"{prefix}/%"
                     cursor.execute(
@@ -688,17 +1322,12 @@ def _supabase_search_files(path, query):
                 )
                 rows = cursor.fetchall()
     except Exception:
-        object_rows = []
-        if prefix_candidates:
-            for prefix in prefix_candidates:
-                object_rows.extend(_supabase_query_object_rows(prefix))
-        else:
-            object_rows = _supabase_query_object_rows("")
         entries = []
-        for row in _dedupe_rows_by_key(object_rows):
+
+        def add_match(row):
             key = _normalize_key(row.get("key"))
             if not key or cleaned_query not in key.lower():
-                continue
+                return
             entries.append(
                 {
                     "name": key.split("/")[-1],
@@ -707,6 +1336,16 @@ def _supabase_search_files(path, query):
                     "modified": row.get("modified") or "",
                 }
             )
+
+        if prefix_candidates:
+            object_rows = []
+            for prefix in prefix_candidates:
+                object_rows.extend(_supabase_query_object_rows(prefix))
+            for row in _dedupe_rows_by_key(object_rows):
+                add_match(row)
+        else:
+            # Filter as the bucket streams past so only the matches are ever held.
+            _each_supabase_bucket_row(add_match)
         entries.sort(key=lambda item: str(item.get("modified") or ""), reverse=True)
         return entries
 
@@ -731,8 +1370,109 @@ def _supabase_search_files(path, query):
     return entries
 
 
+def _upload_file_size(file_obj):
+    size = getattr(file_obj, "size", None)
+    if size is not None:
+        return int(size)
+    try:
+        position = file_obj.tell()
+        file_obj.seek(0, os.SEEK_END)
+        size = file_obj.tell()
+        file_obj.seek(position)
+        return int(size)
+    except Exception:
+        return None
+
+
+def _rewind_upload(file_obj, offset=0):
+    if hasattr(file_obj, "seek"):
+        try:
+            file_obj.seek(offset)
+        except Exception:
+            if offset:
+                raise
+
+
+def _iter_upload_chunks(file_obj, chunk_size, offset=0):
+    _rewind_upload(file_obj, offset)
+    while True:
+        chunk = file_obj.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _supabase_upload_resume_attempts():
+    value = getattr(settings, "SUPABASE_UPLOAD_RESUME_ATTEMPTS", 3)
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return 3
+
+
+def _supabase_tus_headers(**extra):
+    headers = _supabase_headers(require_service_key=True)
+    headers["Tus-Resumable"] = "1.0.0"
+    headers.update(extra)
+    return headers
+
+
+def _supabase_tus_metadata(key, content_type):
+    fields = {"bucketName": _supabase_bucket(), "objectName": key, "contentType": content_type}
+    return ",".join(f"{name} {base64.b64encode(value.encode('utf-8')).decode('ascii')}" for name, value in fields.items())
+
+
+def _supabase_resumable_upload(key, file_obj, size, content_type):
+    """Upload through Supabase's TUS endpoint, resuming from the server's offset after a failed chunk."""
+    endpoint = f"{_supabase_url()}/storage/v1/upload/resumable"
+    response = _supabase_http().post(
+        endpoint,
+        headers=_supabase_tus_headers(
+            **{
+                "Upload-Length": str(size),
+                "Upload-Metadata": _supabase_tus_metadata(key, content_type),
+                "x-upsert": "true",
+            }
+        ),
+        timeout=_supabase_operation_timeout("upload"),
+    )
+    response.raise_for_status()
+    upload_url = urljoin(endpoint, response.headers.get("Location", ""))
+
+    offset = 0
+    attempts_left = _supabase_upload_resume_attempts()
+    while offset < size:
+        _rewind_upload(file_obj, offset)
+        chunk = file_obj.read(_SUPABASE_TUS_CHUNK_SIZE)
+        if not chunk:
+            raise RuntimeError("Upload source ended before its declared size.")
+        try:
+            response = _supabase_http().patch(
+                upload_url,
+                data=chunk,
+                headers=_supabase_tus_headers(
+                    **{"Upload-Offset": str(offset), "Content-Type": "application/offset+octet-stream"}
+                ),
+                timeout=_supabase_operation_timeout("upload"),
+            )
+            response.raise_for_status()
+            offset = int(response.headers.get("Upload-Offset", offset + len(chunk)))
+        except (requests.RequestException, ValueError):
+            if attempts_left <= 0:
+                raise
+            attempts_left -= 1
+            status = _supabase_http().head(
+                upload_url,
+                headers=_supabase_tus_headers(),
+                timeout=_supabase_operation_timeout("head"),
+            )
+            status.raise_for_status()
+            offset = int(status.headers.get("Upload-Offset", offset))
+
+
 def _supabase_upload_file(path, file_obj):
-    candidate_keys = _supabase_candidate_keys_from_app_path(path)
+    # Replacing a file writes to the spelling it already has instead of creating a second alias.
+    candidate_keys = _supabase_resolved_keys(path)
     key = candidate_keys[0] if candidate_keys else ""
     if not key:
         raise RuntimeError("Invalid upload path.")
@@ -741,11 +1481,14 @@ def _supabase_upload_file(path, file_obj):
     if not _supabase_service_role_key():
         raise RuntimeError("SUPABASE_SERVICE_ROLE_KEY is required for uploads to a private bucket.")
 
-    if hasattr(file_obj, "seek"):
-        try:
-            file_obj.seek(0)
-        except Exception:
-            pass
+    content_type = getattr(file_obj, "content_type", None) or "application/octet-stream"
+    size = _upload_file_size(file_obj)
+    if size is not None and size > _SUPABASE_TUS_CHUNK_SIZE:
+        _supabase_resumable_upload(key, file_obj, size, content_type)
+        _evict_signed_urls(key)
+        return _supabase_get_file_metadata(path)
+
+    _rewind_upload(file_obj)
     payload = file_obj.read()
     if payload is None:
         payload = b""
@@ -753,28 +1496,76 @@ def _supabase_upload_file(path, file_obj):
     endpoint = f"{_supabase_url()}/storage/v1/object/{quote(_supabase_bucket(), safe='')}/{quote(key, safe='/')}"
     headers = _supabase_headers(require_service_key=True)
     headers["x-upsert"] = "true"
-    content_type = getattr(file_obj, "content_type", None) or "application/octet-stream"
     headers["Content-Type"] = content_type
 
-    response = requests.post(endpoint, data=payload, headers=headers, timeout=_supabase_timeout_seconds())
+    response = _supabase_http().post(
+        endpoint,
+        data=payload,
+        headers=headers,
+        timeout=_supabase_operation_timeout("upload"),
+    )
     response.raise_for_status()
     metadata = _supabase_get_file_metadata(path)
     return metadata
 
 
-def _supabase_delete_object_key(object_key):
-    endpoint = (
-        f"{_supabase_url()}/storage/v1/object/{quote(_supabase_bucket(), safe='')}/{quote(object_key, safe='/')}"
-    )
-    response = requests.delete(
-        endpoint,
-        headers=_supabase_headers(require_service_key=True),
-        timeout=_supabase_timeout_seconds(),
-    )
-    if response.status_code in {200, 202, 204, 404}:
-        return True
+def _supabase_delete_batch_size():
+    value = getattr(settings, "SUPABASE_DELETE_BATCH_SIZE", 100)
+    try:
+        return min(1000, max(1, int(value)))
+    except (TypeError, ValueError):
+        return 100
+
+
+def _supabase_batch_concurrency():
+    value = getattr(settings, "SUPABASE_BATCH_CONCURRENCY", 4)
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError):
+        return 4
+
+
+def _supabase_delete_object_batch(object_keys):
+    """Remove one batch of keys with the multi-object endpoint and return the keys Supabase removed."""
+    endpoint = f"{_supabase_url()}/storage/v1/object/{quote(_supabase_bucket(), safe='')}"
+    try:
+        response = _supabase_http().delete(
+            endpoint,
+            json={"prefixes": list(object_keys)},
+            headers=_supabase_headers(require_service_key=True, content_type="application/json"),
+            timeout=_supabase_operation_timeout("delete"),
+        )
+    finally:
+        _evict_signed_urls(*object_keys)
     response.raise_for_status()
-    return True
+    data = response.json() if response.content else []
+    if not isinstance(data, list):
+        return set()
+    return {_normalize_key(item.get("name")) for item in data if isinstance(item, dict)}
+
+
+def _supabase_delete_object_keys(object_keys):
+    """Delete keys in batches across a bounded pool; reports deleted, missing and failed keys."""
+    keys = sorted({_normalize_key(key) for key in object_keys if _normalize_key(key)})
+    report = {"deleted": [], "missing": [], "failed": {}}
+    if not keys:
+        return report
+
+    batch_size = _supabase_delete_batch_size()
+    batches = [keys[index : index + batch_size] for index in range(0, len(keys), batch_size)]
+    delete_batch = metrics.bind_request(_supabase_delete_object_batch)
+    with ThreadPoolExecutor(max_workers=min(len(batches), _supabase_batch_concurrency())) as executor:
+        futures = [(executor.submit(delete_batch, batch), batch) for batch in batches]
+        for future, batch in futures:
+            try:
+                removed = future.result()
+            except Exception as exc:
+                for key in batch:
+                    report["failed"][key] = str(exc)
+                continue
+            for key in batch:
+                report["deleted" if key in removed else "missing"].append(key)
+    return report
 
 
 def _supabase_delete_file(path):
@@ -786,25 +1577,24 @@ def _supabase_delete_file(path):
 
     # Delete one file, or all files under a prefix when the path is a folder.
     candidate_keys = set()
+    for row in _supabase_query_object_rows_for_prefixes(prefix_candidates):
+        normalized_key = _normalize_key(row.get("key"))
+        if normalized_key:
+            candidate_keys.add(normalized_key)
     for prefix_key in prefix_candidates:
-        rows = _supabase_query_object_rows(prefix_key=prefix_key)
-        for row in rows:
-            normalized_key = _normalize_key(row.get("key"))
-            if normalized_key:
-                candidate_keys.add(normalized_key)
         normalized_prefix = _normalize_key(prefix_key)
         if normalized_prefix:
             candidate_keys.add(normalized_prefix)
-    candidate_keys = sorted(candidate_keys)
-
-    deleted_any = False
-    for item_key in candidate_keys:
-        try:
-            _supabase_delete_object_key(item_key)
-            deleted_any = True
-        except Exception:
-            continue
-    return deleted_any
+    try:
+        report = _supabase_delete_object_keys(candidate_keys)
+    finally:
+        _forget_supabase_keys(path)
+    # Callers clean up metadata by app path, and the rooted and rootless keys of one object share one.
+    return {
+        "deleted": list(dict.fromkeys(_app_path_from_supabase_key(key) for key in report["deleted"])),
+        "missing": list(dict.fromkeys(_app_path_from_supabase_key(key) for key in report["missing"])),
+        "failed": {_app_path_from_supabase_key(key): error for key, error in report["failed"].items()},
+    }
 
 
 def _supabase_move_object_key(source_key, destination_key):
@@ -814,16 +1604,154 @@ def _supabase_move_object_key(source_key, destination_key):
         "sourceKey": source_key,
         "destinationKey": destination_key,
     }
-    response = requests.post(
+    response = _supabase_http().post(
         endpoint,
         json=payload,
         headers=_supabase_headers(require_service_key=True, content_type="application/json"),
-        timeout=_supabase_timeout_seconds(),
+        timeout=_supabase_operation_timeout("move"),
     )
+    _evict_signed_urls(source_key, destination_key)
     response.raise_for_status()
     return True
 
 
+def _supabase_move_concurrency():
+    value = getattr(settings, "SUPABASE_MOVE_CONCURRENCY", 8)
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError):
+        return 8
+
+
+def _supabase_move_stale_seconds():
+    value = getattr(settings, "SUPABASE_MOVE_STALE_SECONDS", 600)
+    try:
+        return max(60, int(value))
+    except (TypeError, ValueError):
+        return 600
+
+
+def _move_journal_report(journal):
+    elapsed = float(journal.elapsed_seconds or 0)
+    return {
+        "journal_id": journal.id,
+        "status": journal.status,
+        "total": len(journal.entries),
+        "moved": journal.moved_count,
+        "restored": sum(1 for entry in journal.entries if entry.get("state") == "rolled_back"),
+        "failed": journal.failed_count,
+        "elapsed_seconds": round(elapsed, 3),
+        "objects_per_second": round(journal.moved_count / elapsed, 1) if elapsed > 0 else None,
+        "errors": {entry["source"]: entry["error"] for entry in journal.entries if entry.get("error")},
+    }
+
+
+def _save_move_journal(journal, failures, started, status=None):
+    journal.moved_count = sum(1 for entry in journal.entries if entry.get("state") == "moved")
+    journal.failed_count = failures
+    update_fields = ["entries", "moved_count", "failed_count", "updated_at"]
+    if status:
+        journal.status = status
+        journal.elapsed_seconds = float(journal.elapsed_seconds or 0) + (time.monotonic() - started)
+        journal.error = f"{failures} object move(s) failed." if failures else ""
+        update_fields += ["status", "elapsed_seconds", "error"]
+    journal.save(update_fields=update_fields)
+
+
+def _run_move_journal(journal, rollback=False):
+    """Apply (or undo) every outstanding journal entry across a bounded pool, checkpointing progress."""
+    if rollback:
+        outstanding = [entry for entry in journal.entries if entry.get("state") == "moved"]
+    else:
+        outstanding = [entry for entry in journal.entries if entry.get("state") != "moved"]
+
+    started = time.monotonic()
+    failures = 0
+    if outstanding:
+        workers = min(len(outstanding), _supabase_move_concurrency())
+        move_key = metrics.bind_request(_supabase_move_object_key)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            for entry in outstanding:
+                source_key, destination_key = entry["source"], entry["destination"]
+                if rollback:
+                    source_key, destination_key = destination_key, source_key
+                futures[executor.submit(move_key, source_key, destination_key)] = entry
+            for completed, future in enumerate(as_completed(futures), start=1):
+                entry = futures[future]
+                try:
+                    future.result()
+                except Exception as exc:
+                    failures += 1
+                    entry["error"] = str(exc)
+                    if not rollback:
+                        entry["state"] = "failed"
+                else:
+                    entry["state"] = "rolled_back" if rollback else "moved"
+                    entry.pop("error", None)
+                if completed % _MOVE_JOURNAL_CHECKPOINT_EVERY == 0:
+                    _save_move_journal(journal, failures, started)
+
+    if failures:
+        final_status = "failed"
+    else:
+        final_status = "rolled_back" if rollback else "completed"
+    _save_move_journal(journal, failures, started, status=final_status)
+    return _move_journal_report(journal)
+
+
+def _supabase_move_entries(from_key, destination_root, rows):
+    entries = []
+    for row in rows:
+        source_key = _normalize_key(row.get("key"))
+        if not source_key:
+            continue
+        if source_key == from_key:
+            destination_key = destination_root
+        elif source_key.startswith(f"{from_key}/"):
+            suffix = source_key[len(from_key) + 1 :]
+            destination_key = f"{destination_root}/{suffix}" if suffix else destination_root
+        else:
+            continue
+        entries.append({"source": source_key, "destination": destination_key, "state": "pending"})
+    return entries
+
+
+def _claim_move_journal(from_path, to_path):
+    """Lock the resumable journal of this rename and mark it running; None when there is nothing to resume.
+
+    Failed journals and running ones whose worker stopped checkpointing can be claimed; a journal
+    another worker is still advancing cannot.
+    """
+    stale_before = datetime.now(timezone.utc) - timedelta(seconds=_supabase_move_stale_seconds())
+    journals = StorageMoveJournal.objects.filter(from_path=from_path, to_path=to_path)
+    try:
+        with transaction.atomic():
+            journal = (
+                journals.select_for_update()
+                .filter(Q(status="failed") | Q(status="running", updated_at__lt=stale_before))
+                .first()
+            )
+            if journal is None:
+                if StorageMoveJournal.objects.filter(from_path=from_path, status="running").exists():
+                    raise RuntimeError(_MOVE_IN_PROGRESS_MESSAGE)
+                return None
+            journal.status = "running"
+            journal.save(update_fields=["status", "updated_at"])
+    except IntegrityError:
+        raise RuntimeError(_MOVE_IN_PROGRESS_MESSAGE)
+    return journal
+
+
+def _start_move_journal(from_path, to_path, entries):
+    """Create the running journal of a new rename; the unique running-per-source constraint picks one winner."""
+    try:
+        with transaction.atomic():
+            return StorageMoveJournal.objects.create(from_path=from_path, to_path=to_path, entries=entries)
+    except IntegrityError:
+        raise RuntimeError(_MOVE_IN_PROGRESS_MESSAGE)
+
+
 def _supabase_move_path(from_path, to_path):
     from_candidates = _supabase_candidate_keys_from_app_path(from_path)
     to_candidates = _supabase_candidate_keys_from_app_path(to_path)
@@ -832,51 +1760,75 @@ def _supabase_move_path(from_path, to_path):
     if not _supabase_service_role_key():
         raise RuntimeError("SUPABASE_SERVICE_ROLE_KEY is required for move operations.")
 
-    from_key = _first_existing_key(from_candidates) or _normalize_key(from_candidates[0])
-    rows = _supabase_query_object_rows(prefix_key=from_key)
-    destination_root = _matching_destination_key(from_key, to_candidates)
-
-    if rows and destination_root:
-        for row in rows:
-            source_key = _normalize_key(row.get("key"))
-            if not source_key:
+    try:
+        # Retrying a rename that was interrupted picks up its journal; what is left at the source is re-listed,
+        # since objects may have been added or removed there since the journal was written.
+        journal = _claim_move_journal(from_path, to_path)
+        from_key = _first_existing_key(from_candidates) or _normalize_key(from_candidates[0])
+        rows = _supabase_query_object_rows(prefix_key=from_key)
+        destination_root = _matching_destination_key(from_key, to_candidates)
+        entries = _supabase_move_entries(from_key, destination_root, rows) if destination_root else []
+        if journal is not None:
+            moved = [entry for entry in journal.entries if entry.get("state") == "moved"]
+            moved_sources = {entry["source"] for entry in moved}
+            journal.entries = moved + [entry for entry in entries if entry["source"] not in moved_sources]
+            journal.save(update_fields=["entries", "updated_at"])
+        elif entries:
+            journal = _start_move_journal(from_path, to_path, entries)
+
+        if journal is not None:
+            report = _run_move_journal(journal)
+            if report["failed"]:
+                raise StorageMoveIncomplete(report)
+            return report
+
+        last_error = None
+        for source_key in from_candidates:
+            normalized_source = _normalize_key(source_key)
+            destination_key = _matching_destination_key(normalized_source, to_candidates)
+            if not normalized_source or not destination_key:
                 continue
-            if source_key == from_key:
-                destination_key = destination_root
-            elif source_key.startswith(f"{from_key}/"):
-                suffix = source_key[len(from_key) + 1 :]
-                destination_key = f"{destination_root}/{suffix}" if suffix else destination_root
-            else:
+            try:
+                _supabase_move_object_key(normalized_source, destination_key)
+                return True
+            except Exception as exc:
+                last_error = exc
                 continue
-            _supabase_move_object_key(source_key, destination_key)
-        return True
 
-    last_error = None
-    for source_key in from_candidates:
-        normalized_source = _normalize_key(source_key)
-        destination_key = _matching_destination_key(normalized_source, to_candidates)
-        if not normalized_source or not destination_key:
-            continue
-        try:
-            _supabase_move_object_key(normalized_source, destination_key)
-            return True
-        except Exception as exc:
-            last_error = exc
-            continue
+        if last_error:
+            raise last_error
+        raise RuntimeError("Unable to move source path in Supabase storage.")
+    finally:
+        _forget_supabase_keys(from_path, to_path)
 
-    if last_error:
-        raise last_error
-    raise RuntimeError("Unable to move source path in Supabase storage.")
+
+def _supabase_existing_key(path):
+    known = _known_supabase_key(path)
+    if known:
+        return known
+    candidate_keys = _supabase_candidate_keys_from_app_path(path)
+    key = _first_existing_key(candidate_keys)
+    if key:
+        _remember_supabase_keys([key])
+    return key or (candidate_keys[0] if candidate_keys else "")
 
 
 def _supabase_get_shareable_link(path):
-    candidate_keys = _supabase_candidate_keys_from_app_path(path)
-    key = _first_existing_key(candidate_keys) or (candidate_keys[0] if candidate_keys else "")
+    key = _supabase_existing_key(path)
+    if not key:
+        raise RuntimeError("Invalid storage path.")
+    if _supabase_bucket_is_public():
+        return _supabase_object_public_url(key)
+    return _supabase_cached_signed_url(key)
+
+
+def _supabase_get_temporary_link(path):
+    key = _supabase_existing_key(path)
     if not key:
         raise RuntimeError("Invalid storage path.")
     if _supabase_bucket_is_public():
         return _supabase_object_public_url(key)
-    return _supabase_create_signed_url(key)
+    return _supabase_cached_signed_url(key)
 
 
 # -----------------------------
@@ -983,6 +1935,47 @@ def _dropbox_list_folder(path):
     return entries
 
 
+def _dropbox_change_row(entry):
+    if isinstance(entry, dropbox.files.DeletedMetadata):
+        return {"name": entry.name, "path": _entry_path(entry), "deleted": True}
+    if isinstance(entry, dropbox.files.FileMetadata):
+        return {
+            "name": entry.name,
+            "path": _entry_path(entry),
+            "size": entry.size,
+            "modified": entry.server_modified.isoformat(),
+            "is_dir": False,
+        }
+    return {"name": entry.name, "path": _entry_path(entry), "is_dir": True}
+
+
+def _is_dropbox_cursor_reset(exc):
+    error = getattr(exc, "error", None)
+    is_reset = getattr(error, "is_reset", None)
+    return bool(callable(is_reset) and is_reset())
+
+
+def _dropbox_list_folder_changes(path, cursor=None):
+    reset = not cursor
+    result = None
+    if cursor:
+        try:
+            result = _execute_with_auth_retry(lambda client: client.files_list_folder_continue(cursor))
+        except dropbox.exceptions.ApiError as exc:
+            if not _is_dropbox_cursor_reset(exc):
+                raise
+            reset = True
+    if result is None:
+        result = _execute_with_auth_retry(lambda client: client.files_list_folder(path, recursive=True))
+
+    entries = list(result.entries)
+    while result.has_more:
+        next_cursor = result.cursor
+        result = _execute_with_auth_retry(lambda client: client.files_list_folder_continue(next_cursor))
+        entries.extend(result.entries)
+    return {"entries": [_dropbox_change_row(entry) for entry in entries], "cursor": result.cursor, "reset": reset}
+
+
 def _dropbox_list_folder_with_metadata(path, include_dirs=True, recursive=False):
     entries_data = _dropbox_list_folder_entries(path, recursive=recursive)
     entries = []
@@ -1032,6 +2025,63 @@ def _dropbox_download_file(path):
     return res.content
 
 
+def _dropbox_ranged_download(path, byte_range=None):
+    def download(client):
+        if byte_range:
+            # The content endpoint honours Range, so only the requested window crosses the network.
+            client = client.clone(headers={"Range": _range_header_value(byte_range)})
+        return client.files_download(path)
+
+    try:
+        return _execute_with_auth_retry(download)
+    except dropbox.exceptions.HttpError as exc:
+        if byte_range and exc.status_code == 416:
+            metadata = _dropbox_get_file_metadata(path) or {}
+            raise StorageRangeNotSatisfiable(metadata.get("size") or 0) from exc
+        raise
+
+
+def _dropbox_download_stream(path, byte_range=None, if_range=None):
+    metadata, res = _dropbox_ranged_download(path, byte_range=byte_range)
+    etag = f'"{metadata.rev}"' if getattr(metadata, "rev", None) else ""
+    server_modified = getattr(metadata, "server_modified", None)
+    last_modified = http_date(server_modified.replace(tzinfo=timezone.utc).timestamp()) if server_modified else ""
+    if byte_range and not _if_range_matches(if_range, etag, last_modified):
+        # The object changed since the client cached its first part; send the whole thing.
+        res.close()
+        byte_range = None
+        metadata, res = _dropbox_ranged_download(path)
+        etag = f'"{metadata.rev}"' if getattr(metadata, "rev", None) else ""
+        server_modified = getattr(metadata, "server_modified", None)
+        last_modified = http_date(server_modified.replace(tzinfo=timezone.utc).timestamp()) if server_modified else ""
+    total_size = int(getattr(metadata, "size", 0) or 0)
+    stream = {
+        "etag": etag,
+        "last_modified": last_modified,
+        "start": None,
+        "end": None,
+        "total_size": total_size,
+    }
+    if not byte_range:
+        stream["chunks"] = _iter_response_chunks(res)
+        return stream
+
+    content_range = _parse_content_range(res.headers.get("Content-Range")) if res.status_code == 206 else None
+    if content_range:
+        stream["start"], stream["end"] = content_range[0], content_range[1]
+        stream["chunks"] = _iter_response_chunks(res)
+        return stream
+    # The server sent the whole object anyway; skip to the window while streaming instead of buffering.
+    try:
+        start, end = _resolve_byte_range(byte_range, total_size)
+    except StorageRangeNotSatisfiable:
+        res.close()
+        raise
+    stream["start"], stream["end"] = start, end
+    stream["chunks"] = _iter_response_chunks(res, skip=start, limit=end - start + 1)
+    return stream
+
+
 def _dropbox_get_file_metadata(path):
     metadata = _execute_with_auth_retry(lambda client: client.files_get_metadata(path))
     if isinstance(metadata, dropbox.files.FileMetadata):
@@ -1044,20 +2094,47 @@ def _dropbox_get_file_metadata(path):
     return None
 
 
+def _dropbox_upload_chunk_size():
+    value = getattr(settings, "DROPBOX_UPLOAD_CHUNK_SIZE_MB", 8)
+    try:
+        # Dropbox rejects single upload requests above 150 MB.
+        return min(150, max(1, int(value))) * 1024 * 1024
+    except (TypeError, ValueError):
+        return 8 * 1024 * 1024
+
+
+def _dropbox_upload_session(client, path, file_obj, chunk_size):
+    chunks = _iter_upload_chunks(file_obj, chunk_size)
+    first_chunk = next(chunks, b"")
+    session = client.files_upload_session_start(first_chunk)
+    cursor = dropbox.files.UploadSessionCursor(session_id=session.session_id, offset=len(first_chunk))
+    for chunk in chunks:
+        client.files_upload_session_append_v2(chunk, cursor)
+        cursor.offset += len(chunk)
+    commit = dropbox.files.CommitInfo(path=path, mode=dropbox.files.WriteMode.overwrite)
+    return client.files_upload_session_finish(b"", cursor, commit)
+
+
 def _dropbox_upload_file(path, file_obj):
-    _execute_with_auth_retry(
-        lambda client: client.files_upload(
-            file_obj.read(),
-            path,
-            mode=dropbox.files.WriteMode.overwrite,
+    chunk_size = _dropbox_upload_chunk_size()
+    size = _upload_file_size(file_obj)
+    if size is not None and size <= chunk_size:
+        _rewind_upload(file_obj)
+        _execute_with_auth_retry(
+            lambda client: client.files_upload(
+                file_obj.read(),
+                path,
+                mode=dropbox.files.WriteMode.overwrite,
+            )
         )
-    )
+    else:
+        _execute_with_auth_retry(lambda client: _dropbox_upload_session(client, path, file_obj, chunk_size))
     return _dropbox_get_file_metadata(path)
 
 
 def _dropbox_delete_file(path):
     _execute_with_auth_retry(lambda client: client.files_delete_v2(path))
-    return True
+    return {"deleted": [path], "missing": [], "failed": {}}
 
 
 def _dropbox_search_files(path, query):
@@ -1111,6 +2188,11 @@ def _dropbox_get_shareable_link(path):
             raise Exception(f"Error creating link: {str(exc)}")
 
 
+def _dropbox_get_temporary_link(path):
+    temporary_link = _execute_with_auth_retry(lambda client: client.files_get_temporary_link(path))
+    return temporary_link.link
+
+
 def _dropbox_create_folder(path):
     try:
         _execute_with_auth_retry(lambda client: client.files_create_folder_v2(path))
@@ -1131,102 +2213,329 @@ def _dropbox_move_path(from_path, to_path):
     return True
 
 
-def list_folder(path):
-    """List all files and folders in the configured storage provider."""
+def _local_storage_root():
+    value = str(getattr(settings, "LOCAL_STORAGE_ROOT", "") or "").strip()
+    if not value:
+        raise RuntimeError("LOCAL_STORAGE_ROOT is required for the local storage provider.")
+    return Path(value).resolve()
+
+
+def _local_fault_settings():
+    try:
+        latency = max(0, int(getattr(settings, "LOCAL_STORAGE_LATENCY_MS", 0))) / 1000
+        jitter = max(0, int(getattr(settings, "LOCAL_STORAGE_LATENCY_JITTER_MS", 0))) / 1000
+        error_rate = min(1.0, max(0.0, float(getattr(settings, "LOCAL_STORAGE_ERROR_RATE", 0) or 0)))
+    except (TypeError, ValueError):
+        return 0, 0, 0.0
+    return latency, jitter, error_rate
+
+
+def _local_simulate(operation):
+    """Apply the configured latency and failure rate so benchmarks see provider-like behaviour."""
+    latency, jitter, error_rate = _local_fault_settings()
+    delay = latency + (random.uniform(0, jitter) if jitter else 0)
+    if delay:
+        time.sleep(delay)
+    if error_rate and random.random() < error_rate:
+        raise RuntimeError(f"Injected local storage failure during {operation}.")
+
+
+def _local_file_path(path):
+    root = _local_storage_root()
+    normalized = _normalize_path(path)
+    resolved = (root / normalized.lstrip("/")).resolve() if normalized else root
+    if resolved != root and root not in resolved.parents:
+        raise RuntimeError("Invalid storage path.")
+    return resolved
+
+
+def _local_app_path(file_path):
+    relative = file_path.relative_to(_local_storage_root()).as_posix()
+    return f"/{relative}" if relative != "." else "/"
+
+
+def _local_modified(stat_result):
+    # Match Dropbox's naive-UTC server_modified format.
+    return datetime.fromtimestamp(stat_result.st_mtime, timezone.utc).replace(tzinfo=None).isoformat()
+
+
+def _local_row(file_path, stat_result=None):
+    if file_path.is_dir():
+        return {"name": file_path.name, "path": _local_app_path(file_path), "is_dir": True}
+    stat_result = stat_result or file_path.stat()
+    return {
+        "name": file_path.name,
+        "path": _local_app_path(file_path),
+        "size": stat_result.st_size,
+        "modified": _local_modified(stat_result),
+        "is_dir": False,
+    }
+
+
+def _local_require(file_path, path):
+    if not file_path.exists():
+        raise FileNotFoundError(f"path/not_found: {path}")
+    return file_path
+
+
+def _local_list_folder_with_metadata(path, include_dirs=True, recursive=False):
+    _local_simulate("list")
+    folder = _local_require(_local_file_path(path), path)
+    children = folder.rglob("*") if recursive else folder.iterdir()
+    entries = []
+    for child in children:
+        if child.name.startswith(".") or (child.is_dir() and not include_dirs):
+            continue
+        entries.append(_local_row(child))
+    entries.sort(key=lambda item: item.get("modified", ""), reverse=True)
+    return entries
+
+
+def _local_download_file(path):
+    _local_simulate("download")
+    return _local_require(_local_file_path(path), path).read_bytes()
+
+
+def _local_iter_file_chunks(file_path, start=0, length=None, chunk_size=_STREAM_CHUNK_SIZE):
+    with open(file_path, "rb") as handle:
+        handle.seek(start)
+        remaining = length
+        while remaining is None or remaining > 0:
+            chunk = handle.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                return
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+def _local_download_stream(path, byte_range=None, if_range=None):
+    _local_simulate("download")
+    file_path = _local_require(_local_file_path(path), path)
+    stat_result = file_path.stat()
+    total_size = stat_result.st_size
+    etag = f'"{total_size:x}-{stat_result.st_mtime_ns:x}"'
+    stream = {
+        "etag": etag,
+        "last_modified": http_date(stat_result.st_mtime),
+        "start": None,
+        "end": None,
+        "total_size": total_size,
+    }
+    if byte_range and _if_range_matches(if_range, etag, stream["last_modified"]):
+        start, end = _resolve_byte_range(byte_range, total_size)
+        stream["start"], stream["end"] = start, end
+        stream["chunks"] = _local_iter_file_chunks(file_path, start=start, length=end - start + 1)
+    else:
+        stream["chunks"] = _local_iter_file_chunks(file_path)
+    return stream
+
+
+def _local_get_file_metadata(path):
+    _local_simulate("head")
+    file_path = _local_require(_local_file_path(path), path)
+    if file_path.is_dir():
+        return None
+    row = _local_row(file_path)
+    row.pop("is_dir")
+    return row
+
+
+def _local_upload_file(path, file_obj):
+    _local_simulate("upload")
+    file_path = _local_file_path(path)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(dir=file_path.parent, prefix=".upload-")
+    try:
+        with os.fdopen(handle, "wb") as temp_file:
+            for chunk in _iter_upload_chunks(file_obj, _STREAM_CHUNK_SIZE):
+                temp_file.write(chunk)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        Path(temp_path).unlink(missing_ok=True)
+        raise
+    return _local_get_file_metadata(path)
+
+
+def _local_delete_file(path):
+    _local_simulate("delete")
+    file_path = _local_file_path(path)
+    if not file_path.exists():
+        return {"deleted": [], "missing": [path], "failed": {}}
+    if file_path.is_dir():
+        deleted = [_local_app_path(item) for item in file_path.rglob("*") if item.is_file()]
+        shutil.rmtree(file_path)
+    else:
+        deleted = [_local_app_path(file_path)]
+        file_path.unlink()
+    return {"deleted": deleted, "missing": [], "failed": {}}
+
+
+def _local_search_files(path, query):
+    _local_simulate("search")
+    folder = _local_require(_local_file_path(path), path)
+    needle = str(query or "").strip().lower()
+    entries = []
+    for child in folder.rglob("*"):
+        if child.is_file() and not child.name.startswith(".") and needle in child.name.lower():
+            row = _local_row(child)
+            row.pop("is_dir")
+            entries.append(row)
+    return entries
+
+
+def _local_get_link(path):
+    _local_simulate("sign")
+    _local_require(_local_file_path(path), path)
+    # Local files have no object-store URL, so links point at the app endpoint that streams them.
+    link = f"{reverse('storage-file-preview')}?{urlencode({'path': _normalize_path(path), 'delivery': 'proxy'})}"
+    base_url = str(getattr(settings, "BACKEND_PUBLIC_URL", "") or "").rstrip("/")
+    return f"{base_url}{link}" if base_url else link
+
+
+def _local_create_folder(path):
+    _local_simulate("upload")
+    _local_file_path(path).mkdir(parents=True, exist_ok=True)
+    return True
+
+
+def _local_move_path(from_path, to_path):
+    _local_simulate("move")
+    source = _local_require(_local_file_path(from_path), from_path)
+    destination = _local_file_path(to_path)
+    if destination.exists():
+        raise FileExistsError(f"to/conflict: {to_path}")
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    shutil.move(str(source), str(destination))
+    return True
+
+
+class StorageError(Exception):
+    """Raised by the public storage functions; the provider's exception is chained as the cause."""
+
+
+def _is_dropbox_not_found_error(exc):
+    """True when ``exc`` (or the provider error chained below it) means the path does not exist.
+
+    Covers Dropbox ``path/not_found`` lookup errors, the local provider's FileNotFoundError and
+    Supabase's "not found" errors, whether raised directly or wrapped in a StorageError.
+    """
+    while exc is not None:
+        if isinstance(exc, FileNotFoundError):
+            return True
+        error = getattr(exc, "error", None)
+        is_path = getattr(error, "is_path", None)
+        if callable(is_path) and is_path() and error.get_path().is_not_found():
+            return True
+        lowered = str(exc).lower()
+        if "not_found" in lowered or "not found" in lowered:
+            return True
+        exc = exc.__cause__
+    return False
+
+
+def _storage_backend():
+    from storage.backends import get_storage_backend
+
+    return get_storage_backend()
+
+
+def _call_storage(operation, error_label, *args, **kwargs):
     try:
-        if _is_supabase_provider():
-            return _supabase_list_folder_with_metadata(path, include_dirs=True, recursive=False)
-        return _dropbox_list_folder(path)
+        return _storage_backend().call(operation, *args, **kwargs)
+    except (StorageRangeNotSatisfiable, StorageMoveIncomplete):
+        raise
     except Exception as exc:
-        raise Exception(f"Error listing folder: {str(exc)}")
+        raise StorageError(f"Error {error_label}: {str(exc)}") from exc
+
+
+def list_folder(path):
+    """List all files and folders in the configured storage provider."""
+    return _call_storage("list_folder", "listing folder", path)
 
 
 def list_folder_with_metadata(path, include_dirs=True, recursive=False):
     """List files with metadata like size and date."""
-    try:
-        if _is_supabase_provider():
-            return _supabase_list_folder_with_metadata(path, include_dirs=include_dirs, recursive=recursive)
-        return _dropbox_list_folder_with_metadata(path, include_dirs=include_dirs, recursive=recursive)
-    except Exception as exc:
-        raise Exception(f"Error listing folder metadata: {str(exc)}")
+    return _call_storage(
+        "list_folder_with_metadata",
+        "listing folder metadata",
+        path,
+        include_dirs=include_dirs,
+        recursive=recursive,
+    )
+
+
+def list_folder_changes(path, cursor=None):
+    """Recursive changes under a folder since ``cursor``; ``reset`` means ``entries`` is a full listing."""
+    return _call_storage("list_folder_changes", "listing folder changes", path, cursor=cursor)
 
 
 def download_file(path):
-    """Download a file from the configured storage provider."""
-    try:
-        if _is_supabase_provider():
-            return _supabase_download_file(path)
-        return _dropbox_download_file(path)
-    except Exception as exc:
-        raise Exception(f"Error downloading file: {str(exc)}")
+    """Download a file, reading through the local disk cache when it is enabled."""
+    return _call_storage("download_file", "downloading file", path)
+
+
+def download_file_stream(path, byte_range=None, if_range=None):
+    """Stream a file (optionally a single byte range) from the configured storage provider."""
+    return _call_storage("download_file_stream", "downloading file", path, byte_range=byte_range, if_range=if_range)
 
 
 def get_file_metadata(path):
     """Get metadata for a specific file."""
-    try:
-        if _is_supabase_provider():
-            return _supabase_get_file_metadata(path)
-        return _dropbox_get_file_metadata(path)
-    except Exception as exc:
-        raise Exception(f"Error getting metadata: {str(exc)}")
+    return _call_storage("get_file_metadata", "getting metadata", path)
 
 
 def upload_file(path, file_obj):
     """Upload a file to the configured storage provider."""
-    try:
-        if _is_supabase_provider():
-            return _supabase_upload_file(path, file_obj)
-        return _dropbox_upload_file(path, file_obj)
-    except Exception as exc:
-        raise Exception(f"Error uploading file: {str(exc)}")
+    return _call_storage("upload_file", "uploading file", path, file_obj)
 
 
 def delete_file(path):
-    """Delete a file from the configured storage provider."""
-    try:
-        if _is_supabase_provider():
-            return _supabase_delete_file(path)
-        return _dropbox_delete_file(path)
-    except Exception as exc:
-        raise Exception(f"Error deleting file: {str(exc)}")
+    """Delete a file or folder; returns a report of deleted, missing and failed app paths."""
+    return _call_storage("delete_file", "deleting file", path)
 
 
 def search_files(path, query):
     """Search for files in a storage path."""
-    try:
-        if _is_supabase_provider():
-            return _supabase_search_files(path, query)
-        return _dropbox_search_files(path, query)
-    except Exception as exc:
-        raise Exception(f"Error searching files: {str(exc)}")
+    return _call_storage("search_files", "searching files", path, query)
 
 
 def get_shareable_link(path):
     """Get a shareable preview link for a file."""
-    try:
-        if _is_supabase_provider():
-            return _supabase_get_shareable_link(path)
-        return _dropbox_get_shareable_link(path)
-    except Exception as exc:
-        raise Exception(f"Error creating link: {str(exc)}")
+    return _call_storage("get_shareable_link", "creating link", path)
+
+
+def get_temporary_link(path):
+    """Get a short-lived direct URL to the file bytes (signed URL or Dropbox temporary link)."""
+    return _call_storage("get_temporary_link", "creating link", path)
 
 
 def create_folder(path):
     """Create a folder in the configured storage provider."""
     try:
-        if _is_supabase_provider():
-            # Supabase folders are implicit; no-op is enough unless uploads are performed.
-            return True
-        return _dropbox_create_folder(path)
+        return _storage_backend().call("create_folder", path)
     except Exception:
         return False
 
 
 def move_path(from_path, to_path):
     """Move or rename a file/folder in the configured storage provider."""
+    return _call_storage("move_path", "moving path", from_path, to_path)
+
+
+def rollback_move(journal_id):
+    """Move every object of a journaled folder move back to its source key."""
     try:
-        if _is_supabase_provider():
-            return _supabase_move_path(from_path, to_path)
-        return _dropbox_move_path(from_path, to_path)
+        with transaction.atomic():
+            journal = StorageMoveJournal.objects.select_for_update().get(id=journal_id)
+            # Completed renames have already rewritten metadata, and running ones belong to another worker.
+            if journal.status != "failed":
+                raise RuntimeError(f"only failed moves can be rolled back; journal {journal.id} is {journal.status}")
+            journal.status = "running"
+            journal.save(update_fields=["status", "updated_at"])
+        try:
+            return _run_move_journal(journal, rollback=True)
+        finally:
+            _forget_supabase_keys(journal.from_path, journal.to_path)
     except Exception as exc:
-        raise Exception(f"Error moving path: {str(exc)}")
+        raise Exception(f"Error rolling back move: {str(exc)}")
@@ -0,0 +1,77 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+# Browsers keep the body and revalidate it on every use; the payload depends on the caller's role.
+LISTING_CACHE_CONTROL = "private, no-cache"
+
+
+def payload_etag(payload):
+    body = json.dumps(payload, cls=DjangoJSONEncoder, sort_keys=True, separators=(",", ":"))
+    return f'"{hashlib.sha1(body.encode("utf-8")).hexdigest()}"'
+
+
+def token_etag(*parts):
+    """ETag for a response identified by version tokens, so revalidating it needs no payload at all."""
+    seed = "|".join(str(part) for part in parts)
+    return f'"{hashlib.sha1(seed.encode("utf-8")).hexdigest()}"'
+
+
+def _etag_cache_key(cache_key):
+    return f"{cache_key}:etag"
+
+
+def _opaque(etag):
+    # If-None-Match uses weak comparison, and GZipMiddleware marks compressed responses' ETags weak.
+    value = str(etag or "").strip()
+    return value[2:] if value.startswith("W/") else value
+
+
+def _matches(request, etag):
+    header = request.META.get("HTTP_IF_NONE_MATCH")
+    if not header or not etag:
+        return False
+    if header.strip() == "*":
+        return True
+    return _opaque(etag) in {_opaque(candidate) for candidate in parse_etags(header)}
+
+
+def _with_validators(response, etag):
+    response["ETag"] = etag
+    response["Cache-Control"] = LISTING_CACHE_CONTROL
+    # Callers authenticate with a bearer token or a session cookie; either changes the payload.
+    patch_vary_headers(response, ("Authorization", "Cookie"))
+    return response
+
+
+def remember_etag(cache_key, payload, timeout):
+    """Store the ETag of a payload cached under ``cache_key`` so revalidation can skip loading it."""
+    etag = payload_etag(payload)
+    cache.set(_etag_cache_key(cache_key), etag, timeout=timeout)
+    return etag
+
+
+def cached_payload(cache_key):
+    """The payload cached under ``cache_key`` and its remembered ETag, in one cache round trip."""
+    etag_key = _etag_cache_key(cache_key)
+    values = cache.get_many([cache_key, etag_key])
+    return values.get(cache_key), values.get(etag_key)
+
+
+def not_modified(request, etag):
+    """An empty 304 when the client already holds ``etag``, otherwise None."""
+    if _matches(request, etag):
+        return _with_validators(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+    return None
+
+
+def etag_response(request, payload, etag=None):
+    """Respond with ``payload`` and its ETag, or with an empty 304 when the client already has it."""
+    etag = etag or payload_etag(payload)
+    return not_modified(request, etag) or _with_validators(Response(payload), etag)
@@ -0,0 +1,71 @@
+import re
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.middleware.gzip import GZipMiddleware
+
+from storage.dropbox_service import StorageRangeNotSatisfiable, download_file_stream
+
+_RANGE_HEADER_PATTERN = re.compile(r"^\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*$", re.IGNORECASE)
+
+
+def parse_range_header(value):
+    """Parse a single ``bytes=`` range into ``(start, end)``; multi-range or malformed headers return None."""
+    match = _RANGE_HEADER_PATTERN.match(str(value or ""))
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        return None, int(last)
+    start = int(first)
+    end = int(last) if last else None
+    if end is not None and end < start:
+        return None
+    return start, end
+
+
+def storage_file_response(request, path, content_type, disposition="inline", filename="", cache_control=None):
+    """Stream a storage object to the client, answering Range/If-Range requests with 206 or 416."""
+    byte_range = parse_range_header(request.META.get("HTTP_RANGE"))
+    if_range = request.META.get("HTTP_IF_RANGE") if byte_range else None
+    try:
+        stream = download_file_stream(path, byte_range=byte_range, if_range=if_range)
+    except StorageRangeNotSatisfiable as exc:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{int(exc.total_size or 0)}"
+        response["Accept-Ranges"] = "bytes"
+        return response
+
+    response = StreamingHttpResponse(stream["chunks"], content_type=content_type)
+    total_size = stream.get("total_size")
+    if stream.get("start") is not None:
+        start, end = stream["start"], stream["end"]
+        response.status_code = 206
+        response["Content-Range"] = f"bytes {start}-{end}/{total_size if total_size is not None else '*'}"
+        response["Content-Length"] = str(end - start + 1)
+    elif total_size is not None:
+        response["Content-Length"] = str(total_size)
+    response["Accept-Ranges"] = "bytes"
+    if stream.get("etag"):
+        response["ETag"] = stream["etag"]
+    if stream.get("last_modified"):
+        response["Last-Modified"] = stream["last_modified"]
+    if filename:
+        response["Content-Disposition"] = f'{disposition}; filename="{filename}"'
+    if cache_control:
+        response["Cache-Control"] = cache_control
+    return response
+
+
+class RangeAwareGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that leaves byte-range capable responses alone.
+
+    Range offsets refer to the stored bytes, so compressing a 206 (or a 200 a client may later resume
+    with Range) would hand out offsets into a body the client never saw.
+    """
+
+    def process_response(self, request, response):
+        if response.has_header("Content-Range") or response.get("Accept-Ranges") == "bytes":
+            return response
+        return super().process_response(request, response)
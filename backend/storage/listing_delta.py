@@ -0,0 +1,65 @@
+from django.utils import timezone
+
+from storage.dropbox_service import _is_dropbox_not_found_error, list_folder_changes
+from storage.models import StorageListingCursor
+
+
+def _normalize_root(path):
+    parts = [segment for segment in str(path or "").strip().replace("\\", "/").split("/") if segment]
+    return "/" + "/".join(parts) if parts else ""
+
+
+def _entry_key(row):
+    return str(row.get("path") or "").strip().lower()
+
+
+def list_folder_delta(root_path, consumer):
+    """Return the current recursive listing of ``root_path`` and what changed since ``consumer`` last asked.
+
+    The result has ``entries`` (full listing rows), ``changed`` (added or modified rows), ``deleted`` (paths)
+    and ``full`` (True when the provider re-listed the whole tree instead of replaying a cursor).
+    """
+    normalized_root = _normalize_root(root_path)
+    state = StorageListingCursor.objects.filter(consumer=consumer, root_path=normalized_root).first()
+    previous = {_entry_key(row): row for row in (state.entries if state else []) if _entry_key(row)}
+
+    try:
+        result = list_folder_changes(normalized_root, cursor=(state.cursor if state else "") or None)
+    except Exception as exc:
+        if not _is_dropbox_not_found_error(exc):
+            raise
+        result = {"entries": [], "cursor": "", "reset": True}
+
+    changed = []
+    deleted = []
+    if result["reset"]:
+        current = {_entry_key(row): row for row in result["entries"] if _entry_key(row) and not row.get("deleted")}
+        changed = [row for key, row in current.items() if previous.get(key) != row]
+        deleted = [row["path"] for key, row in previous.items() if key not in current]
+    else:
+        current = dict(previous)
+        for row in result["entries"]:
+            key = _entry_key(row)
+            if not key:
+                continue
+            if row.get("deleted"):
+                # A deleted folder takes everything below it with it.
+                for existing in [item for item in current if item == key or item.startswith(f"{key}/")]:
+                    deleted.append(current.pop(existing)["path"])
+                continue
+            if current.get(key) != row:
+                changed.append(row)
+            current[key] = row
+
+    entries = sorted(current.values(), key=lambda item: str(item.get("modified") or ""), reverse=True)
+    cursor = result.get("cursor") or ""
+    # The snapshot is the largest row in the table; rewrite it only when the listing actually changed.
+    if state is None or changed or deleted:
+        StorageListingCursor.objects.update_or_create(
+            consumer=consumer,
+            root_path=normalized_root,
+            defaults={"cursor": cursor, "entries": entries},
+        )
+    elif cursor != state.cursor:
+        StorageListingCursor.objects.filter(pk=state.pk).update(cursor=cursor, updated_at=timezone.now())
+    return {"entries": entries, "changed": changed, "deleted": deleted, "full": bool(result["reset"])}
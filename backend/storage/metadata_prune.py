@@ -0,0 +1,58 @@
+import io
+import uuid
+
+from django.db import connection, transaction
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+
+_STAGING_TABLE_PREFIX = "storage_prune_paths"
+_INSERT_BATCH_SIZE = 500
+
+
+def _copy_text(value):
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _staging_table():
+    # A name per call, so prunes sharing a connection never drop or refill each other's table.
+    return f"{_STAGING_TABLE_PREFIX}_{uuid.uuid4().hex}"
+
+
+def _stage_paths(cursor, table, paths):
+    on_commit = " ON COMMIT DROP" if connection.vendor == "postgresql" else ""
+    cursor.execute(f"CREATE TEMPORARY TABLE {table} (path varchar(1000) PRIMARY KEY){on_commit}")
+    if connection.vendor == "postgresql" and hasattr(cursor, "copy_expert"):
+        payload = "".join(f"{_copy_text(path)}\n" for path in paths)
+        cursor.copy_expert(f"COPY {table} (path) FROM STDIN", io.StringIO(payload))
+        cursor.execute(f"ANALYZE {table}")
+        return
+    paths = list(paths)
+    for start in range(0, len(paths), _INSERT_BATCH_SIZE):
+        cursor.executemany(
+            f"INSERT INTO {table} (path) VALUES (%s)",
+            [(path,) for path in paths[start : start + _INSERT_BATCH_SIZE]],
+        )
+
+
+def delete_missing_paths(queryset, current_paths):
+    """Delete rows of ``queryset`` whose dropbox_path is not in ``current_paths``; returns the number deleted.
+
+    The current paths go into a temporary table private to this call (COPY on Postgres, batched inserts
+    elsewhere) and the delete filters with a correlated NOT EXISTS against it, which the planner runs
+    as an anti-join on the table's primary key instead of a NOT IN list with a parameter per path.
+    """
+    table = _staging_table()
+    column = f"{connection.ops.quote_name(queryset.model._meta.db_table)}.{connection.ops.quote_name('dropbox_path')}"
+    missing = RawSQL(
+        f"NOT EXISTS (SELECT 1 FROM {table} staged WHERE staged.path = {column})",
+        [],
+        output_field=BooleanField(),
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        _stage_paths(cursor, table, current_paths)
+        stale = queryset.filter(missing)
+        _total, per_model = stale.delete()
+        # Postgres drops the table at commit; on failure the rollback discards it with the rest of the transaction.
+        if connection.vendor != "postgresql":
+            cursor.execute(f"DROP TABLE {table}")
+    return per_model.get(queryset.model._meta.label, 0)
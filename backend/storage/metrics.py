@@ -0,0 +1,200 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_operations = {}
+# The current request's {(provider, operation): (count, seconds)}; worker threads share it via bind_request.
+_request_timings = contextvars.ContextVar("storage_request_timings", default=None)
+
+
+def _new_row():
+    return {
+        "count": 0,
+        "sum_seconds": 0.0,
+        "buckets": [0] * (len(LATENCY_BUCKETS) + 1),
+        "bytes": 0,
+        "retries": 0,
+        "hedges": 0,
+        "errors": {},
+    }
+
+
+def _row(provider, operation):
+    return _operations.setdefault((provider, operation), _new_row())
+
+
+def record_operation(provider, operation, seconds, error=None, byte_count=0):
+    """Add one finished storage call to the process-wide histograms and to the current request's timings."""
+    with _lock:
+        row = _row(provider, operation)
+        row["count"] += 1
+        row["sum_seconds"] += seconds
+        bucket = next((index for index, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound), len(LATENCY_BUCKETS))
+        row["buckets"][bucket] += 1
+        row["bytes"] += int(byte_count or 0)
+        if error is not None:
+            error_class = type(error).__name__
+            row["errors"][error_class] = row["errors"].get(error_class, 0) + 1
+
+    timings = _request_timings.get()
+    if timings is not None:
+        with _lock:
+            count, total = timings.get((provider, operation), (0, 0.0))
+            timings[(provider, operation)] = (count + 1, total + seconds)
+
+
+def bind_request(fn):
+    """Wrap ``fn`` so the storage calls it makes on a worker thread count toward the calling request."""
+    timings = _request_timings.get()
+
+    def run(*args, **kwargs):
+        token = _request_timings.set(timings)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _request_timings.reset(token)
+
+    return run
+
+
+def record_bytes(provider, operation, byte_count):
+    with _lock:
+        _row(provider, operation)["bytes"] += int(byte_count or 0)
+
+
+def record_retry(provider, operation):
+    with _lock:
+        _row(provider, operation)["retries"] += 1
+
+
+def record_hedge(provider, operation):
+    with _lock:
+        _row(provider, operation)["hedges"] += 1
+
+
+def percentile(provider, operation, quantile, min_samples=1):
+    """Upper bound of the histogram bucket holding ``quantile`` of the recorded latencies, or None."""
+    with _lock:
+        row = _operations.get((provider, operation))
+        if row is None or row["count"] < max(1, min_samples):
+            return None
+        target = quantile * row["count"]
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, row["buckets"]):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return LATENCY_BUCKETS[-1]
+
+
+@contextmanager
+def observe(provider, operation):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as exc:
+        record_operation(provider, operation, time.perf_counter() - started, error=exc)
+        raise
+    record_operation(provider, operation, time.perf_counter() - started)
+
+
+def snapshot():
+    with _lock:
+        return {
+            key: {**row, "buckets": list(row["buckets"]), "errors": dict(row["errors"])}
+            for key, row in _operations.items()
+        }
+
+
+def reset():
+    with _lock:
+        _operations.clear()
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus():
+    """Render the collected metrics in the Prometheus text exposition format."""
+    lines = [
+        "# HELP storage_operation_duration_seconds Storage provider call latency.",
+        "# TYPE storage_operation_duration_seconds histogram",
+    ]
+    rows = sorted(snapshot().items())
+    for (provider, operation), row in rows:
+        labels = f'provider="{_label_value(provider)}",operation="{_label_value(operation)}"'
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), row["buckets"]):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'storage_operation_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+        lines.append(f"storage_operation_duration_seconds_sum{{{labels}}} {row['sum_seconds']:.6f}")
+        lines.append(f"storage_operation_duration_seconds_count{{{labels}}} {row['count']}")
+
+    lines += ["# HELP storage_operation_bytes_total Bytes moved by storage calls.", "# TYPE storage_operation_bytes_total counter"]
+    for (provider, operation), row in rows:
+        labels = f'provider="{_label_value(provider)}",operation="{_label_value(operation)}"'
+        lines.append(f"storage_operation_bytes_total{{{labels}}} {row['bytes']}")
+
+    lines += ["# HELP storage_operation_retries_total Storage calls repeated after a failure.", "# TYPE storage_operation_retries_total counter"]
+    for (provider, operation), row in rows:
+        labels = f'provider="{_label_value(provider)}",operation="{_label_value(operation)}"'
+        lines.append(f"storage_operation_retries_total{{{labels}}} {row['retries']}")
+
+    lines += ["# HELP storage_operation_hedges_total Hedged duplicate requests sent.", "# TYPE storage_operation_hedges_total counter"]
+    for (provider, operation), row in rows:
+        labels = f'provider="{_label_value(provider)}",operation="{_label_value(operation)}"'
+        lines.append(f"storage_operation_hedges_total{{{labels}}} {row['hedges']}")
+
+    lines += ["# HELP storage_operation_errors_total Failed storage calls by exception class.", "# TYPE storage_operation_errors_total counter"]
+    for (provider, operation), row in rows:
+        for error_class, count in sorted(row["errors"].items()):
+            labels = (
+                f'provider="{_label_value(provider)}",operation="{_label_value(operation)}",'
+                f'error="{_label_value(error_class)}"'
+            )
+            lines.append(f"storage_operation_errors_total{{{labels}}} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def _server_timing_header(timings):
+    entries = []
+    for (provider, operation), (count, total) in sorted(timings.items()):
+        name = f"storage-{provider}-{operation}".replace("_", "-")
+        entries.append(f'{name};dur={total * 1000:.1f};desc="{count} call{"s" if count != 1 else ""}"')
+    return ", ".join(entries)
+
+
+def _server_timing_enabled(request):
+    # Provider names and call counts describe the backend, so only staff see them unless enabled for everyone.
+    if getattr(settings, "STORAGE_SERVER_TIMING", False):
+        return True
+    return bool(getattr(getattr(request, "user", None), "is_staff", False))
+
+
+class StorageTimingMiddleware:
+    """Adds a Server-Timing entry per storage provider/operation used while handling the request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = {}
+        token = _request_timings.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_timings.reset(token)
+        if timings and _server_timing_enabled(request):
+            with _lock:
+                header = _server_timing_header(timings)
+            existing = response.get("Server-Timing")
+            response["Server-Timing"] = f"{existing}, {header}" if existing else header
+        return response
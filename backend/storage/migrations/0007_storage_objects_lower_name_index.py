@@ -0,0 +1,49 @@
+from django.db import migrations, transaction
+
+
+INDEX_NAME = "bridge4er_objects_bucket_lower_name_idx"
+
+
+def _has_storage_objects_table(schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return False
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass('storage.objects')")
+        row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def create_storage_objects_index(apps, schema_editor):
+    # storage.objects only exists on Supabase Postgres; other databases skip this step.
+    if not _has_storage_objects_table(schema_editor):
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS {INDEX_NAME} "
+                "ON storage.objects (bucket_id, lower(name) text_pattern_ops)"
+            )
+    except Exception:
+        # The database role may not own storage.objects; listings still work without the index.
+        pass
+
+
+def drop_storage_objects_index(apps, schema_editor):
+    if not _has_storage_objects_table(schema_editor):
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute(f"DROP INDEX IF EXISTS storage.{INDEX_NAME}")
+    except Exception:
+        pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("storage", "0006_filemetadata_display_name_filemetadata_icon_url_and_more"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_storage_objects_index, drop_storage_objects_index),
+    ]
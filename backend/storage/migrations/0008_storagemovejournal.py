@@ -0,0 +1,36 @@
+# Generated by Django 4.2 on 2026-10-17 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0007_storage_objects_lower_name_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorageMoveJournal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_path', models.CharField(max_length=1000)),
+                ('to_path', models.CharField(max_length=1000)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed'), ('rolled_back', 'Rolled Back')], db_index=True, default='running', max_length=20)),
+                ('entries', models.JSONField(blank=True, default=list)),
+                ('moved_count', models.PositiveIntegerField(default=0)),
+                ('failed_count', models.PositiveIntegerField(default=0)),
+                ('elapsed_seconds', models.FloatField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='storagemovejournal',
+            index=models.Index(fields=['from_path', 'to_path', 'status'], name='storage_sto_from_pa_f5a759_idx'),
+        ),
+    ]
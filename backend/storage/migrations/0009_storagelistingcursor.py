@@ -0,0 +1,27 @@
+# Generated by Django 4.2 on 2026-10-17 02:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0008_storagemovejournal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorageListingCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('consumer', models.CharField(max_length=50)),
+                ('root_path', models.CharField(max_length=1000)),
+                ('cursor', models.TextField(blank=True, default='')),
+                ('entries', models.JSONField(blank=True, default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('consumer', 'root_path')},
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2 on 2026-10-17 02:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0009_storagelistingcursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorageKeyMap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('app_path', models.CharField(max_length=1000, unique=True)),
+                ('storage_key', models.CharField(max_length=1000)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
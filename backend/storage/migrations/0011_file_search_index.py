@@ -0,0 +1,103 @@
+# Generated by Django 4.2 on 2026-10-17 02:48
+
+from django.db import migrations, models, transaction
+import django.db.models.deletion
+
+
+METADATA_INDEX_NAME = "storage_filemetadata_search_trgm_idx"
+OBJECTS_INDEX_NAME = "bridge4er_objects_lower_name_trgm_idx"
+
+
+def _execute_optional(schema_editor, sql):
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute(sql)
+        return True
+    except Exception:
+        # pg_trgm may be unavailable or the role may not own storage.objects; search still works unindexed.
+        return False
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    if not _execute_optional(schema_editor, "CREATE EXTENSION IF NOT EXISTS pg_trgm"):
+        return
+    _execute_optional(
+        schema_editor,
+        f"CREATE INDEX IF NOT EXISTS {METADATA_INDEX_NAME} "
+        "ON storage_filemetadata USING gin (search_text gin_trgm_ops)",
+    )
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass('storage.objects')")
+        row = cursor.fetchone()
+    if row and row[0]:
+        _execute_optional(
+            schema_editor,
+            f"CREATE INDEX IF NOT EXISTS {OBJECTS_INDEX_NAME} "
+            "ON storage.objects USING gin (lower(name) gin_trgm_ops)",
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    _execute_optional(schema_editor, f"DROP INDEX IF EXISTS {METADATA_INDEX_NAME}")
+    _execute_optional(schema_editor, f"DROP INDEX IF EXISTS storage.{OBJECTS_INDEX_NAME}")
+
+
+def _trigrams(text):
+    return {text[index : index + 3] for index in range(len(text) - 2) if "\n" not in text[index : index + 3]}
+
+
+def backfill_search_index(apps, schema_editor):
+    FileMetadata = apps.get_model("storage", "FileMetadata")
+    FileSearchToken = apps.get_model("storage", "FileSearchToken")
+    use_tokens = schema_editor.connection.vendor != "postgresql"
+    batch = []
+
+    def flush():
+        FileMetadata.objects.bulk_update(batch, ["search_text"])
+        if use_tokens:
+            FileSearchToken.objects.bulk_create(
+                [FileSearchToken(file_id=row.id, token=token) for row in batch for token in _trigrams(row.search_text)],
+                batch_size=5000,
+            )
+        batch.clear()
+
+    for row in FileMetadata.objects.only("id", "name", "display_name", "dropbox_path").iterator():
+        parts = [str(value or "").strip().lower() for value in (row.name, row.display_name, row.dropbox_path)]
+        row.search_text = "\n".join(part for part in parts if part)
+        batch.append(row)
+        if len(batch) >= 500:
+            flush()
+    if batch:
+        flush()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0010_storagekeymap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filemetadata',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.CreateModel(
+            name='FileSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=3)),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='storage.filemetadata')),
+            ],
+            options={
+                'unique_together': {('token', 'file')},
+            },
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+        migrations.RunPython(backfill_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2 on 2026-10-17 02:55
+
+from django.db import migrations, models
+
+
+def use_binary_collation(apps, schema_editor):
+    # The encoded keys compare by code point; the database's default locale collation would not.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for table in ("storage_filemetadata", "storage_foldermetadata"):
+        schema_editor.execute(f'ALTER TABLE {table} ALTER COLUMN admin_sort_key TYPE text COLLATE "C"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0011_file_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filemetadata',
+            name='admin_sort_key',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='foldermetadata',
+            name='admin_sort_key',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(use_binary_collation, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='filemetadata',
+            index=models.Index(fields=['branch', 'content_type', 'admin_sort_key'], name='storage_fil_branch_b6c698_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='foldermetadata',
+            index=models.Index(fields=['branch', 'content_type', 'admin_sort_key'], name='storage_fol_branch_8a82b3_idx'),
+        ),
+    ]
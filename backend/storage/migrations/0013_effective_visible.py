@@ -0,0 +1,40 @@
+# Generated by Django 4.2 on 2026-10-17 02:58
+
+from django.db import migrations, models
+
+
+def backfill_effective_visible(apps, schema_editor):
+    FileMetadata = apps.get_model("storage", "FileMetadata")
+    FolderMetadata = apps.get_model("storage", "FolderMetadata")
+    for model in (FileMetadata, FolderMetadata):
+        model.objects.filter(is_visible=False).update(effective_visible=False)
+    hidden = FolderMetadata.objects.filter(is_visible=False).values_list("content_type", "branch", "dropbox_path")
+    for content_type, branch, path in hidden:
+        prefix = f"{str(path).rstrip('/')}/"
+        for model in (FileMetadata, FolderMetadata):
+            model.objects.filter(
+                content_type=content_type,
+                branch=branch,
+                dropbox_path__istartswith=prefix,
+            ).update(effective_visible=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0012_admin_sort_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filemetadata',
+            name='effective_visible',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='foldermetadata',
+            name='effective_visible',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.RunPython(backfill_effective_visible, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-17 03:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0013_effective_visible'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='filemetadata',
+            index=models.Index(fields=['branch', 'content_type', 'dropbox_path'], name='storage_file_root_path_idx', opclasses=['varchar_pattern_ops', 'varchar_pattern_ops', 'varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='foldermetadata',
+            index=models.Index(fields=['branch', 'content_type', 'dropbox_path'], name='storage_folder_root_path_idx', opclasses=['varchar_pattern_ops', 'varchar_pattern_ops', 'varchar_pattern_ops']),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2 on 2026-10-17 03:47
+
+from django.db import migrations
+import storage.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0014_metadata_root_path_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='filemetadata',
+            name='admin_sort_key',
+            field=storage.models.SortKeyField(blank=True, default='', editable=False),
+        ),
+        migrations.AlterField(
+            model_name='foldermetadata',
+            name='admin_sort_key',
+            field=storage.models.SortKeyField(blank=True, default='', editable=False),
+        ),
+    ]
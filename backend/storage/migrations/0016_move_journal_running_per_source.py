@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-17 03:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0015_admin_sort_key_collation'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='storagemovejournal',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'running')), fields=('from_path',), name='storage_move_one_running_per_source'),
+        ),
+    ]
@@ -12,6 +12,20 @@ CONTENT_TYPE_CHOICES = [
 ]
 
 
+class SortKeyField(models.TextField):
+    """Text compared byte by byte, as storage.views._admin_sort_key encodes its keys.
+
+    Postgres needs the "C" collation for that; SQLite's default BINARY collation already compares this
+    way and does not know "C", so the collation is chosen per database instead of through db_collation.
+    """
+
+    def db_parameters(self, connection):
+        params = super().db_parameters(connection)
+        if connection.vendor == "postgresql":
+            params["collation"] = "C"
+        return params
+
+
 class FileMetadata(models.Model):
     name = models.CharField(max_length=500)
     display_name = models.CharField(max_length=500, blank=True, default="")
@@ -22,11 +36,26 @@ class FileMetadata(models.Model):
     icon_url = models.CharField(max_length=1000, blank=True, default="")
     file_size = models.BigIntegerField()  # in bytes
     is_visible = models.BooleanField(default=True)
+    # is_visible and no hidden ancestor folder; maintained by storage.views._refresh_derived_metadata.
+    effective_visible = models.BooleanField(default=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     modified_at = models.DateTimeField(auto_now=True)
+    # Lowercased name, display name and path; kept current by storage.search_index.index_files.
+    search_text = models.TextField(blank=True, default="", editable=False)
+    # Encoded admin listing position; see storage.views._admin_sort_key.
+    admin_sort_key = SortKeyField(blank=True, default="", editable=False)
     
     class Meta:
         ordering = ['-uploaded_at']
+        indexes = [
+            models.Index(fields=["branch", "content_type", "admin_sort_key"]),
+            # Pattern ops let Postgres answer "dropbox_path LIKE 'root/%'" from the index.
+            models.Index(
+                fields=["branch", "content_type", "dropbox_path"],
+                name="storage_file_root_path_idx",
+                opclasses=["varchar_pattern_ops"] * 3,
+            ),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.content_type})"
@@ -43,14 +72,22 @@ class FolderMetadata(models.Model):
     sort_order = models.IntegerField(default=0, db_index=True)
     icon_url = models.CharField(max_length=1000, blank=True, default="")
     is_visible = models.BooleanField(default=True)
+    effective_visible = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     modified_at = models.DateTimeField(auto_now=True)
+    admin_sort_key = SortKeyField(blank=True, default="", editable=False)
 
     class Meta:
         ordering = ["branch", "content_type", "depth", "sort_order", "name"]
         indexes = [
             models.Index(fields=["branch", "content_type", "is_visible"]),
             models.Index(fields=["branch", "content_type", "parent_path", "sort_order"]),
+            models.Index(fields=["branch", "content_type", "admin_sort_key"]),
+            models.Index(
+                fields=["branch", "content_type", "dropbox_path"],
+                name="storage_folder_root_path_idx",
+                opclasses=["varchar_pattern_ops"] * 3,
+            ),
         ]
 
     def __str__(self):
@@ -80,3 +117,77 @@ class PlatformMetrics(models.Model):
 
     def __str__(self):
         return f"Platform Metrics ({self.id})"
+
+
+class StorageMoveJournal(models.Model):
+    """Per-object progress of a folder move so an interrupted rename can resume or roll back."""
+
+    STATUS_CHOICES = [
+        ("running", "Running"),
+        ("completed", "Completed"),
+        ("failed", "Failed"),
+        ("rolled_back", "Rolled Back"),
+    ]
+
+    from_path = models.CharField(max_length=1000)
+    to_path = models.CharField(max_length=1000)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="running", db_index=True)
+    entries = models.JSONField(default=list, blank=True)
+    moved_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    elapsed_seconds = models.FloatField(default=0)
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["from_path", "to_path", "status"])]
+        constraints = [
+            # Two workers renaming the same source at once would move the same objects twice.
+            models.UniqueConstraint(
+                fields=["from_path"],
+                condition=models.Q(status="running"),
+                name="storage_move_one_running_per_source",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.from_path} -> {self.to_path} ({self.status})"
+
+
+class StorageListingCursor(models.Model):
+    """Last provider cursor and listing snapshot of a content root, kept per consumer for delta syncs."""
+
+    consumer = models.CharField(max_length=50)
+    root_path = models.CharField(max_length=1000)
+    cursor = models.TextField(blank=True, default="")
+    entries = models.JSONField(default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("consumer", "root_path")
+
+    def __str__(self):
+        return f"{self.consumer}: {self.root_path}"
+
+
+class StorageKeyMap(models.Model):
+    """Canonical Supabase object key for an app path, so file operations skip root-alias probing."""
+
+    app_path = models.CharField(max_length=1000, unique=True)
+    storage_key = models.CharField(max_length=1000)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.app_path} -> {self.storage_key}"
+
+
+class FileSearchToken(models.Model):
+    """One lowercase trigram of a file's search_text; the portable substring index used off Postgres."""
+
+    file = models.ForeignKey(FileMetadata, on_delete=models.CASCADE, related_name="search_tokens")
+    token = models.CharField(max_length=3)
+
+    class Meta:
+        unique_together = ("token", "file")
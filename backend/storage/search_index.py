@@ -0,0 +1,101 @@
+from django.db import connection, transaction
+from django.db.models import Case, Count, IntegerField, Value, When
+from django.db.models.functions import Lower
+
+from storage.models import FileMetadata, FileSearchToken
+
+# Queries shorter than one trigram cannot use either index and fall back to a plain substring scan.
+MIN_INDEXED_QUERY_LENGTH = 3
+_INDEX_BATCH_SIZE = 500
+
+
+def uses_trigram_index():
+    # Postgres answers substring filters from the pg_trgm GIN index on search_text (migration 0011).
+    return connection.vendor == "postgresql"
+
+
+def search_text_for(name, display_name, path):
+    parts = [str(value or "").strip().lower() for value in (name, display_name, path)]
+    return "\n".join(part for part in parts if part)
+
+
+def trigrams(text):
+    value = str(text or "").lower()
+    return {value[index : index + 3] for index in range(len(value) - 2) if "\n" not in value[index : index + 3]}
+
+
+def index_files(queryset):
+    """Refresh search_text (and, off Postgres, the n-gram tokens) for rows whose indexed text is out of date."""
+    stale = []
+    for row in queryset.only("id", "name", "display_name", "dropbox_path", "search_text").iterator():
+        text = search_text_for(row.name, row.display_name, row.dropbox_path)
+        if text != row.search_text:
+            row.search_text = text
+            stale.append(row)
+    for start in range(0, len(stale), _INDEX_BATCH_SIZE):
+        batch = stale[start : start + _INDEX_BATCH_SIZE]
+        with transaction.atomic():
+            FileMetadata.objects.bulk_update(batch, ["search_text"])
+            if uses_trigram_index():
+                continue
+            FileSearchToken.objects.filter(file_id__in=[row.id for row in batch]).delete()
+            FileSearchToken.objects.bulk_create(
+                [FileSearchToken(file_id=row.id, token=token) for row in batch for token in trigrams(row.search_text)],
+                batch_size=_INDEX_BATCH_SIZE * 10,
+            )
+    return len(stale)
+
+
+def search_file_metadata(content_type, branch, query):
+    """FileMetadata rows of one content root matching ``query`` as a substring, best matches first.
+
+    Exact names rank above name prefixes, then names containing the query, then display names,
+    then matches only in the folder path; ties go to the most recently modified file.
+    """
+    needle = str(query or "").strip().lower()
+    scope = FileMetadata.objects.filter(content_type=content_type, branch=branch)
+    if not needle:
+        return scope.none()
+
+    matches = scope.filter(search_text__contains=needle)
+    grams = trigrams(needle)
+    if not uses_trigram_index() and len(needle) >= MIN_INDEXED_QUERY_LENGTH and grams:
+        # Every trigram of the query must be present; the substring filter above drops false positives.
+        candidate_ids = (
+            FileSearchToken.objects.filter(token__in=grams, file__content_type=content_type, file__branch=branch)
+            .values("file_id")
+            .annotate(hits=Count("token", distinct=True))
+            .filter(hits=len(grams))
+            .values("file_id")
+        )
+        matches = matches.filter(id__in=candidate_ids)
+
+    return (
+        matches.annotate(lower_name=Lower("name"), lower_display_name=Lower("display_name"))
+        .annotate(
+            search_rank=Case(
+                When(lower_name=needle, then=Value(0)),
+                When(lower_name__startswith=needle, then=Value(1)),
+                When(lower_name__contains=needle, then=Value(2)),
+                When(lower_display_name__contains=needle, then=Value(3)),
+                default=Value(4),
+                output_field=IntegerField(),
+            )
+        )
+        .order_by("search_rank", "-modified_at", "name")
+    )
+
+
+def search_rank(item, query):
+    """Python twin of the search_file_metadata ranking, for provider search results."""
+    needle = str(query or "").strip().lower()
+    name = str(item.get("name") or "").lower()
+    if name == needle:
+        return 0
+    if name.startswith(needle):
+        return 1
+    if needle in name:
+        return 2
+    if needle in str(item.get("display_name") or "").lower():
+        return 3
+    return 4
@@ -1,13 +1,42 @@
-from django.test import TestCase, override_settings
-from unittest.mock import patch
+import errno
+import io
+import itertools
+import tempfile
+import threading
+from datetime import timedelta
 
-from storage import dropbox_service
-from storage.models import FileMetadata, FolderMetadata
+import dropbox
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from unittest.mock import Mock, patch
+
+from storage import backends, disk_cache, dropbox_service, metrics, search_index
+from storage.listing_delta import list_folder_delta
+from storage.models import (
+    FileMetadata,
+    FileSearchToken,
+    FolderMetadata,
+    StorageKeyMap,
+    StorageListingCursor,
+    StorageMoveJournal,
+)
 from storage.views import (
-    _filter_files_by_visibility,
+    _hidden_folder_trie,
+    _ensure_metadata_entry,
+    _invalidate_list_cache,
+    _is_under_hidden_folder,
+    _is_visible_path,
+    _listing_metadata,
     _metadata_listing_fallback,
+    _prepare_listing,
     _prune_metadata_not_in_listing,
-    _sort_files_by_admin_order,
+    _refresh_derived_metadata,
     _sync_metadata_from_listing,
     sync_dropbox_content_for_branch,
 )
@@ -41,6 +70,68 @@ class FolderMetadataSyncTests(TestCase):
         self.assertEqual(subject_row.parent_path, institution_path)
         self.assertEqual(subject_row.depth, 2)
 
+    def test_sync_listing_keeps_admin_fields_and_updates_in_bounded_queries(self):
+        branch = "Civil Engineering"
+        content_type = "objective_mcq"
+        subject_path = "/bridge4ER/Civil Engineering/Objective MCQs/PSC/Concrete Technology"
+        FileMetadata.objects.create(
+            name="Chapter 0.json",
+            display_name="Intro chapter",
+            dropbox_path=f"{subject_path}/Chapter 0.json",
+            content_type=content_type,
+            branch=branch,
+            sort_order=4,
+            file_size=1,
+            is_visible=False,
+        )
+        files = [
+            {"name": f"Chapter {index}.json", "path": f"{subject_path}/Chapter {index}.json", "is_dir": False, "size": 64}
+            for index in range(40)
+        ]
+
+        # Search indexing is covered by FileSearchIndexTests; count only the metadata writes here.
+        with patch("storage.views.index_files"), self.assertNumQueries(12):
+            _sync_metadata_from_listing(files, content_type=content_type, branch=branch)
+
+        self.assertEqual(FileMetadata.objects.filter(dropbox_path__startswith=subject_path).count(), 40)
+        kept = FileMetadata.objects.get(dropbox_path=f"{subject_path}/Chapter 0.json")
+        self.assertEqual((kept.display_name, kept.sort_order, kept.is_visible, kept.file_size), ("Intro chapter", 4, False, 64))
+        created = FileMetadata.objects.get(dropbox_path=f"{subject_path}/Chapter 7.json")
+        self.assertEqual(created.display_name, "Chapter 7.json")
+        self.assertEqual(FolderMetadata.objects.get(dropbox_path=subject_path).depth, 2)
+
+        # An unchanged replay only reads: nothing is written and no derived columns are recomputed.
+        with patch("storage.views.index_files"), self.assertNumQueries(4):
+            _sync_metadata_from_listing(files, content_type=content_type, branch=branch)
+
+    def test_sync_refreshes_only_the_touched_rows(self):
+        branch = "Civil Engineering"
+        content_type = "objective_mcq"
+        root = "/bridge4ER/Civil Engineering/Objective MCQs"
+        listing = [
+            {"name": "Chapter 1.json", "path": f"{root}/Subject {index}/Chapter 1.json", "is_dir": False, "size": 1}
+            for index in range(5)
+        ]
+        with patch("storage.views.index_files"):
+            _sync_metadata_from_listing(listing, content_type=content_type, branch=branch)
+        FolderMetadata.objects.filter(dropbox_path=f"{root}/Subject 3").update(is_visible=False)
+        _refresh_derived_metadata(content_type, branch, prefix=f"{root}/Subject 3")
+        untouched = FileMetadata.objects.get(dropbox_path=f"{root}/Subject 1/Chapter 1.json")
+        FileMetadata.objects.filter(pk=untouched.pk).update(admin_sort_key="stale")
+
+        new_file = {"name": "Chapter 2.json", "path": f"{root}/Subject 3/Chapter 2.json", "is_dir": False, "size": 1}
+        with patch("storage.views.index_files"), CaptureQueriesContext(connection) as queries:
+            _sync_metadata_from_listing([new_file], content_type=content_type, branch=branch)
+
+        untouched.refresh_from_db()
+        self.assertEqual(untouched.admin_sort_key, "stale")
+        folder_reads = [query["sql"] for query in queries.captured_queries if 'FROM "storage_foldermetadata"' in query["sql"]]
+        self.assertTrue(all(" IN (" in sql for sql in folder_reads))
+        row = FileMetadata.objects.get(dropbox_path=new_file["path"])
+        self.assertFalse(row.effective_visible)
+        _refresh_derived_metadata(content_type, branch)
+        self.assertEqual(FileMetadata.objects.get(pk=row.pk).admin_sort_key, row.admin_sort_key)
+
     def test_hidden_folder_hides_descendant_files(self):
         branch = "Civil Engineering"
         content_type = "objective_mcq"
@@ -62,7 +153,7 @@ class FolderMetadataSyncTests(TestCase):
             {"name": "PSC Civil Sub-Engineer", "path": hidden_folder, "is_dir": True},
             {"name": "Coming Soon.json", "path": hidden_file, "is_dir": False, "size": 100},
         ]
-        filtered = _filter_files_by_visibility(
+        filtered = _prepare_listing(
             entries,
             content_type=content_type,
             branch=branch,
@@ -70,7 +161,7 @@ class FolderMetadataSyncTests(TestCase):
         )
         self.assertEqual(filtered, [])
 
-        filtered_with_hidden = _filter_files_by_visibility(
+        filtered_with_hidden = _prepare_listing(
             entries,
             content_type=content_type,
             branch=branch,
@@ -112,10 +203,59 @@ class FolderMetadataSyncTests(TestCase):
             {"name": "Nepal Engineering Council (NEC)", "path": first_path, "is_dir": True},
             {"name": "Public Service Commission (PSC)", "path": second_path, "is_dir": True},
         ]
-        ordered = _sort_files_by_admin_order(entries, content_type=content_type, branch=branch)
+        ordered = _prepare_listing(entries, content_type=content_type, branch=branch)
         self.assertEqual(ordered[0]["path"], second_path)
         self.assertEqual(ordered[1]["path"], first_path)
 
+    def test_stored_admin_sort_keys_follow_folder_order_changes(self):
+        branch = "Civil Engineering"
+        content_type = "objective_mcq"
+        root = "/bridge4ER/Civil Engineering/Objective MCQs"
+        listing = [
+            {"name": "Root.json", "path": f"{root}/Root.json", "is_dir": False, "size": 1},
+            {"name": "ab", "path": f"{root}/ab", "is_dir": True},
+            {"name": "B.json", "path": f"{root}/ab/B.json", "is_dir": False, "size": 1},
+            {"name": "A.json", "path": f"{root}/ab/A.json", "is_dir": False, "size": 1},
+            {"name": "abc", "path": f"{root}/abc", "is_dir": True},
+            {"name": "C.json", "path": f"{root}/abc/C.json", "is_dir": False, "size": 1},
+        ]
+        with patch("storage.views.index_files"):
+            _sync_metadata_from_listing(listing, content_type=content_type, branch=branch)
+
+        def ordered_paths():
+            return [item["path"] for item in _prepare_listing(listing, content_type=content_type, branch=branch)]
+
+        def indexed_paths():
+            return list(
+                FileMetadata.objects.filter(content_type=content_type, branch=branch)
+                .order_by("admin_sort_key")
+                .values_list("dropbox_path", flat=True)
+            )
+
+        self.assertEqual(
+            ordered_paths(),
+            [f"{root}/Root.json", f"{root}/ab", f"{root}/ab/A.json", f"{root}/ab/B.json", f"{root}/abc", f"{root}/abc/C.json"],
+        )
+        FileMetadata.objects.filter(dropbox_path=f"{root}/ab/A.json").update(display_name="Alpha")
+        with self.assertNumQueries(2):
+            prepared = _prepare_listing(listing, content_type=content_type, branch=branch)
+        self.assertEqual(prepared[2]["display_name"], "Alpha")
+        self.assertEqual(prepared[3]["display_name"], "B.json")
+        self.assertEqual(indexed_paths(), [f"{root}/Root.json", f"{root}/ab/A.json", f"{root}/ab/B.json", f"{root}/abc/C.json"])
+
+        FolderMetadata.objects.filter(dropbox_path=f"{root}/abc").update(sort_order=-3)
+        FileMetadata.objects.filter(dropbox_path=f"{root}/ab/B.json").update(sort_order=-1)
+        _refresh_derived_metadata(content_type, branch, prefix=f"{root}/abc")
+        _refresh_derived_metadata(content_type, branch, prefix=f"{root}/ab/B.json")
+
+        self.assertEqual(
+            ordered_paths(),
+            [f"{root}/Root.json", f"{root}/abc", f"{root}/abc/C.json", f"{root}/ab", f"{root}/ab/B.json", f"{root}/ab/A.json"],
+        )
+        self.assertEqual(indexed_paths(), [f"{root}/Root.json", f"{root}/abc/C.json", f"{root}/ab/B.json", f"{root}/ab/A.json"])
+        fallback = _metadata_listing_fallback(content_type=content_type, branch=branch, include_dirs=True)
+        self.assertEqual([item["path"] for item in fallback], [root, *ordered_paths()])
+
     def test_metadata_listing_fallback_uses_saved_file_and_folder_rows(self):
         branch = "Civil Engineering"
         content_type = "subjective"
@@ -152,6 +292,44 @@ class FolderMetadataSyncTests(TestCase):
         self.assertFalse(without_dirs[0]["is_dir"])
         self.assertEqual(without_dirs[0]["path"], file_path)
 
+    def test_metadata_listing_fallback_filters_root_prefix_in_sql(self):
+        branch = "Civil Engineering"
+        content_type = "subjective"
+        root = "/bridge4ER/Civil Engineering/Subjective"
+        for path in (f"{root}/Hydraulics.pdf", f"{root} Archive/Old.pdf", "/bridge4ER/Civil Engineering/Notice/Stray.pdf"):
+            FileMetadata.objects.create(
+                name=path.split("/")[-1],
+                dropbox_path=path,
+                content_type=content_type,
+                branch=branch,
+                file_size=1,
+            )
+
+        with CaptureQueriesContext(connection) as queries:
+            rows = _metadata_listing_fallback(content_type=content_type, branch=branch, include_dirs=False)
+
+        self.assertEqual([row["path"] for row in rows], [f"{root}/Hydraulics.pdf"])
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertIn("LIKE", queries.captured_queries[0]["sql"])
+
+    def test_listing_metadata_loads_only_rows_under_the_content_root(self):
+        branch = "Civil Engineering"
+        content_type = "subjective"
+        root = "/bridge4ER/Civil Engineering/Subjective"
+        for path in (f"{root}/Hydraulics.pdf", f"{root} Archive/Old.pdf", "/bridge4ER/Civil Engineering/Notice/Stray.pdf"):
+            FileMetadata.objects.create(
+                name=path.split("/")[-1],
+                dropbox_path=path,
+                content_type=content_type,
+                branch=branch,
+                file_size=1,
+            )
+
+        file_rows, folder_rows = _listing_metadata(content_type, branch)
+
+        self.assertEqual(list(file_rows), [f"{root}/Hydraulics.pdf"])
+        self.assertEqual(folder_rows, {})
+
     def test_prune_metadata_removes_deleted_bucket_entries(self):
         branch = "Civil Engineering"
         content_type = "objective_mcq"
@@ -184,6 +362,128 @@ class FolderMetadataSyncTests(TestCase):
         self.assertFalse(FileMetadata.objects.filter(dropbox_path=stale_file).exists())
 
 
+    def test_prune_large_listing_stages_paths_instead_of_binding_them(self):
+        branch = "Civil Engineering"
+        content_type = "objective_mcq"
+        folder = "/bridge4ER/Civil Engineering/Objective MCQs/NEC"
+        listing = [
+            {"name": f"Chapter {index}.json", "path": f"{folder}/Chapter {index}.json", "is_dir": False, "size": 10}
+            for index in range(1200)
+        ]
+        stale = {"name": "Old.json", "path": f"{folder}/Old.json", "is_dir": False, "size": 10}
+        with patch("storage.views.index_files"):
+            _sync_metadata_from_listing(listing + [stale], content_type=content_type, branch=branch)
+
+        with CaptureQueriesContext(connection) as queries:
+            result = _prune_metadata_not_in_listing(listing, content_type=content_type, branch=branch)
+
+        self.assertEqual(result, {"files_deleted": 1, "folders_deleted": 0})
+        self.assertFalse(FileMetadata.objects.filter(dropbox_path=stale["path"]).exists())
+        self.assertEqual(FileMetadata.objects.filter(dropbox_path__startswith=folder).count(), 1200)
+        self.assertTrue(all(query["sql"].count("Chapter ") <= 500 for query in queries.captured_queries))
+        self.assertTrue(any("NOT EXISTS" in query["sql"] for query in queries.captured_queries))
+
+    def test_each_prune_stages_into_its_own_table(self):
+        folder = "/bridge4ER/Civil Engineering/Objective MCQs/NEC"
+        listing = [{"name": "Chapter 1.json", "path": f"{folder}/Chapter 1.json", "is_dir": False, "size": 10}]
+        _sync_metadata_from_listing(listing, content_type="objective_mcq", branch="Civil Engineering")
+
+        with CaptureQueriesContext(connection) as queries:
+            _prune_metadata_not_in_listing(listing, content_type="objective_mcq", branch="Civil Engineering")
+            _prune_metadata_not_in_listing(listing, content_type="objective_mcq", branch="Civil Engineering")
+
+        created = [query["sql"].split()[3] for query in queries.captured_queries if query["sql"].startswith("CREATE TEMPORARY")]
+        self.assertEqual(len(created), 4)
+        self.assertEqual(len(set(created)), 4)
+        self.assertFalse(any("IF EXISTS" in query["sql"] for query in queries.captured_queries))
+
+
+class EffectiveVisibilityTests(TestCase):
+    root = "/bridge4ER/Civil Engineering/Objective MCQs"
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_user(
+            username="visibility-admin",
+            password="secret123",
+            email="visibility-admin@example.com",
+            mobile_number="9822222222",
+            full_name="Visibility Admin",
+            is_staff=True,
+        )
+        self.folder = f"{self.root}/PSC"
+        self.nested_file = f"{self.folder}/Concrete/Chapter 1.json"
+        with patch("storage.views.index_files"):
+            _sync_metadata_from_listing(
+                [
+                    {"name": "PSC", "path": self.folder, "is_dir": True},
+                    {"name": "Chapter 1.json", "path": self.nested_file, "is_dir": False, "size": 10},
+                    {"name": "Other.json", "path": f"{self.root}/Other.json", "is_dir": False, "size": 10},
+                ],
+                content_type="objective_mcq",
+                branch="Civil Engineering",
+            )
+
+    def _set_folder_visibility(self, is_visible):
+        self.client.force_authenticate(self.admin)
+        response = self.client.post(
+            "/api/storage/files/visibility/",
+            {"path": self.folder, "is_dir": True, "is_visible": is_visible},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_hiding_a_folder_marks_its_whole_subtree(self):
+        self._set_folder_visibility(False)
+
+        self.assertFalse(FileMetadata.objects.get(dropbox_path=self.nested_file).effective_visible)
+        self.assertFalse(FolderMetadata.objects.get(dropbox_path=f"{self.folder}/Concrete").effective_visible)
+        self.assertTrue(FileMetadata.objects.get(dropbox_path=f"{self.root}/Other.json").effective_visible)
+        with self.assertNumQueries(1):
+            self.assertFalse(_is_visible_path(self.nested_file))
+
+        self._set_folder_visibility(True)
+        self.assertTrue(FileMetadata.objects.get(dropbox_path=self.nested_file).effective_visible)
+        self.assertTrue(_is_visible_path(self.nested_file))
+
+    def test_hidden_folder_trie_matches_whole_segments_case_insensitively(self):
+        trie = _hidden_folder_trie([f"{self.folder}/Concrete"])
+
+        self.assertTrue(_is_under_hidden_folder(f"{self.folder}/concrete", trie))
+        self.assertTrue(_is_under_hidden_folder(f"{self.folder}/CONCRETE/Chapter 2.json", trie))
+        self.assertFalse(_is_under_hidden_folder(f"{self.folder}/Concrete Technology/Chapter 2.json", trie))
+        self.assertFalse(_is_under_hidden_folder(self.folder, trie))
+
+    def test_new_entry_under_hidden_folder_reads_only_its_ancestors(self):
+        self._set_folder_visibility(False)
+        path = f"{self.folder}/Concrete/Chapter 2.json"
+
+        with CaptureQueriesContext(connection) as queries:
+            row = _ensure_metadata_entry(path, content_type="objective_mcq", branch="Civil Engineering")
+
+        self.assertFalse(row.effective_visible)
+        stored_key = row.admin_sort_key
+        _refresh_derived_metadata("objective_mcq", "Civil Engineering")
+        row.refresh_from_db()
+        self.assertEqual(row.admin_sort_key, stored_key)
+        self.assertFalse(row.effective_visible)
+        folder_reads = [query["sql"] for query in queries.captured_queries if "storage_foldermetadata" in query["sql"]]
+        self.assertEqual(len(folder_reads), 1)
+        self.assertIn(" IN (", folder_reads[0])
+
+    def test_pruning_a_hidden_folder_restores_visibility_below_it(self):
+        self._set_folder_visibility(False)
+        concrete = f"{self.folder}/Concrete"
+
+        _prune_metadata_not_in_listing(
+            [{"name": "Concrete", "path": concrete, "is_dir": True}],
+            content_type="objective_mcq",
+            branch="Civil Engineering",
+        )
+
+        self.assertFalse(FolderMetadata.objects.filter(dropbox_path=self.folder).exists())
+        self.assertTrue(FolderMetadata.objects.get(dropbox_path=concrete).effective_visible)
+
 class SupabasePathNormalizationTests(TestCase):
     @override_settings(SUPABASE_STORAGE_ROOT_PREFIX="bridge4er")
     def test_candidate_keys_support_rooted_and_rootless_paths(self):
@@ -241,10 +541,13 @@ class SupabasePathNormalizationTests(TestCase):
             }
             return FakeResponse(payloads.get(prefix, []))
 
+        fake_http = Mock()
+        fake_http.head.return_value = FakeResponse({}, status_code=404)
+        fake_http.post.side_effect = fake_post
         with patch("storage.dropbox_service.connection.cursor", side_effect=RuntimeError("no storage schema")), patch(
-            "storage.dropbox_service.requests.head",
-            return_value=FakeResponse({}, status_code=404),
-        ), patch("storage.dropbox_service.requests.post", side_effect=fake_post):
+            "storage.dropbox_service._supabase_http",
+            return_value=fake_http,
+        ):
             rows = dropbox_service.list_folder_with_metadata(
                 "/bridge4ER/Civil Engineering/Objective MCQs",
                 include_dirs=True,
@@ -258,6 +561,196 @@ class SupabasePathNormalizationTests(TestCase):
             paths,
         )
 
+    @override_settings(STORAGE_PROVIDER="supabase", SUPABASE_STORAGE_ROOT_PREFIX="bridge4er")
+    def test_listing_resolves_all_root_aliases_in_one_query(self):
+        executed = []
+
+        class FakeCursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *_args):
+                return False
+
+            def execute(self, sql, params):
+                executed.append((sql, params))
+
+            def fetchall(self):
+                return [("Civil Engineering/Notice/a.pdf", "12", None)]
+
+        with patch("storage.dropbox_service.connection.cursor", return_value=FakeCursor()):
+            rows = dropbox_service.list_folder_with_metadata("/bridge4ER/Civil Engineering/Notice")
+
+        executed = [(sql, params) for sql, params in executed if "storage.objects" in sql]
+        self.assertEqual(len(executed), 1)
+        self.assertIn("civil engineering/notice", executed[0][1])
+        self.assertIn("bridge4er/civil engineering/notice", executed[0][1])
+        self.assertEqual([row["path"] for row in rows], ["/bridge4ER/Civil Engineering/Notice/a.pdf"])
+
+
+@override_settings(STORAGE_PROVIDER="supabase", SUPABASE_STORAGE_ROOT_PREFIX="")
+class SupabaseBucketStreamingTests(TestCase):
+    def _fake_cursor(self, keys, fetched, fail_after=None):
+        class FakeCursor:
+            def __init__(self):
+                self.rows = [(key, "1", None) for key in keys]
+                self.closed = False
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *_args):
+                self.closed = True
+                return False
+
+            def execute(self, sql, params):
+                self.sql = sql
+
+            def fetchmany(self, size):
+                if fail_after is not None and sum(fetched) >= fail_after:
+                    raise RuntimeError("connection reset")
+                batch, self.rows = self.rows[:size], self.rows[size:]
+                fetched.append(len(batch))
+                return batch
+
+            def fetchall(self):
+                raise AssertionError("whole-bucket queries must not fetch every row at once")
+
+        return FakeCursor()
+
+    def test_whole_bucket_rows_are_streamed_in_batches(self):
+        fetched = []
+        cursor = self._fake_cursor([f"file-{index}.pdf" for index in range(5)], fetched)
+        keys = []
+        with patch("storage.dropbox_service._SUPABASE_STREAM_BATCH_SIZE", 2), patch(
+            "storage.dropbox_service.connection.chunked_cursor",
+            return_value=cursor,
+        ):
+            dropbox_service._each_supabase_bucket_row(lambda row: keys.append(row["key"]))
+
+        self.assertEqual(keys, [f"file-{index}.pdf" for index in range(5)])
+        self.assertEqual(fetched, [2, 2, 1, 0])
+        self.assertTrue(cursor.closed)
+
+    def test_failure_mid_stream_resumes_from_the_rest_api_after_the_last_key(self):
+        fetched = []
+        all_keys = [f"file-{index}.pdf" for index in range(5)]
+        api_rows = [{"key": key, "size": 1, "modified": ""} for key in all_keys]
+        keys = []
+        with patch("storage.dropbox_service._SUPABASE_STREAM_BATCH_SIZE", 2), patch(
+            "storage.dropbox_service.connection.chunked_cursor",
+            return_value=self._fake_cursor(all_keys, fetched, fail_after=2),
+        ), patch("storage.dropbox_service._supabase_query_object_rows_via_api", return_value=api_rows):
+            dropbox_service._each_supabase_bucket_row(lambda row: keys.append(row["key"]))
+
+        self.assertEqual(keys, all_keys)
+
+    def test_whole_bucket_falls_back_to_the_rest_api(self):
+        api_rows = [{"key": "a.pdf", "size": 1, "modified": ""}]
+        with patch("storage.dropbox_service.connection.chunked_cursor", side_effect=RuntimeError("no storage schema")), patch(
+            "storage.dropbox_service._supabase_query_object_rows_via_api",
+            return_value=api_rows,
+        ) as via_api:
+            rows = dropbox_service._supabase_query_object_rows("")
+
+        self.assertEqual(rows, api_rows)
+        via_api.assert_called_once_with("")
+
+    def test_search_fallback_filters_the_streamed_bucket(self):
+        streamed = [
+            {"key": "notes/Anatomy.pdf", "size": 1, "modified": "2024-01-01"},
+            {"key": "notes/physics.pdf", "size": 1, "modified": "2024-01-02"},
+            {"key": "anatomy-2.pdf", "size": 2, "modified": "2024-01-03"},
+        ]
+
+        def fake_each(consume):
+            for row in streamed:
+                consume(row)
+
+        with patch("storage.dropbox_service._supabase_candidate_keys_from_app_path", return_value=[]), patch(
+            "storage.dropbox_service.connection.cursor",
+            side_effect=RuntimeError("no storage schema"),
+        ), patch("storage.dropbox_service._each_supabase_bucket_row", side_effect=fake_each), patch(
+            "storage.dropbox_service._supabase_query_object_rows",
+        ) as whole_bucket:
+            entries = dropbox_service._supabase_search_files("/", "anatomy")
+
+        whole_bucket.assert_not_called()
+        self.assertEqual([entry["name"] for entry in entries], ["anatomy-2.pdf", "Anatomy.pdf"])
+
+    def test_bucket_listing_emits_each_folder_once(self):
+        keys = ["a/b/1.pdf", "a/b/2.pdf", "a/c.pdf", "b/1.pdf"]
+        with patch("storage.dropbox_service._supabase_candidate_keys_from_app_path", return_value=[]), patch(
+            "storage.dropbox_service.connection.chunked_cursor",
+            return_value=self._fake_cursor(keys, []),
+        ):
+            entries = dropbox_service._supabase_list_folder_with_metadata("/", recursive=True)
+
+        folders = sorted(entry["name"] for entry in entries if entry["is_dir"])
+        self.assertEqual(folders, ["a", "b", "b"])
+        self.assertEqual(len([entry for entry in entries if not entry["is_dir"]]), 4)
+
+
+class SupabaseHttpSessionTests(TestCase):
+    @override_settings(SUPABASE_HTTP_POOL_SIZE=3, SUPABASE_HTTP_RETRIES=1)
+    def test_session_is_shared_and_pool_is_bounded(self):
+        with patch("storage.dropbox_service._supabase_http_session", None):
+            session = dropbox_service._supabase_http()
+            self.assertIs(dropbox_service._supabase_http(), session)
+        adapter = session.get_adapter("https://example.supabase.co")
+        self.assertEqual(adapter._pool_maxsize, 3)
+        self.assertTrue(adapter._pool_block)
+        self.assertEqual(adapter.max_retries.total, 1)
+        self.assertNotIn("POST", adapter.max_retries.allowed_methods)
+
+    @override_settings(
+        SUPABASE_REQUEST_TIMEOUT_SECONDS=45,
+        SUPABASE_CONNECT_TIMEOUT_SECONDS=4,
+        SUPABASE_OPERATION_TIMEOUTS={"sign": 10},
+    )
+    def test_operation_timeouts_override_read_timeout(self):
+        self.assertEqual(dropbox_service._supabase_operation_timeout("sign"), (4, 10))
+        self.assertEqual(dropbox_service._supabase_operation_timeout("download"), (4, 45))
+
+
+@override_settings(
+    STORAGE_PROVIDER="supabase",
+    SUPABASE_URL="https://example.supabase.co",
+    SUPABASE_SERVICE_ROLE_KEY="service-role",
+    SUPABASE_STORAGE_BUCKET="bridge4ER",
+    SUPABASE_LIST_CONCURRENCY=4,
+)
+class SupabaseApiCrawlerTests(TestCase):
+    def test_sibling_prefixes_are_listed_concurrently(self):
+        # Both sibling folders must be in flight at once for the barrier to release.
+        barrier = threading.Barrier(2, timeout=5)
+
+        def fake_list_page(prefix_key="", offset=0):
+            if prefix_key == "root":
+                return [{"name": "A", "id": None}, {"name": "B", "id": None}]
+            if prefix_key in {"root/A", "root/B"}:
+                barrier.wait()
+                return [{"name": "file.json", "id": "object", "metadata": {"size": 10}}]
+            return []
+
+        with patch("storage.dropbox_service._supabase_object_row_from_api_head", return_value=None), patch(
+            "storage.dropbox_service._supabase_list_api_page",
+            side_effect=fake_list_page,
+        ):
+            rows = dropbox_service._supabase_query_object_rows_via_api("root")
+
+        self.assertEqual([row["key"] for row in rows], ["root/A/file.json", "root/B/file.json"])
+        self.assertEqual(rows[0]["size"], 10)
+
+    @override_settings(SUPABASE_LIST_DEADLINE_SECONDS=5)
+    def test_crawl_deadline_raises(self):
+        with patch("storage.dropbox_service._supabase_object_row_from_api_head", return_value=None), patch(
+            "storage.dropbox_service._supabase_list_api_prefix",
+            return_value=([], ["root/child"]),
+        ), patch("storage.dropbox_service.time.monotonic", side_effect=itertools.count(0, 10)):
+            with self.assertRaises(RuntimeError):
+                dropbox_service._supabase_query_object_rows_via_api("root")
+
 
 class StorageContentSyncTests(TestCase):
     def test_sync_content_preserves_existing_metadata_by_default(self):
@@ -278,8 +771,12 @@ class StorageContentSyncTests(TestCase):
         )
 
         with patch(
-            "storage.views.list_folder_with_metadata",
-            return_value=[{"name": "Chapter 1.json", "path": current_file, "is_dir": False, "size": 128}],
+            "storage.listing_delta.list_folder_changes",
+            return_value={
+                "entries": [{"name": "Chapter 1.json", "path": current_file, "is_dir": False, "size": 128}],
+                "cursor": "",
+                "reset": True,
+            },
         ):
             payload = sync_dropbox_content_for_branch(
                 branch=branch,
@@ -326,3 +823,1227 @@ class StorageContentSyncTests(TestCase):
             branch="Civil Engineering",
             replace_existing=False,
         )
+
+
+@override_settings(
+    STORAGE_PROVIDER="supabase",
+    SUPABASE_URL="https://example.supabase.co",
+    SUPABASE_SERVICE_ROLE_KEY="service-role",
+    SUPABASE_STORAGE_PUBLIC=True,
+    SECURE_SSL_REDIRECT=False,
+)
+class StorageStreamingDeliveryTests(TestCase):
+    notice_path = "/bridge4ER/Civil Engineering/Notice/Exam Notice.pdf"
+
+    class FakeStreamResponse:
+        def __init__(self, body, status_code=200, headers=None):
+            self.body = body
+            self.status_code = status_code
+            self.headers = headers or {}
+            self.closed = False
+
+        def iter_content(self, chunk_size=1):
+            for index in range(0, len(self.body), 4):
+                yield self.body[index : index + 4]
+
+        def raise_for_status(self):
+            if self.status_code >= 400:
+                raise RuntimeError(f"status {self.status_code}")
+
+        def close(self):
+            self.closed = True
+
+    def test_preview_streams_requested_range(self):
+        upstream = self.FakeStreamResponse(
+            b"2345",
+            status_code=206,
+            headers={"Content-Range": "bytes 2-5/10", "ETag": '"v1"'},
+        )
+        fake_http = Mock()
+        fake_http.get.return_value = upstream
+        fake_get = fake_http.get
+        with patch("storage.dropbox_service._supabase_http", return_value=fake_http):
+            response = self.client.get(
+                "/api/storage/files/preview/",
+                {"path": self.notice_path},
+                HTTP_RANGE="bytes=2-5",
+            )
+            body = b"".join(response.streaming_content)
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(response["Content-Length"], "4")
+        self.assertEqual(body, b"2345")
+        self.assertEqual(fake_get.call_args.kwargs["headers"], {"Range": "bytes=2-5"})
+        self.assertTrue(fake_get.call_args.kwargs["stream"])
+        self.assertTrue(upstream.closed)
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_if_range_is_forwarded_upstream(self):
+        upstream = self.FakeStreamResponse(b"0123456789", headers={"ETag": '"v2"'})
+        fake_http = Mock()
+        fake_http.get.return_value = upstream
+        with patch("storage.dropbox_service._supabase_http", return_value=fake_http):
+            response = self.client.get(
+                "/api/storage/files/preview/",
+                {"path": self.notice_path},
+                HTTP_RANGE="bytes=2-5",
+                HTTP_IF_RANGE='"v1"',
+                HTTP_ACCEPT_ENCODING="gzip",
+            )
+            body = b"".join(response.streaming_content)
+
+        fake_http.get.assert_called_once()
+        self.assertEqual(fake_http.get.call_args.kwargs["headers"], {"Range": "bytes=2-5", "If-Range": '"v1"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, b"0123456789")
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_dropbox_range_is_requested_upstream(self):
+        metadata = type("Meta", (), {"rev": "abc", "server_modified": None, "size": 10})()
+        upstream = self.FakeStreamResponse(b"789", status_code=206, headers={"Content-Range": "bytes 7-9/10"})
+        client = Mock()
+        client.clone.return_value.files_download.return_value = (metadata, upstream)
+        with patch("storage.dropbox_service._execute_with_auth_retry", side_effect=lambda operation: operation(client)):
+            stream = dropbox_service._dropbox_download_stream(self.notice_path, byte_range=(None, 3))
+
+        client.clone.assert_called_once_with(headers={"Range": "bytes=-3"})
+        self.assertEqual((stream["start"], stream["end"], stream["total_size"]), (7, 9, 10))
+        self.assertEqual(b"".join(stream["chunks"]), b"789")
+
+    def test_dropbox_range_is_sliced_when_the_server_ignores_it(self):
+        metadata = type("Meta", (), {"rev": "abc", "server_modified": None, "size": 10})()
+        upstream = self.FakeStreamResponse(b"0123456789")
+        with patch("storage.dropbox_service._execute_with_auth_retry", return_value=(metadata, upstream)):
+            stream = dropbox_service._dropbox_download_stream(self.notice_path, byte_range=(None, 3))
+
+        self.assertEqual((stream["start"], stream["end"]), (7, 9))
+        self.assertEqual(b"".join(stream["chunks"]), b"789")
+
+    def test_unsatisfiable_range_returns_416(self):
+        metadata = type("Meta", (), {"rev": "abc", "server_modified": None, "size": 10})()
+        upstream = self.FakeStreamResponse(b"0123456789")
+        with override_settings(STORAGE_PROVIDER="dropbox"), patch(
+            "storage.dropbox_service._execute_with_auth_retry",
+            return_value=(metadata, upstream),
+        ):
+            response = self.client.get(
+                "/api/storage/files/preview/",
+                {"path": self.notice_path},
+                HTTP_RANGE="bytes=50-",
+            )
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */10")
+
+
+@override_settings(
+    SUPABASE_URL="https://example.supabase.co",
+    SUPABASE_SERVICE_ROLE_KEY="service-role",
+    SUPABASE_SIGNED_URL_TTL_SECONDS=3600,
+)
+class SupabaseSignedUrlCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_callers_share_one_signing_call(self):
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow_sign(key, expires_in=None):
+            calls.append((key, expires_in))
+            started.set()
+            release.wait(timeout=5)
+            return f"https://example.supabase.co/signed/{key}"
+
+        results = []
+        with patch("storage.dropbox_service._supabase_create_signed_url", side_effect=slow_sign):
+            workers = [
+                threading.Thread(
+                    target=lambda: results.append(dropbox_service._supabase_cached_signed_url("Notice/a.pdf"))
+                )
+                for _ in range(5)
+            ]
+            for worker in workers:
+                worker.start()
+            started.wait(timeout=5)
+            release.set()
+            for worker in workers:
+                worker.join(timeout=5)
+            # A later download reuses the cached URL instead of signing again.
+            dropbox_service._supabase_cached_signed_url("Notice/a.pdf", expires_in=120)
+
+        self.assertEqual(calls, [("Notice/a.pdf", 3600)])
+        self.assertEqual(set(results), {"https://example.supabase.co/signed/Notice/a.pdf"})
+
+    def test_waiters_share_the_leaders_error_instead_of_retrying(self):
+        started = threading.Event()
+        release = threading.Event()
+        waiting = []
+        calls = []
+
+        def failing_producer():
+            calls.append(1)
+            started.set()
+            release.wait(timeout=5)
+            raise RuntimeError("signing failed")
+
+        def timeout_seconds():
+            waiting.append(1)
+            if len(waiting) == 4:
+                release.set()
+            return 5
+
+        errors = []
+
+        def call():
+            try:
+                dropbox_service._single_flight("flight", failing_producer)
+            except RuntimeError as exc:
+                errors.append(str(exc))
+
+        with patch("storage.dropbox_service._supabase_timeout_seconds", side_effect=timeout_seconds):
+            leader = threading.Thread(target=call)
+            leader.start()
+            started.wait(timeout=5)
+            waiters = [threading.Thread(target=call) for _ in range(4)]
+            for worker in waiters:
+                worker.start()
+            for worker in [leader, *waiters]:
+                worker.join(timeout=5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(errors, ["signing failed"] * 5)
+
+    def test_delete_and_move_evict_cached_urls(self):
+        with patch(
+            "storage.dropbox_service._supabase_create_signed_url",
+            side_effect=lambda key, expires_in=None: f"signed:{key}",
+        ) as sign:
+            dropbox_service._supabase_cached_signed_url("Notice/a.pdf")
+            dropbox_service._supabase_cached_signed_url("Notice/b.pdf")
+            fake_http = Mock()
+            fake_http.delete.return_value = Mock(status_code=200, content=b"[]", json=Mock(return_value=[]))
+            fake_http.post.return_value = Mock(status_code=200)
+            with patch("storage.dropbox_service._supabase_http", return_value=fake_http):
+                dropbox_service._supabase_delete_object_keys(["Notice/a.pdf"])
+                dropbox_service._supabase_move_object_key("Notice/b.pdf", "Notice/c.pdf")
+            dropbox_service._supabase_cached_signed_url("Notice/a.pdf")
+            dropbox_service._supabase_cached_signed_url("Notice/b.pdf")
+
+        self.assertEqual(sign.call_count, 4)
+
+
+@override_settings(
+    STORAGE_PROVIDER="supabase",
+    SUPABASE_URL="https://example.supabase.co",
+    SUPABASE_SERVICE_ROLE_KEY="service-role",
+    SUPABASE_STORAGE_BUCKET="bridge4er",
+    SUPABASE_DELETE_BATCH_SIZE=2,
+    SUPABASE_BATCH_CONCURRENCY=2,
+)
+class SupabaseBatchDeleteTests(TestCase):
+    def test_keys_are_removed_in_batches_and_reported(self):
+        def fake_delete(url, json=None, headers=None, timeout=None):
+            if "Notice/c.pdf" in json["prefixes"]:
+                raise dropbox_service.requests.ConnectionError("connection reset")
+            removed = [{"name": key} for key in json["prefixes"] if key != "Notice/b.pdf"]
+            return Mock(status_code=200, content=b"[...]", json=Mock(return_value=removed))
+
+        fake_http = Mock()
+        fake_http.delete.side_effect = fake_delete
+        with patch("storage.dropbox_service._supabase_http", return_value=fake_http):
+            report = dropbox_service._supabase_delete_object_keys(
+                ["Notice/a.pdf", "Notice/b.pdf", "Notice/c.pdf", "Notice/d.pdf", "Notice/a.pdf"]
+            )
+
+        self.assertEqual(fake_http.delete.call_count, 2)
+        self.assertEqual(
+            sorted(len(call.kwargs["json"]["prefixes"]) for call in fake_http.delete.call_args_list),
+            [2, 2],
+        )
+        self.assertEqual(report["deleted"], ["Notice/a.pdf"])
+        self.assertEqual(report["missing"], ["Notice/b.pdf"])
+        self.assertEqual(sorted(report["failed"]), ["Notice/c.pdf", "Notice/d.pdf"])
+        self.assertIn("connection reset", report["failed"]["Notice/c.pdf"])
+
+    def test_delete_file_reports_app_paths(self):
+        with patch(
+            "storage.dropbox_service._supabase_query_object_rows_for_prefixes",
+            return_value=[{"key": "bridge4er/Civil Engineering/Notice/a.pdf"}],
+        ), patch(
+            "storage.dropbox_service._supabase_delete_object_keys",
+            return_value={
+                "deleted": [],
+                "missing": ["Civil Engineering/Notice", "bridge4er/Civil Engineering/Notice"],
+                "failed": {"bridge4er/Civil Engineering/Notice/a.pdf": "connection reset"},
+            },
+        ):
+            report = dropbox_service._supabase_delete_file("/bridge4ER/Civil Engineering/Notice")
+
+        self.assertEqual(report["missing"], ["/bridge4ER/Civil Engineering/Notice"])
+        self.assertEqual(report["failed"], {"/bridge4ER/Civil Engineering/Notice/a.pdf": "connection reset"})
+
+    def test_delete_view_keeps_metadata_of_objects_that_failed(self):
+        admin = get_user_model().objects.create_user(
+            username="delete-admin",
+            password="secret123",
+            email="delete-admin@example.com",
+            mobile_number="9833333333",
+            full_name="Delete Admin",
+            is_staff=True,
+        )
+        folder = "/bridge4ER/Civil Engineering/Notice/Old"
+        for path in (f"{folder}/2023/a.pdf", f"{folder}/2023/b.pdf", f"{folder}/c.pdf"):
+            FileMetadata.objects.create(
+                name=path.split("/")[-1],
+                dropbox_path=path,
+                content_type="notice",
+                branch="Civil Engineering",
+                file_size=1,
+            )
+        for path in (folder, f"{folder}/2023"):
+            FolderMetadata.objects.create(
+                name=path.split("/")[-1], dropbox_path=path, content_type="notice", branch="Civil Engineering"
+            )
+        client = APIClient()
+        client.force_authenticate(admin)
+
+        with patch(
+            "storage.views.delete_file",
+            return_value={"deleted": [], "missing": [], "failed": {f"{folder}/2023/b.pdf": "connection reset"}},
+        ):
+            response = client.post("/api/storage/files/delete/", {"path": folder}, format="json", secure=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(FileMetadata.objects.values_list("dropbox_path", flat=True)), [f"{folder}/2023/b.pdf"])
+        self.assertEqual(
+            sorted(FolderMetadata.objects.values_list("dropbox_path", flat=True)), [folder, f"{folder}/2023"]
+        )
+
+
+@override_settings(
+    STORAGE_PROVIDER="supabase",
+    SUPABASE_URL="https://example.supabase.co",
+    SUPABASE_SERVICE_ROLE_KEY="service-role",
+    SUPABASE_STORAGE_BUCKET="bridge4er",
+    SUPABASE_MOVE_CONCURRENCY=4,
+)
+class SupabaseJournaledMoveTests(TestCase):
+    from_path = "/bridge4ER/Civil Engineering/Notice/Old"
+    to_path = "/bridge4ER/Civil Engineering/Notice/New"
+
+    def setUp(self):
+        rows = [{"key": f"bridge4ER/Civil Engineering/Notice/Old/{index}.pdf"} for index in range(6)]
+        patches = [
+            patch("storage.dropbox_service._first_existing_key", return_value="bridge4ER/Civil Engineering/Notice/Old"),
+            patch("storage.dropbox_service._supabase_query_object_rows", return_value=rows),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_failed_objects_are_resumed_from_the_journal(self):
+        moves = []
+        lock = threading.Lock()
+
+        def flaky_move(source_key, destination_key):
+            with lock:
+                moves.append(source_key)
+            if source_key.endswith("/3.pdf") and moves.count(source_key) == 1:
+                raise RuntimeError("gateway timeout")
+            return True
+
+        with patch("storage.dropbox_service._supabase_move_object_key", side_effect=flaky_move):
+            with self.assertRaises(dropbox_service.StorageMoveIncomplete) as raised:
+                dropbox_service.move_path(self.from_path, self.to_path)
+            journal = StorageMoveJournal.objects.get()
+            self.assertEqual(journal.status, "failed")
+            self.assertEqual((journal.moved_count, journal.failed_count), (5, 1))
+            self.assertEqual(list(raised.exception.report["errors"]), ["bridge4ER/Civil Engineering/Notice/Old/3.pdf"])
+
+            report = dropbox_service.move_path(self.from_path, self.to_path)
+
+        self.assertEqual(len(moves), 7)
+        self.assertEqual(moves[-1], "bridge4ER/Civil Engineering/Notice/Old/3.pdf")
+        self.assertEqual((report["status"], report["moved"], report["failed"]), ("completed", 6, 0))
+        self.assertEqual(report["journal_id"], journal.id)
+
+    def test_rollback_moves_objects_back_to_their_source_keys(self):
+        def fail_last(source_key, destination_key):
+            if source_key.endswith("/5.pdf"):
+                raise RuntimeError("gateway timeout")
+            return True
+
+        with patch("storage.dropbox_service._supabase_move_object_key", side_effect=fail_last):
+            with self.assertRaises(dropbox_service.StorageMoveIncomplete):
+                dropbox_service.move_path(self.from_path, self.to_path)
+        journal = StorageMoveJournal.objects.get()
+
+        with patch("storage.dropbox_service._supabase_move_object_key", return_value=True) as move:
+            report = dropbox_service.rollback_move(journal.id)
+
+        self.assertEqual(move.call_count, 5)
+        for call in move.call_args_list:
+            source_key, destination_key = call.args
+            self.assertIn("/Notice/New/", source_key)
+            self.assertIn("/Notice/Old/", destination_key)
+        self.assertEqual((report["status"], report["moved"], report["restored"]), ("rolled_back", 0, 5))
+
+    def test_only_failed_journals_can_be_rolled_back(self):
+        journal = StorageMoveJournal.objects.create(from_path=self.from_path, to_path=self.to_path, status="completed")
+
+        with patch("storage.dropbox_service._supabase_move_object_key") as move:
+            with self.assertRaises(Exception):
+                dropbox_service.rollback_move(journal.id)
+
+        move.assert_not_called()
+
+    def test_journal_advanced_by_another_worker_is_not_claimed(self):
+        StorageMoveJournal.objects.create(from_path=self.from_path, to_path=self.to_path, entries=[])
+
+        with patch("storage.dropbox_service._supabase_move_object_key") as move:
+            with self.assertRaises(Exception):
+                dropbox_service.move_path(self.from_path, self.to_path)
+
+        move.assert_not_called()
+
+    def test_concurrent_rename_of_the_same_source_cannot_start_a_second_journal(self):
+        # The other worker's journal lands between this worker's claim check and its create.
+        StorageMoveJournal.objects.create(from_path=self.from_path, to_path=self.to_path, entries=[])
+
+        with patch("storage.dropbox_service._claim_move_journal", return_value=None), patch(
+            "storage.dropbox_service._supabase_move_object_key"
+        ) as move:
+            with self.assertRaises(Exception):
+                dropbox_service.move_path(self.from_path, self.to_path)
+
+        move.assert_not_called()
+        self.assertEqual(StorageMoveJournal.objects.count(), 1)
+
+    def test_source_being_moved_elsewhere_is_not_renamed_again(self):
+        StorageMoveJournal.objects.create(from_path=self.from_path, to_path=f"{self.to_path} 2", entries=[])
+
+        with patch("storage.dropbox_service._supabase_move_object_key") as move:
+            with self.assertRaises(Exception):
+                dropbox_service.move_path(self.from_path, self.to_path)
+
+        move.assert_not_called()
+
+    def test_stale_journal_is_claimed_and_rebuilt_from_the_source(self):
+        moved = {"source": "bridge4ER/Civil Engineering/Notice/Old/0.pdf", "state": "moved"}
+        moved["destination"] = moved["source"].replace("/Old/", "/New/")
+        journal = StorageMoveJournal.objects.create(
+            from_path=self.from_path,
+            to_path=self.to_path,
+            entries=[moved, {"source": "gone.pdf", "destination": "gone-new.pdf", "state": "pending"}],
+        )
+        StorageMoveJournal.objects.filter(id=journal.id).update(updated_at=timezone.now() - timedelta(hours=1))
+
+        with patch("storage.dropbox_service._supabase_move_object_key", return_value=True) as move:
+            report = dropbox_service.move_path(self.from_path, self.to_path)
+
+        moved_sources = sorted(call.args[0].rsplit("/", 1)[-1] for call in move.call_args_list)
+        self.assertEqual(moved_sources, ["1.pdf", "2.pdf", "3.pdf", "4.pdf", "5.pdf"])
+        self.assertEqual((report["journal_id"], report["status"], report["total"]), (journal.id, "completed", 6))
+
+
+@override_settings(
+    STORAGE_PROVIDER="supabase",
+    SUPABASE_URL="https://example.supabase.co",
+    SUPABASE_SERVICE_ROLE_KEY="service-role",
+    SUPABASE_STORAGE_BUCKET="media",
+    SUPABASE_STORAGE_PUBLIC=True,
+)
+class SupabaseKeyMapTests(TestCase):
+    app_path = "/bridge4ER/Civil Engineering/Notice/a.pdf"
+
+    def setUp(self):
+        cache.clear()
+        dropbox_service._supabase_key_map.clear()
+        self.addCleanup(dropbox_service._supabase_key_map.clear)
+
+    def test_listing_does_not_write_the_key_map(self):
+        rows = [{"key": "Civil Engineering/Notice/a.pdf", "size": 1, "modified": ""}]
+        with patch("storage.dropbox_service._supabase_query_object_rows_for_prefixes", return_value=rows):
+            dropbox_service._supabase_list_folder_with_metadata("/bridge4ER/Civil Engineering/Notice")
+
+        self.assertFalse(StorageKeyMap.objects.exists())
+
+    def test_missing_rows_are_memoized(self):
+        dropbox_service._known_supabase_key(self.app_path)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(dropbox_service._known_supabase_key(self.app_path), "")
+
+    def test_forgetting_keys_invalidates_other_processes_memo(self):
+        StorageKeyMap.objects.create(app_path=self.app_path.lower(), storage_key="Civil Engineering/Notice/a.pdf")
+        self.assertEqual(dropbox_service._known_supabase_key(self.app_path), "Civil Engineering/Notice/a.pdf")
+
+        # Another worker moves the file away: its database delete and generation bump are all this process sees.
+        StorageKeyMap.objects.all().delete()
+        cache.set(dropbox_service._SUPABASE_KEY_MAP_GENERATION_KEY, 99, timeout=None)
+
+        self.assertEqual(dropbox_service._known_supabase_key(self.app_path), "")
+
+    def test_download_goes_straight_to_the_mapped_key(self):
+        StorageKeyMap.objects.create(app_path=self.app_path.lower(), storage_key="Civil Engineering/Notice/a.pdf")
+        fake_http = Mock()
+        fake_http.get.return_value = Mock(status_code=200, content=b"pdf")
+
+        with patch("storage.dropbox_service._supabase_http", return_value=fake_http):
+            self.assertEqual(dropbox_service._supabase_download_file(self.app_path), b"pdf")
+
+        fake_http.get.assert_called_once()
+        self.assertTrue(fake_http.get.call_args[0][0].endswith("/public/media/Civil%20Engineering/Notice/a.pdf"))
+
+    def test_alias_found_by_probing_is_remembered(self):
+        fake_http = Mock()
+        fake_http.get.side_effect = lambda url, **_kwargs: (
+            Mock(status_code=200, content=b"pdf") if "/public/media/Civil" in url else Mock(status_code=404)
+        )
+
+        with patch("storage.dropbox_service._supabase_http", return_value=fake_http):
+            dropbox_service._supabase_download_file(self.app_path)
+
+        self.assertEqual(StorageKeyMap.objects.get().storage_key, "Civil Engineering/Notice/a.pdf")
+
+    def test_delete_forgets_keys_below_the_path(self):
+        StorageKeyMap.objects.create(app_path=self.app_path.lower(), storage_key="Civil Engineering/Notice/a.pdf")
+        StorageKeyMap.objects.create(app_path="/bridge4er/civil engineering/notices.pdf", storage_key="x.pdf")
+
+        with patch("storage.dropbox_service._supabase_query_object_rows_for_prefixes", return_value=[]), patch(
+            "storage.dropbox_service._supabase_delete_object_keys",
+            return_value={"deleted": [], "missing": [], "failed": {}},
+        ):
+            dropbox_service._supabase_delete_file("/bridge4ER/Civil Engineering/Notice")
+
+        self.assertEqual(list(StorageKeyMap.objects.values_list("storage_key", flat=True)), ["x.pdf"])
+
+
+@override_settings(STORAGE_PROVIDER="dropbox", DROPBOX_AUTO_SYNC_ENABLED=False, SECURE_SSL_REDIRECT=False)
+class FileSearchIndexTests(TestCase):
+    root = "/bridge4ER/Civil Engineering/Notice"
+
+    def _file(self, name, display_name="", folder=""):
+        path = f"{self.root}{folder}/{name}"
+        return FileMetadata.objects.create(
+            name=name,
+            display_name=display_name or name,
+            dropbox_path=path,
+            content_type="notice",
+            branch="Civil Engineering",
+            file_size=1,
+        )
+
+    def test_index_files_writes_trigrams_once(self):
+        row = self._file("Exam.pdf")
+
+        self.assertEqual(search_index.index_files(FileMetadata.objects.all()), 1)
+        self.assertEqual(search_index.index_files(FileMetadata.objects.all()), 0)
+        row.refresh_from_db()
+        self.assertIn("exam.pdf", row.search_text)
+        self.assertTrue(FileSearchToken.objects.filter(file=row, token="xam").exists())
+
+    def test_search_does_not_index_on_read(self):
+        row = self._file("Exam.pdf")
+
+        self.assertEqual(list(search_index.search_file_metadata("notice", "Civil Engineering", "exam")), [])
+        row.refresh_from_db()
+        self.assertEqual(row.search_text, "")
+        self.assertFalse(FileSearchToken.objects.exists())
+
+    def test_search_ranks_name_matches_above_path_matches(self):
+        self._file("Result.pdf", folder="/Exam Routine")
+        self._file("Old exam notes.pdf")
+        self._file("exam.pdf")
+        self._file("Circular.pdf", display_name="Exam circular")
+        self._file("Syllabus.pdf")
+        search_index.index_files(FileMetadata.objects.all())
+
+        names = list(search_index.search_file_metadata("notice", "Civil Engineering", "Exam").values_list("name", flat=True))
+
+        self.assertEqual(names, ["exam.pdf", "Old exam notes.pdf", "Circular.pdf", "Result.pdf"])
+
+    def test_search_view_pages_with_limit_and_offset(self):
+        for index in range(5):
+            self._file(f"Exam {index}.pdf")
+        search_index.index_files(FileMetadata.objects.all())
+
+        response = self.client.get(
+            "/api/storage/files/search/",
+            {"q": "exam", "content_type": "notice", "limit": 2, "offset": 2},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Total-Count"], "5")
+        self.assertEqual(len(response.json()), 2)
+
+    def test_search_view_leaves_files_under_hidden_folders_out_of_the_total(self):
+        self._file("Exam visible.pdf")
+        FileMetadata.objects.filter(pk=self._file("Exam hidden.pdf", folder="/Old").pk).update(effective_visible=False)
+        search_index.index_files(FileMetadata.objects.all())
+
+        response = self.client.get("/api/storage/files/search/", {"q": "exam", "content_type": "notice"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Total-Count"], "1")
+        self.assertEqual([entry["name"] for entry in response.json()], ["Exam visible.pdf"])
+
+
+class ChunkedUploadTests(TestCase):
+    @override_settings(
+        STORAGE_PROVIDER="supabase",
+        SUPABASE_URL="https://example.supabase.co",
+        SUPABASE_SERVICE_ROLE_KEY="service-role",
+        SUPABASE_STORAGE_BUCKET="bridge4er",
+    )
+    def test_supabase_resumes_from_server_offset_after_failed_chunk(self):
+        chunk_size = dropbox_service._SUPABASE_TUS_CHUNK_SIZE
+        payload = b"a" * chunk_size + b"b" * 10
+        received = []
+
+        def fake_patch(url, data=None, headers=None, timeout=None):
+            offset = int(headers["Upload-Offset"])
+            if offset == chunk_size and not any(start == chunk_size for start, _ in received):
+                received.append((offset, None))
+                raise dropbox_service.requests.ConnectionError("connection reset")
+            received.append((offset, len(data)))
+            return Mock(status_code=204, headers={"Upload-Offset": str(offset + len(data))})
+
+        fake_http = Mock()
+        fake_http.post.return_value = Mock(status_code=201, headers={"Location": "/storage/v1/upload/resumable/abc"})
+        fake_http.patch.side_effect = fake_patch
+        fake_http.head.return_value = Mock(status_code=200, headers={"Upload-Offset": str(chunk_size)})
+        with patch("storage.dropbox_service._supabase_http", return_value=fake_http), patch(
+            "storage.dropbox_service._supabase_get_file_metadata", return_value={"size": len(payload)}
+        ):
+            dropbox_service.upload_file("/bridge4ER/Civil Engineering/Syllabus/archive.zip", io.BytesIO(payload))
+
+        headers = fake_http.post.call_args.kwargs["headers"]
+        self.assertEqual(headers["Upload-Length"], str(len(payload)))
+        self.assertEqual(fake_http.patch.call_args.args[0], "https://example.supabase.co/storage/v1/upload/resumable/abc")
+        self.assertEqual(received, [(0, chunk_size), (chunk_size, None), (chunk_size, 10)])
+
+    @override_settings(STORAGE_PROVIDER="dropbox", DROPBOX_UPLOAD_CHUNK_SIZE_MB=1)
+    def test_dropbox_large_upload_uses_session_chunks(self):
+        client = Mock()
+        client.files_upload_session_start.return_value = Mock(session_id="session-1")
+        appended = []
+        client.files_upload_session_append_v2.side_effect = lambda chunk, cursor: appended.append(
+            (cursor.offset, len(chunk))
+        )
+        megabyte = 1024 * 1024
+        with patch(
+            "storage.dropbox_service._execute_with_auth_retry", side_effect=lambda operation: operation(client)
+        ), patch("storage.dropbox_service._dropbox_get_file_metadata", return_value={}):
+            dropbox_service.upload_file("/bridge4ER/archive.zip", io.BytesIO(b"x" * (2 * megabyte + 5)))
+
+        client.files_upload.assert_not_called()
+        self.assertEqual(len(client.files_upload_session_start.call_args.args[0]), megabyte)
+        self.assertEqual(appended, [(megabyte, megabyte), (2 * megabyte, 5)])
+        cursor = client.files_upload_session_finish.call_args.args[1]
+        self.assertEqual(cursor.offset, 2 * megabyte + 5)
+
+
+class ListingDeltaTests(TestCase):
+    root = "/bridge4ER/Civil Engineering/Objective MCQs"
+
+    def _file(self, name, modified="2026-01-01T00:00:00"):
+        return {"name": name, "path": f"{self.root}/NEC/{name}", "size": 10, "modified": modified, "is_dir": False}
+
+    def test_cursor_replay_reports_only_changes(self):
+        folder = {"name": "NEC", "path": f"{self.root}/NEC", "is_dir": True}
+        first = {"entries": [folder, self._file("a.json"), self._file("b.json")], "cursor": "c1", "reset": True}
+        second = {
+            "entries": [
+                self._file("a.json", modified="2026-02-01T00:00:00"),
+                {"name": "b.json", "path": f"{self.root}/nec/b.json", "deleted": True},
+            ],
+            "cursor": "c2",
+            "reset": False,
+        }
+        with patch("storage.listing_delta.list_folder_changes", side_effect=[first, second]) as changes:
+            initial = list_folder_delta(self.root, consumer="metadata")
+            delta = list_folder_delta(self.root, consumer="metadata")
+
+        self.assertTrue(initial["full"])
+        self.assertEqual(len(initial["changed"]), 3)
+        self.assertEqual(changes.call_args_list[1].kwargs["cursor"], "c1")
+        self.assertFalse(delta["full"])
+        self.assertEqual([row["name"] for row in delta["changed"]], ["a.json"])
+        self.assertEqual(delta["deleted"], [f"{self.root}/NEC/b.json"])
+        self.assertEqual({row["name"] for row in delta["entries"]}, {"NEC", "a.json"})
+
+    def test_unchanged_replay_only_advances_the_cursor(self):
+        first = {"entries": [self._file("a.json")], "cursor": "c1", "reset": True}
+        second = {"entries": [], "cursor": "c2", "reset": False}
+        third = {"entries": [], "cursor": "c2", "reset": False}
+        with patch("storage.listing_delta.list_folder_changes", side_effect=[first, second, third]):
+            list_folder_delta(self.root, consumer="metadata")
+            with CaptureQueriesContext(connection) as advanced:
+                list_folder_delta(self.root, consumer="metadata")
+            with CaptureQueriesContext(connection) as unchanged:
+                delta = list_folder_delta(self.root, consumer="metadata")
+
+        writes = [query["sql"] for query in advanced.captured_queries if not query["sql"].startswith("SELECT")]
+        self.assertEqual(len(writes), 1)
+        self.assertNotIn("entries", writes[0])
+        self.assertEqual(len(unchanged.captured_queries), 1)
+        self.assertEqual([row["name"] for row in delta["entries"]], ["a.json"])
+        self.assertEqual(StorageListingCursor.objects.get().cursor, "c2")
+
+    def test_missing_root_empties_the_listing_for_every_provider(self):
+        lookup = dropbox.files.LookupError.not_found
+        errors = [
+            dropbox.exceptions.ApiError("req", dropbox.files.ListFolderError.path(lookup), None, None),
+            FileNotFoundError(self.root),
+            RuntimeError("File not found in Supabase storage."),
+        ]
+        for error in errors:
+            with self.subTest(error=type(error).__name__):
+                StorageListingCursor.objects.all().delete()
+                first = {"entries": [self._file("a.json")], "cursor": "c1", "reset": True}
+                wrapped = dropbox_service.StorageError("Error listing folder changes")
+                wrapped.__cause__ = error
+                with patch("storage.listing_delta.list_folder_changes", side_effect=[first, wrapped]):
+                    list_folder_delta(self.root, consumer="metadata")
+                    delta = list_folder_delta(self.root, consumer="metadata")
+
+                self.assertTrue(delta["full"])
+                self.assertEqual(delta["entries"], [])
+                self.assertEqual(delta["deleted"], [f"{self.root}/NEC/a.json"])
+
+    def test_other_listing_errors_are_raised(self):
+        with patch("storage.listing_delta.list_folder_changes", side_effect=dropbox_service.StorageError("timed out")):
+            with self.assertRaises(dropbox_service.StorageError):
+                list_folder_delta(self.root, consumer="metadata")
+
+    @override_settings(STORAGE_PROVIDER="dropbox")
+    def test_reset_cursor_falls_back_to_full_listing(self):
+        reset_error = dropbox.exceptions.ApiError("req", dropbox.files.ListFolderContinueError.reset, None, None)
+        client = Mock()
+        client.files_list_folder_continue.side_effect = reset_error
+        client.files_list_folder.return_value = Mock(entries=[], cursor="fresh", has_more=False)
+        with patch("storage.dropbox_service._execute_with_auth_retry", side_effect=lambda operation: operation(client)):
+            result = dropbox_service.list_folder_changes(self.root, cursor="expired")
+
+        self.assertTrue(result["reset"])
+        self.assertEqual(result["cursor"], "fresh")
+        client.files_list_folder.assert_called_once_with(self.root, recursive=True)
+
+
+@override_settings(STORAGE_PROVIDER="dropbox")
+class StorageDiskCacheTests(TestCase):
+    path = "/bridge4ER/Civil Engineering/Objective MCQs/NEC/Chapter 1.json"
+
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        override = override_settings(STORAGE_DISK_CACHE_DIR=cache_dir.name, STORAGE_DISK_CACHE_MAX_MB=1)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.metadata = {"size": 4, "modified": "2026-01-01T00:00:00"}
+        metadata_patch = patch("storage.dropbox_service._dropbox_get_file_metadata", side_effect=lambda path: self.metadata)
+        metadata_patch.start()
+        self.addCleanup(metadata_patch.stop)
+
+    def test_reads_are_served_from_disk_until_the_version_changes(self):
+        with patch("storage.dropbox_service._dropbox_download_file", return_value=b"v1v1") as download:
+            self.assertEqual(dropbox_service.download_file(self.path), b"v1v1")
+            self.assertEqual(dropbox_service.download_file(self.path), b"v1v1")
+            self.assertEqual(download.call_count, 1)
+
+            self.metadata = {"size": 4, "modified": "2026-02-01T00:00:00"}
+            download.return_value = b"v2v2"
+            self.assertEqual(dropbox_service.download_file(self.path), b"v2v2")
+            self.assertEqual(download.call_count, 2)
+
+    def test_delete_of_parent_folder_invalidates_cached_files(self):
+        with patch("storage.dropbox_service._dropbox_download_file", return_value=b"v1v1") as download, patch(
+            "storage.dropbox_service._dropbox_delete_file", return_value={}
+        ):
+            dropbox_service.download_file(self.path)
+            dropbox_service.delete_file("/bridge4ER/Civil Engineering/Objective MCQs/NEC")
+            dropbox_service.download_file(self.path)
+
+        self.assertEqual(download.call_count, 2)
+
+    def _upstream_stream(self, path, byte_range=None, if_range=None):
+        return {
+            "chunks": iter([b"v1", b"v1"]),
+            "etag": '"rev1"',
+            "last_modified": "",
+            "start": None,
+            "end": None,
+            "total_size": 4,
+        }
+
+    def test_streams_are_cached_once_fully_read_and_serve_ranges_from_disk(self):
+        with patch("storage.dropbox_service._dropbox_download_stream", side_effect=self._upstream_stream) as upstream:
+            first = dropbox_service.download_file_stream(self.path)
+            self.assertEqual(b"".join(first["chunks"]), b"v1v1")
+
+            cached = dropbox_service.download_file_stream(self.path)
+            ranged = dropbox_service.download_file_stream(self.path, byte_range=(1, 2), if_range=first["etag"])
+
+        self.assertEqual(upstream.call_count, 1)
+        self.assertEqual((b"".join(cached["chunks"]), cached["etag"]), (b"v1v1", first["etag"]))
+        self.assertEqual((ranged["start"], ranged["end"], ranged["total_size"]), (1, 2, 4))
+        self.assertEqual(b"".join(ranged["chunks"]), b"1v")
+
+    def test_abandoned_stream_is_not_cached(self):
+        with patch("storage.dropbox_service._dropbox_download_stream", side_effect=self._upstream_stream) as upstream:
+            first = dropbox_service.download_file_stream(self.path)
+            next(first["chunks"])
+            first["chunks"].close()
+            b"".join(dropbox_service.download_file_stream(self.path)["chunks"])
+
+        self.assertEqual(upstream.call_count, 2)
+
+    def test_unlockable_cache_directory_does_not_hide_a_successful_delete(self):
+        report = {"deleted": [self.path], "missing": [], "failed": {}}
+        with patch("storage.dropbox_service._dropbox_delete_file", return_value=report), patch(
+            "storage.disk_cache._locked", side_effect=PermissionError(errno.EACCES, "Permission denied")
+        ):
+            self.assertEqual(dropbox_service.delete_file(self.path), report)
+
+    def test_least_recently_used_entries_are_evicted_over_budget(self):
+        self.metadata = {"size": 600 * 1024, "modified": "2026-01-01T00:00:00"}
+        with patch("storage.dropbox_service._dropbox_download_file", side_effect=lambda path: b"x" * 600 * 1024):
+            dropbox_service.download_file("/bridge4ER/a.json")
+            dropbox_service.download_file("/bridge4ER/b.json")
+
+        self.assertIsNone(disk_cache.read("/bridge4ER/a.json", self.metadata["modified"], self.metadata["size"]))
+        cached = disk_cache.read("/bridge4ER/b.json", self.metadata["modified"], self.metadata["size"])
+        self.assertEqual(len(cached), 600 * 1024)
+
+    def test_read_only_cache_directory_stops_the_metadata_lookup(self):
+        self.addCleanup(disk_cache._unwritable_dirs.clear)
+        read_only = OSError(errno.EROFS, "Read-only file system")
+        with patch("storage.dropbox_service._dropbox_download_file", return_value=b"v1v1"), patch(
+            "storage.disk_cache.tempfile.mkstemp", side_effect=read_only
+        ), patch("storage.dropbox_service._dropbox_get_file_metadata", return_value=self.metadata) as get_metadata:
+            self.assertEqual(dropbox_service.download_file(self.path), b"v1v1")
+            self.assertEqual(dropbox_service.download_file(self.path), b"v1v1")
+
+        self.assertEqual(get_metadata.call_count, 1)
+
+
+class LocalStorageProviderTests(TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        override = override_settings(STORAGE_PROVIDER="local", LOCAL_STORAGE_ROOT=root.name, STORAGE_DISK_CACHE_MAX_MB=0)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_round_trip_through_public_surface(self):
+        folder = "/bridge4ER/Civil Engineering/Notice"
+        metadata = dropbox_service.upload_file(f"{folder}/Exam Notice.pdf", io.BytesIO(b"0123456789"))
+        self.assertEqual(metadata["size"], 10)
+
+        rows = dropbox_service.list_folder_with_metadata("/bridge4ER", include_dirs=False, recursive=True)
+        self.assertEqual([row["path"] for row in rows], [f"{folder}/Exam Notice.pdf"])
+        self.assertEqual(dropbox_service.search_files(folder, "notice")[0]["name"], "Exam Notice.pdf")
+
+        stream = dropbox_service.download_file_stream(f"{folder}/Exam Notice.pdf", byte_range=(None, 3))
+        self.assertEqual(b"".join(stream["chunks"]), b"789")
+
+        dropbox_service.move_path(folder, "/bridge4ER/Civil Engineering/Notices")
+        self.assertEqual(dropbox_service.download_file("/bridge4ER/Civil Engineering/Notices/Exam Notice.pdf"), b"0123456789")
+        report = dropbox_service.delete_file("/bridge4ER/Civil Engineering/Notices")
+        self.assertEqual(report["deleted"], ["/bridge4ER/Civil Engineering/Notices/Exam Notice.pdf"])
+        with self.assertRaisesRegex(Exception, "not_found"):
+            dropbox_service.get_file_metadata("/bridge4ER/Civil Engineering/Notices/Exam Notice.pdf")
+
+    @override_settings(BACKEND_PUBLIC_URL="", SECURE_SSL_REDIRECT=False)
+    def test_links_point_at_the_app_streaming_endpoint(self):
+        path = "/bridge4ER/Civil Engineering/Notice/Exam Notice.pdf"
+        dropbox_service.upload_file(path, io.BytesIO(b"0123456789"))
+
+        link = dropbox_service.get_shareable_link(path)
+        self.assertTrue(link.startswith("/api/storage/files/preview/?"), link)
+        response = APIClient().get(link)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+
+    @override_settings(LOCAL_STORAGE_ERROR_RATE="1")
+    def test_injected_errors_surface_as_provider_failures(self):
+        with self.assertRaisesRegex(Exception, "Injected local storage failure"):
+            dropbox_service.list_folder_with_metadata("/bridge4ER")
+
+    def test_paths_cannot_escape_the_root(self):
+        with self.assertRaisesRegex(Exception, "Invalid storage path"):
+            dropbox_service.download_file("/bridge4ER/../../etc/passwd")
+
+
+class FlakyBackend(backends.StorageBackend):
+    name = "flaky"
+    failures = []
+
+    def get_file_metadata(self, path):
+        if self.failures:
+            raise self.failures.pop(0)
+        return {"name": "a.pdf", "path": path, "size": 1, "modified": ""}
+
+    def upload_file(self, path, file_obj):
+        raise RuntimeError("upstream 503")
+
+    def list_folder_with_metadata(self, path, include_dirs=True, recursive=False):
+        return []
+
+    def download_file(self, path):
+        return b""
+
+    def download_file_stream(self, path, byte_range=None, if_range=None):
+        return {"chunks": iter(()), "etag": "", "last_modified": "", "start": None, "end": None, "total_size": 0}
+
+    def delete_file(self, path):
+        return {"deleted": [path], "missing": [], "failed": {}}
+
+    def search_files(self, path, query):
+        return []
+
+    def get_shareable_link(self, path):
+        return f"https://flaky.example{path}"
+
+    def move_path(self, from_path, to_path):
+        return True
+
+
+@override_settings(
+    STORAGE_PROVIDER="flaky",
+    STORAGE_BACKENDS={"flaky": "storage.tests.FlakyBackend"},
+    STORAGE_MIDDLEWARE=["storage.backends.MetricsMiddleware", "storage.backends.RetryMiddleware"],
+    STORAGE_RETRY_BACKOFF_MS=0,
+)
+class StorageBackendPipelineTests(TestCase):
+    @override_settings(STORAGE_RETRY_BUDGET_SECONDS=0)
+    def test_slow_failures_are_not_retried_past_the_budget(self):
+        FlakyBackend.failures = [RuntimeError("read timeout")]
+        with self.assertRaises(dropbox_service.StorageError):
+            dropbox_service.get_file_metadata("/bridge4ER/a.pdf")
+
+        self.assertEqual(FlakyBackend.failures, [])
+
+    def test_reads_are_retried_through_the_configured_chain(self):
+        FlakyBackend.failures = [RuntimeError("connection reset"), RuntimeError("connection reset")]
+        before = metrics.snapshot().get(("flaky", "get_file_metadata"), {}).get("count", 0)
+
+        metadata = dropbox_service.get_file_metadata("/bridge4ER/a.pdf")
+
+        self.assertEqual(metadata["path"], "/bridge4ER/a.pdf")
+        self.assertEqual(FlakyBackend.failures, [])
+        row = metrics.snapshot()[("flaky", "get_file_metadata")]
+        self.assertEqual(row["count"], before + 1)
+        self.assertGreaterEqual(row["retries"], 2)
+
+    def test_not_found_and_writes_are_not_retried(self):
+        FlakyBackend.failures = [FileNotFoundError("path/not_found"), RuntimeError("never reached")]
+        with self.assertRaises(dropbox_service.StorageError) as raised:
+            dropbox_service.get_file_metadata("/bridge4ER/missing.pdf")
+        self.assertIsInstance(raised.exception.__cause__, FileNotFoundError)
+        self.assertEqual(len(FlakyBackend.failures), 1)
+
+        with self.assertRaisesRegex(dropbox_service.StorageError, "Error uploading file: upstream 503"):
+            dropbox_service.upload_file("/bridge4ER/a.pdf", io.BytesIO(b"x"))
+
+
+@override_settings(
+    STORAGE_PROVIDER="flaky",
+    STORAGE_BACKENDS={"flaky": "storage.tests.FlakyBackend"},
+    STORAGE_MIDDLEWARE=["storage.backends.CircuitBreakerMiddleware"],
+    STORAGE_BREAKER_FAILURES=2,
+    STORAGE_BREAKER_RESET_SECONDS=1,
+)
+class StorageCircuitBreakerTests(TestCase):
+    def setUp(self):
+        backends.reset_breakers()
+        FlakyBackend.failures = []
+        self.addCleanup(backends.reset_breakers)
+
+    def test_open_breaker_fails_fast_and_background_probe_closes_it(self):
+        FlakyBackend.failures = [RuntimeError("timeout"), RuntimeError("timeout")]
+        for _ in range(2):
+            with self.assertRaises(dropbox_service.StorageError):
+                dropbox_service.get_file_metadata("/bridge4ER/a.pdf")
+
+        FlakyBackend.failures = [RuntimeError("never reached")]
+        with self.assertRaises(dropbox_service.StorageError) as raised:
+            dropbox_service.get_file_metadata("/bridge4ER/a.pdf")
+        self.assertIsInstance(raised.exception.__cause__, dropbox_service.StorageUnavailable)
+        self.assertEqual(len(FlakyBackend.failures), 1)
+
+        FlakyBackend.failures = []
+        with patch("storage.backends.time.monotonic", return_value=10**9):
+            with self.assertRaises(dropbox_service.StorageError):
+                dropbox_service.get_file_metadata("/bridge4ER/a.pdf")
+        for _ in range(100):
+            if backends.breaker_states()[("flaky", "get_file_metadata")] == "closed":
+                break
+            threading.Event().wait(0.01)
+
+        self.assertEqual(backends.breaker_states()[("flaky", "get_file_metadata")], "closed")
+        self.assertEqual(dropbox_service.get_file_metadata("/bridge4ER/a.pdf")["path"], "/bridge4ER/a.pdf")
+
+    def test_probe_never_replays_the_callers_stream(self):
+        with backends._breakers_lock:
+            backends._breakers[("flaky", "download_file_stream")] = {"failures": 2, "opened_at": 0, "probing": False}
+        with patch("storage.backends.time.monotonic", return_value=10**9), patch.object(
+            FlakyBackend, "download_file_stream"
+        ) as stream:
+            with self.assertRaises(dropbox_service.StorageError):
+                dropbox_service.download_file_stream("/bridge4ER/a.pdf")
+            for _ in range(100):
+                if backends.breaker_states()[("flaky", "download_file_stream")] == "closed":
+                    break
+                threading.Event().wait(0.01)
+
+        self.assertEqual(backends.breaker_states()[("flaky", "download_file_stream")], "closed")
+        stream.assert_not_called()
+
+    def test_not_found_errors_do_not_open_the_breaker(self):
+        FlakyBackend.failures = [FileNotFoundError("path/not_found")] * 3
+        for _ in range(3):
+            with self.assertRaises(dropbox_service.StorageError):
+                dropbox_service.get_file_metadata("/bridge4ER/missing.pdf")
+
+        self.assertEqual(backends.breaker_states()[("flaky", "get_file_metadata")], "closed")
+
+    @override_settings(
+        STORAGE_MIDDLEWARE=["storage.backends.RetryMiddleware", "storage.backends.CircuitBreakerMiddleware"],
+        STORAGE_RETRY_ATTEMPTS=3,
+        STORAGE_RETRY_BACKOFF_MS=0,
+    )
+    def test_each_retry_attempt_counts_towards_the_breaker(self):
+        FlakyBackend.failures = [RuntimeError("timeout")] * 4
+        with self.assertRaises(dropbox_service.StorageError) as raised:
+            dropbox_service.get_file_metadata("/bridge4ER/a.pdf")
+
+        # Two failed attempts opened the breaker; the next attempt failed fast and was not retried.
+        self.assertIsInstance(raised.exception.__cause__, dropbox_service.StorageUnavailable)
+        self.assertEqual(len(FlakyBackend.failures), 2)
+        self.assertEqual(backends.breaker_states()[("flaky", "get_file_metadata")], "open")
+
+
+@override_settings(SUPABASE_URL="https://example.supabase.co", SUPABASE_HEDGE_DELAY_MS=10)
+class SupabaseHedgedReadTests(TestCase):
+    def test_slow_request_is_hedged_and_first_answer_wins(self):
+        release = threading.Event()
+        calls = []
+
+        def send():
+            calls.append(1)
+            if len(calls) == 1:
+                release.wait(2)
+                return "slow"
+            return "fast"
+
+        try:
+            self.assertEqual(dropbox_service._supabase_hedged("sign", send), "fast")
+        finally:
+            release.set()
+        self.assertEqual(len(calls), 2)
+
+    def test_failed_hedge_falls_back_to_the_other_attempt(self):
+        calls = []
+
+        def send():
+            calls.append(1)
+            if len(calls) == 1:
+                threading.Event().wait(0.05)
+                return "slow but fine"
+            raise RuntimeError("boom")
+
+        self.assertEqual(dropbox_service._supabase_hedged("head", send), "slow but fine")
+
+    @override_settings(SUPABASE_HEDGED_READS=False)
+    def test_disabled_hedging_sends_a_single_request(self):
+        send = Mock(side_effect=RuntimeError("boom"))
+        with self.assertRaisesRegex(RuntimeError, "boom"):
+            dropbox_service._supabase_hedged("sign", send)
+        send.assert_called_once_with()
+
+
+@override_settings(
+    STORAGE_PROVIDER="flaky",
+    STORAGE_BACKENDS={"flaky": "storage.tests.FlakyBackend"},
+    STORAGE_MIDDLEWARE=["storage.backends.MetricsMiddleware"],
+    STORAGE_METRICS_TOKEN="scrape-token",
+    SECURE_SSL_REDIRECT=False,
+)
+class StorageMetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        FlakyBackend.failures = []
+
+    def test_latency_histogram_and_error_classes_are_recorded(self):
+        dropbox_service.get_file_metadata("/bridge4ER/a.pdf")
+        FlakyBackend.failures = [TimeoutError("slow")]
+        with self.assertRaises(dropbox_service.StorageError):
+            dropbox_service.get_file_metadata("/bridge4ER/a.pdf")
+
+        row = metrics.snapshot()[("flaky", "get_file_metadata")]
+        self.assertEqual(row["count"], 2)
+        self.assertEqual(sum(row["buckets"]), 2)
+        self.assertEqual(row["errors"], {"TimeoutError": 1})
+
+    def test_server_timing_header_lists_storage_calls_made_by_the_request(self):
+        def view(request):
+            dropbox_service.get_file_metadata("/bridge4ER/a.pdf")
+            dropbox_service.get_file_metadata("/bridge4ER/b.pdf")
+            return HttpResponse("ok")
+
+        request = RequestFactory().get("/")
+        request.user = Mock(is_staff=True)
+        response = metrics.StorageTimingMiddleware(view)(request)
+
+        self.assertRegex(response["Server-Timing"], r'^storage-flaky-get-file-metadata;dur=[0-9.]+;desc="2 calls"$')
+        self.assertFalse(metrics.StorageTimingMiddleware(lambda request: HttpResponse())(request).has_header("Server-Timing"))
+
+    def test_server_timing_is_staff_only_unless_enabled(self):
+        def view(request):
+            dropbox_service.get_file_metadata("/bridge4ER/a.pdf")
+            return HttpResponse("ok")
+
+        request = RequestFactory().get("/")
+        request.user = Mock(is_staff=False)
+
+        self.assertFalse(metrics.StorageTimingMiddleware(view)(request).has_header("Server-Timing"))
+        with override_settings(STORAGE_SERVER_TIMING=True):
+            self.assertTrue(metrics.StorageTimingMiddleware(view)(request).has_header("Server-Timing"))
+
+    @override_settings(STORAGE_SERVER_TIMING=True)
+    def test_calls_on_worker_threads_count_toward_the_request(self):
+        def view(request):
+            lookup = metrics.bind_request(dropbox_service.get_file_metadata)
+            workers = [threading.Thread(target=lookup, args=(f"/bridge4ER/{index}.pdf",)) for index in range(3)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join(timeout=5)
+            return HttpResponse("ok")
+
+        response = metrics.StorageTimingMiddleware(view)(RequestFactory().get("/"))
+
+        self.assertIn('desc="3 calls"', response["Server-Timing"])
+
+    def test_scrape_endpoint_requires_token_or_staff(self):
+        dropbox_service.get_file_metadata("/bridge4ER/a.pdf")
+
+        self.assertEqual(self.client.get("/api/storage/metrics/").status_code, 403)
+        response = self.client.get("/api/storage/metrics/", HTTP_AUTHORIZATION="Bearer scrape-token")
+
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('storage_operation_duration_seconds_count{provider="flaky",operation="get_file_metadata"} 1', body)
+        self.assertIn('storage_operation_duration_seconds_bucket{provider="flaky",operation="get_file_metadata",le="+Inf"} 1', body)
+
+
+@override_settings(STORAGE_PROVIDER="dropbox", SECURE_SSL_REDIRECT=False)
+class ListingConditionalGetTests(TestCase):
+    url = "/api/storage/files/list/"
+    params = {"content_type": "notice", "branch": "Civil Engineering"}
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.file = FileMetadata.objects.create(
+            name="Exam Schedule.pdf",
+            dropbox_path="/bridge4ER/Civil Engineering/Notice/Exam Schedule.pdf",
+            content_type="notice",
+            branch="Civil Engineering",
+            file_size=10,
+        )
+
+    def test_matching_etag_returns_304_without_touching_the_database(self):
+        first = self.client.get(self.url, self.params)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first["Cache-Control"], "private, no-cache")
+        etag = first["ETag"]
+
+        with self.assertNumQueries(0):
+            revalidated = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=f"W/{etag}")
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.content, b"")
+        self.assertEqual(revalidated["ETag"], etag)
+
+    def test_cache_hit_reuses_the_stored_etag(self):
+        first = self.client.get(self.url, self.params)
+
+        with patch("storage.etags.payload_etag") as rehash:
+            cached = self.client.get(self.url, self.params)
+
+        rehash.assert_not_called()
+        self.assertEqual(cached.status_code, 200)
+        self.assertEqual(cached["ETag"], first["ETag"])
+        self.assertIn("Cookie", cached["Vary"])
+        self.assertIn("Authorization", cached["Vary"])
+
+    def test_changed_listing_gets_a_new_etag(self):
+        etag = self.client.get(self.url, self.params)["ETag"]
+        FileMetadata.objects.filter(pk=self.file.pk).update(display_name="Revised Schedule")
+        _invalidate_list_cache(content_type="notice", branch="Civil Engineering")
+
+        response = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.data[0]["display_name"], "Revised Schedule")
+
+
+class StorageDirectDeliveryTests(TestCase):
+    notice_path = "/bridge4ER/Civil Engineering/Notice/Exam Notice.pdf"
+
+    @override_settings(STORAGE_FILE_DELIVERY_MODE="redirect")
+    def test_preview_redirects_to_temporary_link(self):
+        with patch("storage.views.get_temporary_link", return_value="https://dl.example/notice.pdf") as link:
+            response = self.client.get("/api/storage/files/preview/", {"path": self.notice_path})
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response["Location"], "https://dl.example/notice.pdf")
+        self.assertEqual(response["Cache-Control"], "private, no-store")
+        link.assert_called_once_with(self.notice_path)
+
+    def test_anonymous_clients_cannot_pick_a_delivery_mode(self):
+        with patch("storage.views.get_temporary_link") as link, patch(
+            "storage.views.storage_file_response",
+            return_value=HttpResponse(b"pdf"),
+        ) as proxied:
+            response = self.client.get("/api/storage/files/preview/", {"path": self.notice_path, "delivery": "redirect"})
+
+        self.assertEqual(response.status_code, 200)
+        link.assert_not_called()
+        proxied.assert_called_once()
+
+    def test_staff_may_pick_a_delivery_mode(self):
+        staff = get_user_model().objects.create_user(
+            username="delivery-staff",
+            password="secret123",
+            email="delivery-staff@example.com",
+            mobile_number="9844444444",
+            full_name="Delivery Staff",
+            is_staff=True,
+        )
+        client = APIClient()
+        client.force_authenticate(staff)
+        with patch("storage.views.get_temporary_link", return_value="https://dl.example/notice.pdf"):
+            response = client.get("/api/storage/files/preview/", {"path": self.notice_path, "delivery": "redirect"})
+
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(STORAGE_CLIENT_DELIVERY_MODES=["link"])
+    def test_preview_link_mode_still_checks_access(self):
+        hidden_path = "/bridge4ER/Civil Engineering/Subjective/Hydraulics.pdf"
+        with patch("storage.views.get_temporary_link", return_value="https://dl.example/file.pdf") as link:
+            allowed = self.client.get("/api/storage/files/preview/", {"path": self.notice_path, "delivery": "link"})
+            denied = self.client.get("/api/storage/files/preview/", {"path": hidden_path, "delivery": "link"})
+
+        self.assertEqual(allowed.status_code, 200)
+        self.assertEqual(allowed.json(), {"link": "https://dl.example/file.pdf"})
+        self.assertEqual(denied.status_code, 401)
+        link.assert_called_once_with(self.notice_path)
+
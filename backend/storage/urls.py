@@ -19,6 +19,7 @@ from .views import (
     SyncPathView,
     AttachPathView,
     HomePageHeroImageUploadView,
+    StorageMetricsView,
 )
 
 urlpatterns = [
@@ -31,7 +32,7 @@ urlpatterns = [
     path('files/reset/', ResetDropboxMetadataView.as_view()),
     path('files/search/', SearchFilesView.as_view()),
     path('files/download/', DownloadFileView.as_view()),
-    path('files/preview/', PreviewFileView.as_view()),
+    path('files/preview/', PreviewFileView.as_view(), name='storage-file-preview'),
     path('files/view/', ViewFileView.as_view()),
     path('files/upload/', UploadFileView.as_view()),
     path('files/metadata/', FileMetadataUpdateView.as_view()),
@@ -41,4 +42,5 @@ urlpatterns = [
     path('files/attach/', AttachPathView.as_view()),
     path('files/visibility/', FileVisibilityView.as_view()),
     path('files/delete/', DeleteFileView.as_view()),
+    path('metrics/', StorageMetricsView.as_view()),
 ]
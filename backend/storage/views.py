@@ -1,4 +1,6 @@
 import hashlib
+import heapq
+import hmac
 import mimetypes
 import time
 from pathlib import Path
@@ -11,24 +13,34 @@ from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework import status
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseRedirect
+from django.db import transaction
 from django.db.models import Q
 
+from exams.content_version import bump_exam_sets_version
 from exams.import_utils import SUPPORTED_IMPORT_EXTENSIONS, parse_rows_from_path
 from exams.models import ExamSet, MCQQuestion
 from exams.question_normalizers import normalize_mcq_payload
 from storage.dropbox_service import (
-    download_file,
     upload_file,
     list_folder_with_metadata,
     search_files,
     delete_file,
     get_shareable_link,
+    get_temporary_link,
     get_file_metadata,
     create_folder,
     move_path,
+    StorageMoveIncomplete,
+    _is_dropbox_not_found_error,
 )
-from storage.models import FileMetadata, FileSyncLog, FolderMetadata, PlatformMetrics
+from storage import metrics as storage_metrics
+from storage.etags import cached_payload, etag_response, remember_etag
+from storage.file_responses import storage_file_response
+from storage.listing_delta import list_folder_delta
+from storage.metadata_prune import delete_missing_paths
+from storage.search_index import index_files, search_file_metadata, search_rank
+from storage.models import FileMetadata, FileSyncLog, FolderMetadata, PlatformMetrics, StorageListingCursor
 
 CONTENT_TYPE_FOLDERS = {
     "notice": "Notice",
@@ -57,6 +69,7 @@ ALLOWED_ROOT = "/bridge4ER/"
 HERO_IMAGE_BASE_PATH = "/bridge4ER/System/Hero Images"
 HERO_IMAGE_TARGETS = {"login", "register"}
 FILE_LIST_CACHE_KEY_PREFIX = "storage:file-list:v1"
+FILE_DELIVERY_MODES = {"proxy", "redirect", "link"}
 
 
 def _as_positive_int(value, default, minimum=1):
@@ -92,6 +105,8 @@ HOMEPAGE_METRICS_CACHE_TTL_SECONDS = _as_positive_int(
     300,
     minimum=30,
 )
+SEARCH_RESULTS_DEFAULT_LIMIT = 50
+SEARCH_RESULTS_MAX_LIMIT = 200
 OBJECTIVE_COUNT_CACHE_KEY_PREFIX = "storage:objective-count:v1"
 OBJECTIVE_COUNT_CACHE_TTL_SECONDS = _as_positive_int(
     getattr(settings, "DROPBOX_OBJECTIVE_COUNT_CACHE_TTL_SECONDS", 1800),
@@ -117,6 +132,29 @@ def _uses_supabase_storage():
     return _storage_provider() == "supabase"
 
 
+def _file_delivery_mode(request, default=None):
+    requested = str(request.GET.get("delivery") or "").strip().lower()
+    if requested in FILE_DELIVERY_MODES and _may_request_delivery_mode(request, requested):
+        return requested
+    configured = str(default or getattr(settings, "STORAGE_FILE_DELIVERY_MODE", "proxy") or "").strip().lower()
+    return configured if configured in FILE_DELIVERY_MODES else "proxy"
+
+
+def _may_request_delivery_mode(request, mode):
+    # ?delivery= is a staff override; other clients only get the modes settings open up to them.
+    if getattr(request.user, "is_staff", False):
+        return True
+    allowed = getattr(settings, "STORAGE_CLIENT_DELIVERY_MODES", []) or []
+    return mode in {str(item).strip().lower() for item in allowed}
+
+
+def _direct_link_response(link):
+    response = HttpResponseRedirect(link)
+    # Signed URLs are short-lived, so neither the browser nor a proxy may reuse this redirect.
+    response["Cache-Control"] = "private, no-store"
+    return response
+
+
 def _is_safe_path(path):
     normalized = _normalize_dropbox_path(path)
     if not normalized:
@@ -419,13 +457,40 @@ def _invalidate_list_cache_for_path(path):
     )
 
 
+def _derive_new_metadata_row(row, is_dir):
+    """Fill in admin_sort_key and effective_visible of a just-created row from its ancestor folders.
+
+    A new row keeps the default sort_order and visibility, so rows already below it keep their keys and
+    only the ancestor chain has to be read.
+    """
+    path = _normalize_dropbox_path(row.dropbox_path)
+    root_path = _normalize_dropbox_path(_resolve_content_path(row.content_type, row.branch) or "")
+    ancestors = [root_path, *_relative_folder_chain(path, row.content_type, row.branch, include_self=False)]
+    folder_orders = {}
+    hidden = False
+    for folder_path, order, is_visible in FolderMetadata.objects.filter(
+        content_type=row.content_type,
+        branch=row.branch,
+        dropbox_path__in=[ancestor for ancestor in ancestors if ancestor],
+    ).values_list("dropbox_path", "sort_order", "is_visible"):
+        folder_orders[_normalize_dropbox_path(folder_path)] = int(order or 0)
+        hidden = hidden or not is_visible
+    row.admin_sort_key = _admin_sort_key(
+        path, is_dir, row.name, row.sort_order, folder_orders, row.content_type, row.branch
+    )
+    row.effective_visible = bool(row.is_visible) and not hidden
+    type(row).objects.filter(pk=row.pk).update(
+        admin_sort_key=row.admin_sort_key, effective_visible=row.effective_visible
+    )
+
+
 def _ensure_metadata_entry(path, content_type=None, branch=None, size=None):
     normalized_path = _normalize_dropbox_path(path)
     if not _is_safe_path(normalized_path):
         return None
     resolved_content_type = content_type or _infer_content_type_from_path(normalized_path)
     resolved_branch = branch or _extract_branch_from_path(normalized_path)
-    metadata_obj, _ = FileMetadata.objects.get_or_create(
+    metadata_obj, created = FileMetadata.objects.get_or_create(
         dropbox_path=normalized_path,
         defaults={
             "name": str(normalized_path).split("/")[-1] or "file",
@@ -438,6 +503,9 @@ def _ensure_metadata_entry(path, content_type=None, branch=None, size=None):
             "is_visible": True,
         },
     )
+    if created:
+        _derive_new_metadata_row(metadata_obj, is_dir=False)
+        index_files(FileMetadata.objects.filter(pk=metadata_obj.pk))
     return metadata_obj
 
 
@@ -447,7 +515,7 @@ def _ensure_folder_metadata_entry(path, content_type=None, branch=None):
         return None
     resolved_content_type = content_type or _infer_content_type_from_path(normalized_path)
     resolved_branch = branch or _extract_branch_from_path(normalized_path)
-    folder_obj, _ = FolderMetadata.objects.get_or_create(
+    folder_obj, created = FolderMetadata.objects.get_or_create(
         dropbox_path=normalized_path,
         defaults={
             "name": str(normalized_path).split("/")[-1] or "folder",
@@ -461,78 +529,115 @@ def _ensure_folder_metadata_entry(path, content_type=None, branch=None):
             "is_visible": True,
         },
     )
+    if created:
+        _derive_new_metadata_row(folder_obj, is_dir=True)
     return folder_obj
 
 
+METADATA_SYNC_BATCH_SIZE = 500
+
+
+def _upsert_metadata_rows(model, rows, fields):
+    """Create missing rows and update changed ones in batches; rows maps dropbox_path to the synced fields.
+
+    Returns the paths of the rows it created or changed.
+    """
+    paths = list(rows)
+    existing = {}
+    for start in range(0, len(paths), METADATA_SYNC_BATCH_SIZE):
+        batch = paths[start : start + METADATA_SYNC_BATCH_SIZE]
+        for row in model.objects.filter(dropbox_path__in=batch).only("id", "dropbox_path", "display_name", *fields):
+            existing[row.dropbox_path] = row
+
+    created = []
+    changed = []
+    for path, values in rows.items():
+        row = existing.get(path)
+        if row is None:
+            created.append(model(dropbox_path=path, display_name=values["name"], **values))
+            continue
+        dirty = not row.display_name
+        if dirty:
+            row.display_name = values["name"]
+        for field, value in values.items():
+            if getattr(row, field) != value:
+                setattr(row, field, value)
+                dirty = True
+        if dirty:
+            changed.append(row)
+
+    if created:
+        # A concurrent sync may have inserted the same path since the read above; keep its admin fields.
+        model.objects.bulk_create(
+            created,
+            batch_size=METADATA_SYNC_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=["dropbox_path"],
+            update_fields=fields,
+        )
+    if changed:
+        model.objects.bulk_update(changed, ["display_name", *fields], batch_size=METADATA_SYNC_BATCH_SIZE)
+    return [row.dropbox_path for row in created] + [row.dropbox_path for row in changed]
+
+
 def _sync_metadata_from_listing(files, content_type, branch):
     resolved_content_type = content_type or ""
     resolved_branch = _normalize_branch(branch)
     root_path = _normalize_dropbox_path(_resolve_content_path(resolved_content_type, resolved_branch) or "")
+
+    file_rows = {}
+    folder_names = {}
     for item in files:
         item_path = _normalize_dropbox_path(item.get("path"))
         if not item_path:
             continue
 
         if item.get("is_dir"):
-            _ensure_folder_metadata_entry(
-                path=item_path,
-                content_type=resolved_content_type,
-                branch=resolved_branch,
-            )
-            FolderMetadata.objects.filter(dropbox_path=item_path).update(
-                name=item.get("name") or (item_path.split("/")[-1] or "folder"),
-                content_type=resolved_content_type,
-                branch=resolved_branch,
-                parent_path=_parent_dropbox_path(item_path),
-                depth=_folder_depth(item_path, resolved_content_type, resolved_branch),
-            )
-            FolderMetadata.objects.filter(
-                dropbox_path=item_path,
-                display_name="",
-            ).update(
-                display_name=item.get("name") or (item_path.split("/")[-1] or "folder"),
-            )
+            if _is_safe_path(item_path):
+                folder_names[item_path] = item.get("name") or (item_path.split("/")[-1] or "folder")
             continue
 
-        _ensure_metadata_entry(
-            path=item_path,
-            content_type=resolved_content_type,
-            branch=resolved_branch,
-            size=item.get("size"),
-        )
-        FileMetadata.objects.filter(dropbox_path=item_path).update(
-            name=item.get("name") or (item_path.split("/")[-1] or "file"),
-            content_type=resolved_content_type,
-            branch=resolved_branch,
-            file_size=int(item.get("size") or 0),
-        )
-        FileMetadata.objects.filter(
-            dropbox_path=item_path,
-            display_name="",
-        ).update(
-            display_name=item.get("name") or (item_path.split("/")[-1] or "file"),
-        )
+        if _is_safe_path(item_path):
+            file_rows[item_path] = {
+                "name": item.get("name") or (item_path.split("/")[-1] or "file"),
+                "content_type": resolved_content_type,
+                "branch": resolved_branch,
+                "file_size": int(item.get("size") or 0),
+            }
 
         parent_path = _parent_dropbox_path(item_path)
         while parent_path and root_path and (
             parent_path == root_path or parent_path.startswith(f"{root_path}/")
         ):
-            _ensure_folder_metadata_entry(
-                path=parent_path,
-                content_type=resolved_content_type,
-                branch=resolved_branch,
-            )
-            FolderMetadata.objects.filter(dropbox_path=parent_path).update(
-                name=parent_path.split("/")[-1] or "folder",
-                content_type=resolved_content_type,
-                branch=resolved_branch,
-                parent_path=_parent_dropbox_path(parent_path),
-                depth=_folder_depth(parent_path, resolved_content_type, resolved_branch),
-            )
+            if _is_safe_path(parent_path):
+                folder_names.setdefault(parent_path, parent_path.split("/")[-1] or "folder")
             if parent_path == root_path:
                 break
             parent_path = _parent_dropbox_path(parent_path)
 
+    folder_rows = {
+        path: {
+            "name": name,
+            "content_type": resolved_content_type,
+            "branch": resolved_branch,
+            "parent_path": _parent_dropbox_path(path),
+            "depth": _folder_depth(path, resolved_content_type, resolved_branch),
+        }
+        for path, name in folder_names.items()
+    }
+
+    with transaction.atomic():
+        touched_folders = _upsert_metadata_rows(
+            FolderMetadata, folder_rows, ["name", "content_type", "branch", "parent_path", "depth"]
+        )
+        touched_files = _upsert_metadata_rows(FileMetadata, file_rows, ["name", "content_type", "branch", "file_size"])
+        # Sync never changes a folder's sort_order or visibility, so rows it left alone keep their keys.
+        _refresh_derived_rows(resolved_content_type, resolved_branch, touched_folders, touched_files)
+
+    # Untouched rows kept their names, so their search text is still current.
+    for start in range(0, len(touched_files), METADATA_SYNC_BATCH_SIZE):
+        index_files(FileMetadata.objects.filter(dropbox_path__in=touched_files[start : start + METADATA_SYNC_BATCH_SIZE]))
+
 
 def _prune_metadata_not_in_listing(files, content_type, branch):
     resolved_content_type = content_type or ""
@@ -560,23 +665,43 @@ def _prune_metadata_not_in_listing(files, content_type, branch):
                 break
             parent_path = _parent_dropbox_path(parent_path)
 
-    file_qs = FileMetadata.objects.filter(
-        content_type=resolved_content_type,
-        branch=resolved_branch,
-        dropbox_path__startswith=f"{root_path}/",
-    ).exclude(dropbox_path__in=current_file_paths)
-    folder_qs = FolderMetadata.objects.filter(
+    files_deleted = delete_missing_paths(
+        FileMetadata.objects.filter(
+            content_type=resolved_content_type,
+            branch=resolved_branch,
+            dropbox_path__startswith=f"{root_path}/",
+        ),
+        current_file_paths,
+    )
+    folder_scope = FolderMetadata.objects.filter(
         content_type=resolved_content_type,
         branch=resolved_branch,
         dropbox_path__startswith=root_path,
-    ).exclude(dropbox_path__in=current_folder_paths)
-    files_deleted = file_qs.count()
-    folders_deleted = folder_qs.count()
-    file_qs.delete()
-    folder_qs.delete()
+    )
+    # Only hidden or reordered folders shape the derived columns of the rows below them.
+    shaping_folders = set(
+        folder_scope.filter(Q(is_visible=False) | ~Q(sort_order=0)).values_list("dropbox_path", flat=True)
+    )
+    folders_deleted = delete_missing_paths(folder_scope, current_folder_paths)
+    if shaping_folders and folders_deleted:
+        removed = shaping_folders - set(
+            folder_scope.filter(dropbox_path__in=shaping_folders).values_list("dropbox_path", flat=True)
+        )
+        for path in sorted(removed):
+            if not any(path.startswith(f"{other}/") for other in removed):
+                _refresh_derived_metadata(resolved_content_type, resolved_branch, prefix=path)
     return {"files_deleted": files_deleted, "folders_deleted": folders_deleted}
 
 
+def _content_root_scope(content_type, branch, root_path):
+    # Stored paths are already normalized, so the root prefix check can run in SQL on the
+    # (branch, content_type, dropbox_path) index.
+    scope = Q(branch=branch, content_type=content_type)
+    if not root_path:
+        return scope
+    return scope & (Q(dropbox_path=root_path) | Q(dropbox_path__startswith=f"{root_path}/"))
+
+
 def _metadata_listing_fallback(content_type, branch, include_dirs):
     resolved_content_type = str(content_type or "").strip()
     resolved_branch = _normalize_branch(branch)
@@ -584,79 +709,77 @@ def _metadata_listing_fallback(content_type, branch, include_dirs):
     if not resolved_content_type or not root_path:
         return []
 
-    def _is_under_root(path):
-        normalized = _normalize_dropbox_path(path)
-        return bool(normalized) and (normalized == root_path or normalized.startswith(f"{root_path}/"))
+    scope = _content_root_scope(resolved_content_type, resolved_branch, root_path)
+    # Both tables come back in admin order from the (branch, content_type, admin_sort_key) indexes and
+    # the stored keys order files and folders against each other, so merging the two keeps that order.
+    file_rows = (
+        FileMetadata.objects.filter(scope)
+        .order_by("admin_sort_key")
+        .values_list(
+            "admin_sort_key", "name", "display_name", "icon_url", "sort_order", "dropbox_path", "file_size", "modified_at"
+        )
+    )
 
-    entries = []
-    file_rows = FileMetadata.objects.filter(
-        content_type=resolved_content_type,
-        branch=resolved_branch,
-    ).values("name", "display_name", "icon_url", "sort_order", "dropbox_path", "file_size", "modified_at")
-    for row in file_rows:
-        path = _normalize_dropbox_path(row.get("dropbox_path"))
-        if not _is_under_root(path):
-            continue
-        entries.append(
-            {
-                "name": row.get("name") or (path.split("/")[-1] or "file"),
-                "display_name": row.get("display_name") or row.get("name") or (path.split("/")[-1] or "file"),
-                "icon_url": row.get("icon_url") or "",
-                "sort_order": int(row.get("sort_order") or 0),
+    def file_entries():
+        for sort_key, name, display_name, icon_url, sort_order, path, file_size, modified_at in file_rows.iterator():
+            name = name or (path.split("/")[-1] or "file")
+            yield sort_key, {
+                "name": name,
+                "display_name": display_name or name,
+                "icon_url": icon_url or "",
+                "sort_order": int(sort_order or 0),
                 "path": path,
-                "size": int(row.get("file_size") or 0),
-                "modified": row.get("modified_at").isoformat() if row.get("modified_at") else "",
+                "size": int(file_size or 0),
+                "modified": modified_at.isoformat() if modified_at else "",
                 "is_dir": False,
             }
-        )
 
-    if include_dirs:
-        folder_rows = FolderMetadata.objects.filter(
-            content_type=resolved_content_type,
-            branch=resolved_branch,
-        ).values("name", "display_name", "icon_url", "sort_order", "dropbox_path", "modified_at")
-        for row in folder_rows:
-            path = _normalize_dropbox_path(row.get("dropbox_path"))
-            if not _is_under_root(path):
-                continue
-            entries.append(
-                {
-                    "name": row.get("name") or (path.split("/")[-1] or "folder"),
-                    "display_name": row.get("display_name") or row.get("name") or (path.split("/")[-1] or "folder"),
-                    "icon_url": row.get("icon_url") or "",
-                    "sort_order": int(row.get("sort_order") or 0),
-                    "path": path,
-                    "modified": row.get("modified_at").isoformat() if row.get("modified_at") else "",
-                    "is_dir": True,
-                }
-            )
+    def folder_entries():
+        folder_rows = (
+            FolderMetadata.objects.filter(scope)
+            .order_by("admin_sort_key")
+            .values_list("admin_sort_key", "name", "display_name", "icon_url", "sort_order", "dropbox_path", "modified_at")
+        )
+        for sort_key, name, display_name, icon_url, sort_order, path, modified_at in folder_rows.iterator():
+            name = name or (path.split("/")[-1] or "folder")
+            yield sort_key, {
+                "name": name,
+                "display_name": display_name or name,
+                "icon_url": icon_url or "",
+                "sort_order": int(sort_order or 0),
+                "path": path,
+                "modified": modified_at.isoformat() if modified_at else "",
+                "is_dir": True,
+            }
 
-    entries.sort(
-        key=lambda item: (
-            str(item.get("modified") or ""),
-            str(item.get("name") or "").lower(),
-        ),
-        reverse=True,
-    )
-    return entries
+    streams = [file_entries(), folder_entries()] if include_dirs else [file_entries()]
+    return [entry for _sort_key, entry in heapq.merge(*streams, key=lambda pair: pair[0] or "")]
 
 
-def _metadata_search_files(content_type, branch, query):
+def _metadata_search_files(content_type, branch, query, include_hidden=False, offset=0, limit=None):
+    """One page of ranked metadata search results and the total number of matches, both from SQL."""
     resolved_content_type = str(content_type or "").strip()
     resolved_branch = _normalize_branch(branch)
     cleaned_query = str(query or "").strip()
     if not resolved_content_type or not cleaned_query:
-        return []
-
-    rows = (
-        FileMetadata.objects.filter(content_type=resolved_content_type, branch=resolved_branch)
-        .filter(
-            Q(name__icontains=cleaned_query)
-            | Q(display_name__icontains=cleaned_query)
-            | Q(dropbox_path__icontains=cleaned_query)
-        )
-        .values("name", "display_name", "icon_url", "sort_order", "dropbox_path", "file_size", "modified_at")
+        return [], 0
+
+    matches = search_file_metadata(resolved_content_type, resolved_branch, cleaned_query)
+    if not include_hidden:
+        matches = matches.filter(is_visible=True, effective_visible=True)
+    total = matches.count()
+    rows = matches.values(
+        "name",
+        "display_name",
+        "icon_url",
+        "sort_order",
+        "dropbox_path",
+        "file_size",
+        "modified_at",
+        "is_visible",
+        "effective_visible",
     )
+    rows = rows[offset : offset + limit] if limit is not None else rows[offset:]
     entries = []
     for row in rows:
         path = _normalize_dropbox_path(row.get("dropbox_path"))
@@ -672,92 +795,24 @@ def _metadata_search_files(content_type, branch, query):
                 "size": int(row.get("file_size") or 0),
                 "modified": row.get("modified_at").isoformat() if row.get("modified_at") else "",
                 "is_dir": False,
+                "is_visible": bool(row.get("is_visible") and row.get("effective_visible")),
             }
         )
-
-    entries.sort(
-        key=lambda item: (
-            str(item.get("modified") or ""),
-            str(item.get("name") or "").lower(),
-        ),
-        reverse=True,
-    )
-    return entries
-
-
-def _visibility_map_for_paths(paths):
-    normalized_paths = []
-    for path in paths:
-        normalized = _normalize_dropbox_path(path)
-        if normalized:
-            normalized_paths.append(normalized)
-    if not normalized_paths:
-        return {}
-    rows = FileMetadata.objects.filter(dropbox_path__in=normalized_paths).values("dropbox_path", "is_visible")
-    return {row["dropbox_path"]: bool(row["is_visible"]) for row in rows}
-
-
-
-def _folder_visibility_map_for_paths(paths):
-    normalized_paths = []
-    for path in paths:
-        normalized = _normalize_dropbox_path(path)
-        if normalized:
-            normalized_paths.append(normalized)
-    if not normalized_paths:
-        return {}
-    rows = FolderMetadata.objects.filter(dropbox_path__in=normalized_paths).values("dropbox_path", "is_visible")
-    return {row["dropbox_path"]: bool(row["is_visible"]) for row in rows}
-
-
-def _metadata_detail_map_for_paths(paths):
-    normalized_paths = []
-    for path in paths:
-        normalized = _normalize_dropbox_path(path)
-        if normalized:
-            normalized_paths.append(normalized)
-    if not normalized_paths:
-        return {}, {}
-    file_rows = FileMetadata.objects.filter(dropbox_path__in=normalized_paths).values(
-        "dropbox_path",
-        "display_name",
-        "icon_url",
-        "sort_order",
-    )
-    folder_rows = FolderMetadata.objects.filter(dropbox_path__in=normalized_paths).values(
-        "dropbox_path",
-        "display_name",
-        "icon_url",
-        "sort_order",
-    )
-    file_map = {row["dropbox_path"]: row for row in file_rows}
-    folder_map = {row["dropbox_path"]: row for row in folder_rows}
-    return file_map, folder_map
+    return entries, total
 
 
-def _apply_metadata_overrides(files, content_type, branch):
-    if not files:
-        return []
-    paths = [_normalize_dropbox_path(item.get("path")) for item in files if item.get("path")]
-    file_map, folder_map = _metadata_detail_map_for_paths(paths)
-    enriched = []
-    for item in files:
-        path = _normalize_dropbox_path(item.get("path"))
-        if not path:
+def _hidden_folder_trie(hidden_paths):
+    """Nested dict of lowercased path segments; a None key marks the end of a hidden folder path."""
+    trie = {}
+    for path in hidden_paths:
+        parts = [segment.lower() for segment in _path_parts(path)]
+        if not parts:
             continue
-        is_dir = bool(item.get("is_dir"))
-        meta = folder_map.get(path, {}) if is_dir else file_map.get(path, {})
-        display_name = meta.get("display_name") or item.get("name") or (path.split("/")[-1] or "")
-        icon_url = meta.get("icon_url") or ""
-        sort_order = int(meta.get("sort_order") or 0)
-        enriched.append({
-            **item,
-            "path": path,
-            "display_name": display_name,
-            "icon_url": icon_url,
-            "sort_order": sort_order,
-        })
-    return enriched
+        node = trie
+        for segment in parts:
+            node = node.setdefault(segment, {})
+        node[None] = True
+    return trie
 
 
 def _hidden_folder_prefixes(content_type, branch):
@@ -766,20 +821,16 @@ def _hidden_folder_prefixes(content_type, branch):
         branch=_normalize_branch(branch),
         is_visible=False,
     ).values_list("dropbox_path", flat=True)
-    prefixes = []
-    for path in rows:
-        normalized = _normalize_dropbox_path(path)
-        if normalized:
-            prefixes.append(normalized.lower())
-    return prefixes
+    return _hidden_folder_trie(rows)
 
 
 def _is_under_hidden_folder(path, hidden_prefixes):
-    normalized_path = _normalize_dropbox_path(path).lower()
-    if not normalized_path:
-        return False
-    for prefix in hidden_prefixes:
-        if normalized_path == prefix or normalized_path.startswith(f"{prefix}/"):
+    node = hidden_prefixes
+    for segment in _path_parts(path):
+        node = node.get(segment.lower())
+        if node is None:
+            return False
+        if None in node:
             return True
     return False
 
@@ -799,85 +850,221 @@ def _relative_folder_chain(path, content_type, branch, include_self):
     return chain[:-1]
 
 
-def _sort_files_by_admin_order(files, content_type, branch):
-    if not files:
-        return []
+_SORT_ORDER_OFFSET = 2 ** 31
+
+
+def _encode_sort_order(value):
+    return f"{int(value or 0) + _SORT_ORDER_OFFSET:010d}"
+
+
+def _admin_sort_key(path, is_dir, name, self_order, folder_orders, content_type, branch):
+    """Encode an item's admin listing position as a string that sorts like the tuple it replaces.
+
+    The key is (ancestor chain of (sort_order, name), folders before files, own sort_order, name):
+    each chain entry ends in \x01 and the chain in \x02, so a parent's chain sorts before its children's.
+    """
+    chain = _relative_folder_chain(path, content_type, branch, include_self=is_dir)
+    chain_key = "".join(
+        f"{_encode_sort_order(folder_orders.get(chain_path, 0))}{chain_path.split('/')[-1].lower()}\x01"
+        for chain_path in chain
+    )
+    name_key = str(name or (path.split("/")[-1] if path else "")).lower()
+    return f"{chain_key}\x02{0 if is_dir else 1}{_encode_sort_order(self_order)}{name_key}"
 
+
+def _refresh_derived_metadata(content_type, branch, prefix=None):
+    """Recompute admin_sort_key and effective_visible in one content root, optionally only at or below ``prefix``."""
     resolved_content_type = content_type or ""
     resolved_branch = _normalize_branch(branch)
-    folder_rows = FolderMetadata.objects.filter(
-        content_type=resolved_content_type,
-        branch=resolved_branch,
-    ).values("dropbox_path", "sort_order")
-    file_rows = FileMetadata.objects.filter(
-        content_type=resolved_content_type,
-        branch=resolved_branch,
-    ).values("dropbox_path", "sort_order")
-    folder_order_map = {
-        _normalize_dropbox_path(row["dropbox_path"]): int(row.get("sort_order") or 0)
-        for row in folder_rows
+    scope = Q(content_type=resolved_content_type, branch=resolved_branch)
+    folder_orders = {}
+    hidden_paths = []
+    for path, order, is_visible in FolderMetadata.objects.filter(scope).values_list(
+        "dropbox_path", "sort_order", "is_visible"
+    ):
+        folder_orders[_normalize_dropbox_path(path)] = int(order or 0)
+        if not is_visible:
+            hidden_paths.append(path)
+    hidden_trie = _hidden_folder_trie(hidden_paths)
+    if prefix:
+        normalized_prefix = _normalize_dropbox_path(prefix)
+        scope &= Q(dropbox_path=normalized_prefix) | Q(dropbox_path__startswith=f"{normalized_prefix}/")
+
+    fields = ("id", "dropbox_path", "name", "sort_order", "is_visible", "admin_sort_key", "effective_visible")
+    for model, is_dir in ((FolderMetadata, True), (FileMetadata, False)):
+        changed = []
+        for row in model.objects.filter(scope).only(*fields).iterator():
+            path = _normalize_dropbox_path(row.dropbox_path)
+            key = _admin_sort_key(
+                path, is_dir, row.name, row.sort_order, folder_orders, resolved_content_type, resolved_branch
+            )
+            visible = bool(row.is_visible) and not _is_under_hidden_folder(path, hidden_trie)
+            if key != row.admin_sort_key or visible != row.effective_visible:
+                row.admin_sort_key = key
+                row.effective_visible = visible
+                changed.append(row)
+        if changed:
+            model.objects.bulk_update(
+                changed, ["admin_sort_key", "effective_visible"], batch_size=METADATA_SYNC_BATCH_SIZE
+            )
+
+
+def _refresh_derived_rows(content_type, branch, folder_paths=(), file_paths=()):
+    """Recompute admin_sort_key and effective_visible of the given rows, reading only their ancestor folders.
+
+    Enough when only the rows themselves changed; a folder whose sort_order or visibility changed needs
+    _refresh_derived_metadata over its subtree.
+    """
+    resolved_content_type = content_type or ""
+    resolved_branch = _normalize_branch(branch)
+    if not folder_paths and not file_paths:
+        return
+    root_path = _normalize_dropbox_path(_resolve_content_path(resolved_content_type, resolved_branch) or "")
+    ancestors = {root_path} if root_path else set()
+    for paths, is_dir in ((folder_paths, True), (file_paths, False)):
+        for path in paths:
+            ancestors.update(_relative_folder_chain(path, resolved_content_type, resolved_branch, include_self=is_dir))
+    scope = Q(content_type=resolved_content_type, branch=resolved_branch)
+    ancestors = list(ancestors)
+    folder_orders = {}
+    hidden_paths = []
+    for start in range(0, len(ancestors), METADATA_SYNC_BATCH_SIZE):
+        for path, order, is_visible in FolderMetadata.objects.filter(
+            scope, dropbox_path__in=ancestors[start : start + METADATA_SYNC_BATCH_SIZE]
+        ).values_list("dropbox_path", "sort_order", "is_visible"):
+            folder_orders[_normalize_dropbox_path(path)] = int(order or 0)
+            if not is_visible:
+                hidden_paths.append(path)
+    hidden_trie = _hidden_folder_trie(hidden_paths)
+
+    fields = ("id", "dropbox_path", "name", "sort_order", "is_visible", "admin_sort_key", "effective_visible")
+    for model, is_dir, paths in ((FolderMetadata, True, list(folder_paths)), (FileMetadata, False, list(file_paths))):
+        changed = []
+        for start in range(0, len(paths), METADATA_SYNC_BATCH_SIZE):
+            batch = paths[start : start + METADATA_SYNC_BATCH_SIZE]
+            for row in model.objects.filter(scope, dropbox_path__in=batch).only(*fields):
+                path = _normalize_dropbox_path(row.dropbox_path)
+                key = _admin_sort_key(
+                    path, is_dir, row.name, row.sort_order, folder_orders, resolved_content_type, resolved_branch
+                )
+                visible = bool(row.is_visible) and not _is_under_hidden_folder(path, hidden_trie)
+                if key != row.admin_sort_key or visible != row.effective_visible:
+                    row.admin_sort_key = key
+                    row.effective_visible = visible
+                    changed.append(row)
+        if changed:
+            model.objects.bulk_update(
+                changed, ["admin_sort_key", "effective_visible"], batch_size=METADATA_SYNC_BATCH_SIZE
+            )
+
+
+_LISTING_METADATA_FIELDS = (
+    "dropbox_path",
+    "display_name",
+    "icon_url",
+    "sort_order",
+    "is_visible",
+    "effective_visible",
+    "admin_sort_key",
+)
+
+
+def _listing_metadata(content_type, branch):
+    """File and folder metadata rows of one content root, keyed by normalized path."""
+    root_path = _normalize_dropbox_path(_resolve_content_path(content_type, branch) or "")
+    scope = _content_root_scope(content_type, branch, root_path)
+    file_rows = {
+        _normalize_dropbox_path(row["dropbox_path"]): row
+        for row in FileMetadata.objects.filter(scope).values(*_LISTING_METADATA_FIELDS)
     }
-    file_order_map = {
-        _normalize_dropbox_path(row["dropbox_path"]): int(row.get("sort_order") or 0)
-        for row in file_rows
+    folder_rows = {
+        _normalize_dropbox_path(row["dropbox_path"]): row
+        for row in FolderMetadata.objects.filter(scope).values(*_LISTING_METADATA_FIELDS)
     }
+    return file_rows, folder_rows
 
-    def _sort_key(item):
-        path = _normalize_dropbox_path(item.get("path"))
-        is_dir = bool(item.get("is_dir"))
-        chain = _relative_folder_chain(path, resolved_content_type, resolved_branch, include_self=is_dir)
-        chain_key = []
-        for chain_path in chain:
-            name = chain_path.split("/")[-1].lower()
-            chain_key.append((folder_order_map.get(chain_path, 0), name))
-        self_order = folder_order_map.get(path, 0) if is_dir else file_order_map.get(path, 0)
-        name_value = item.get("name") or (path.split("/")[-1] if path else "")
-        name_key = str(name_value).lower()
-        return (chain_key, 0 if is_dir else 1, self_order, name_key)
-
-    return sorted(files, key=_sort_key)
-
-
-def _filter_files_by_visibility(files, content_type, branch, include_hidden=False):
-    paths = [_normalize_dropbox_path(item.get("path")) for item in files if item.get("path")]
-    visibility = _visibility_map_for_paths(paths)
-    folder_visibility = _folder_visibility_map_for_paths(paths)
-    hidden_folder_prefixes = _hidden_folder_prefixes(content_type=content_type, branch=branch)
-    result = []
+
+def _prepare_listing(files, content_type, branch, include_hidden=False, admin_order=True):
+    """Filter hidden rows, apply metadata overrides and (optionally) admin-sort a listing in one pass.
+
+    Emits each kept item with a normalized ``path`` plus ``is_visible``, ``display_name``, ``icon_url``
+    and ``sort_order``. With ``admin_order=False`` the input order is kept.
+    """
+    if not files:
+        return []
+
+    resolved_content_type = content_type or ""
+    resolved_branch = _normalize_branch(branch)
+    file_rows, folder_rows = _listing_metadata(resolved_content_type, resolved_branch)
+    folder_orders = None
+    hidden_folders = None
+    keyed = []
     for item in files:
         path = _normalize_dropbox_path(item.get("path"))
         if not path:
             continue
-        if item.get("is_dir"):
-            item_visible = folder_visibility.get(path, True)
+        is_dir = bool(item.get("is_dir"))
+        row = folder_rows.get(path) if is_dir else file_rows.get(path)
+        if row is not None:
+            is_visible = bool(row["is_visible"] and row["effective_visible"])
         else:
-            item_visible = visibility.get(path, True)
-        is_visible = item_visible and not _is_under_hidden_folder(path, hidden_folder_prefixes)
-        enriched = {**item, "path": path, "is_visible": is_visible}
-        if include_hidden or is_visible:
-            result.append(enriched)
-    return result
+            # No metadata row yet: only a hidden ancestor folder can hide it.
+            if hidden_folders is None:
+                hidden_folders = _hidden_folder_trie(
+                    folder_path for folder_path, folder_row in folder_rows.items() if not folder_row["is_visible"]
+                )
+            is_visible = not _is_under_hidden_folder(path, hidden_folders)
+            row = {}
+        if not (include_hidden or is_visible):
+            continue
+
+        sort_order = int(row.get("sort_order") or 0)
+        sort_key = ""
+        if admin_order:
+            sort_key = row.get("admin_sort_key")
+            if not sort_key:
+                if folder_orders is None:
+                    folder_orders = {
+                        folder_path: int(folder_row["sort_order"] or 0) for folder_path, folder_row in folder_rows.items()
+                    }
+                sort_key = _admin_sort_key(
+                    path, is_dir, item.get("name"), sort_order, folder_orders, resolved_content_type, resolved_branch
+                )
+        keyed.append((
+            sort_key,
+            {
+                **item,
+                "path": path,
+                "is_visible": is_visible,
+                "display_name": row.get("display_name") or item.get("name") or (path.split("/")[-1] or ""),
+                "icon_url": row.get("icon_url") or "",
+                "sort_order": sort_order,
+            },
+        ))
+
+    if admin_order:
+        keyed.sort(key=lambda pair: pair[0])
+    return [entry for _sort_key, entry in keyed]
 
 
 def _is_visible_path(path):
     normalized_path = _normalize_dropbox_path(path)
     if not normalized_path:
         return True
-    branch = _extract_branch_from_path(normalized_path)
-    content_type = _infer_content_type_from_path(normalized_path)
 
-    folder_row = FolderMetadata.objects.filter(dropbox_path=normalized_path).values("is_visible").first()
-    if folder_row is not None and not bool(folder_row["is_visible"]):
-        return False
+    file_row = FileMetadata.objects.filter(dropbox_path=normalized_path).values("is_visible", "effective_visible").first()
+    if file_row is not None:
+        return bool(file_row["is_visible"] and file_row["effective_visible"])
+    folder_row = (
+        FolderMetadata.objects.filter(dropbox_path=normalized_path).values("is_visible", "effective_visible").first()
+    )
+    if folder_row is not None:
+        return bool(folder_row["is_visible"] and folder_row["effective_visible"])
 
+    branch = _extract_branch_from_path(normalized_path)
+    content_type = _infer_content_type_from_path(normalized_path)
     hidden_prefixes = _hidden_folder_prefixes(content_type=content_type, branch=branch)
-    if _is_under_hidden_folder(normalized_path, hidden_prefixes):
-        return False
-
-    file_row = FileMetadata.objects.filter(dropbox_path=normalized_path).values("is_visible").first()
-    if file_row is None:
-        return True
-    return bool(file_row["is_visible"])
+    return not _is_under_hidden_folder(normalized_path, hidden_prefixes)
 
 
 def _sync_exam_sets_for_branch(branch):
@@ -992,11 +1179,6 @@ def _cached_objective_question_count_from_source(branch, db_fallback=0):
         return int(db_fallback or 0)
 
 
-def _is_dropbox_not_found_error(exc):
-    lowered = str(exc).lower()
-    return "path_lookup/not_found" in lowered or "not_found" in lowered
-
-
 def _content_types_from_request(value):
     if value is None:
         return list(SYNCABLE_CONTENT_TYPES)
@@ -1025,15 +1207,16 @@ def _sync_dropbox_content_type(content_type, branch, warm_cache=True, prune_miss
         raise ValueError(f"Invalid content type: {resolved_content_type}")
 
     include_dirs = resolved_content_type in CONTENT_TYPES_WITH_DIRECTORY_TREE
-    try:
-        files_with_dirs = list_folder_with_metadata(path, include_dirs=True, recursive=True)
-    except Exception as exc:
-        if _is_dropbox_not_found_error(exc):
-            files_with_dirs = []
-        else:
-            raise
+    delta = list_folder_delta(path, consumer="metadata")
+    files_with_dirs = delta["entries"]
+    has_changes = delta["full"] or bool(delta["changed"]) or bool(delta["deleted"])
 
-    _sync_metadata_from_listing(files_with_dirs, content_type=resolved_content_type, branch=resolved_branch)
+    # Replayed cursors only touch rows that changed; a full re-list re-syncs everything.
+    _sync_metadata_from_listing(
+        files_with_dirs if delta["full"] else delta["changed"],
+        content_type=resolved_content_type,
+        branch=resolved_branch,
+    )
     if prune_missing:
         prune_summary = _prune_metadata_not_in_listing(
             files_with_dirs,
@@ -1042,7 +1225,8 @@ def _sync_dropbox_content_type(content_type, branch, warm_cache=True, prune_miss
         )
     else:
         prune_summary = {"files_deleted": 0, "folders_deleted": 0}
-    _invalidate_list_cache(content_type=resolved_content_type, branch=resolved_branch)
+    if has_changes or prune_summary["files_deleted"] or prune_summary["folders_deleted"]:
+        _invalidate_list_cache(content_type=resolved_content_type, branch=resolved_branch)
 
     files_only = [row for row in files_with_dirs if not row.get("is_dir")]
     if warm_cache:
@@ -1069,6 +1253,9 @@ def _sync_dropbox_content_type(content_type, branch, warm_cache=True, prune_miss
         "folders_deleted": prune_summary["folders_deleted"],
         "cached": bool(warm_cache),
         "include_dirs": include_dirs,
+        "full_listing": delta["full"],
+        "changed_count": len(delta["changed"]),
+        "deleted_count": len(delta["deleted"]),
     }
 
 
@@ -1216,9 +1403,9 @@ class ListFilesView(APIView):
                 metadata_only=metadata_only,
             )
             if not refresh:
-                cached_visible_files = cache.get(final_cache_key)
+                cached_visible_files, cached_etag = cached_payload(final_cache_key)
                 if cached_visible_files is not None:
-                    return Response(cached_visible_files)
+                    return etag_response(request, cached_visible_files, cached_etag)
 
             list_cache_key, stale_key = _list_cache_keys(
                 content_type,
@@ -1311,17 +1498,17 @@ class ListFilesView(APIView):
                                 else:
                                     raise
 
-            ordered_files = _sort_files_by_admin_order(files, content_type=content_type, branch=branch)
-            visible_files = _filter_files_by_visibility(
-                ordered_files,
+            visible_files = _prepare_listing(
+                files,
                 content_type=content_type,
                 branch=branch,
                 include_hidden=include_hidden,
             )
-            visible_files = _apply_metadata_overrides(visible_files, content_type=content_type, branch=branch)
+            etag = None
             if not refresh:
                 cache.set(final_cache_key, visible_files, timeout=FINAL_LIST_CACHE_TTL_SECONDS)
-            return Response(visible_files)
+                etag = remember_etag(final_cache_key, visible_files, FINAL_LIST_CACHE_TTL_SECONDS)
+            return etag_response(request, visible_files, etag)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -1353,6 +1540,31 @@ class SyncDropboxContentView(APIView):
             return Response({"error": str(exc)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def _has_metrics_token(request):
+    token = str(getattr(settings, "STORAGE_METRICS_TOKEN", "") or "")
+    authorization = str(request.META.get("HTTP_AUTHORIZATION") or "")
+    return bool(token) and hmac.compare_digest(authorization, f"Bearer {token}")
+
+
+class StorageMetricsView(APIView):
+    permission_classes = [AllowAny]
+
+    def get_authenticators(self):
+        # The scrape token is not a JWT; skip user authentication instead of rejecting it.
+        if _has_metrics_token(self.request):
+            return []
+        return super().get_authenticators()
+
+    def get(self, request):
+        user = request.user
+        if not _has_metrics_token(request) and not (user and user.is_authenticated and user.is_staff):
+            return Response({"error": "Not allowed."}, status=status.HTTP_403_FORBIDDEN)
+        return HttpResponse(
+            storage_metrics.render_prometheus(),
+            content_type="text/plain; version=0.0.4; charset=utf-8",
+        )
+
+
 class ContentSyncStatusView(APIView):
     permission_classes = [AllowAny]
 
@@ -1413,10 +1625,19 @@ class ResetDropboxMetadataView(APIView):
         file_qs.delete()
         folder_qs.delete()
 
+        # Without their cursors the next sync re-lists these roots and rebuilds every metadata row.
+        cursor_qs = StorageListingCursor.objects.filter(consumer="metadata")
         if resolved_branch:
             FileSyncLog.objects.filter(branch=resolved_branch).delete()
+            cursor_qs = cursor_qs.filter(
+                root_path__in=[
+                    _normalize_dropbox_path(_resolve_content_path(content_type, resolved_branch) or "")
+                    for content_type in resolved_content_types
+                ]
+            )
         else:
             FileSyncLog.objects.all().delete()
+        cursor_qs.delete()
 
         for branch_name in branches_to_invalidate:
             for content_type in resolved_content_types:
@@ -1457,23 +1678,46 @@ class SearchFilesView(APIView):
             if not path:
                 return Response({"error": "Invalid content type"}, status=status.HTTP_400_BAD_REQUEST)
 
-            if _uses_supabase_storage():
-                results = search_files(path, query)
-            elif not _dropbox_auto_sync_enabled():
-                results = _metadata_search_files(content_type=content_type, branch=branch, query=query)
+            limit = min(
+                _as_positive_int(request.GET.get("limit"), SEARCH_RESULTS_DEFAULT_LIMIT),
+                SEARCH_RESULTS_MAX_LIMIT,
+            )
+            offset = _as_positive_int(request.GET.get("offset"), 0, minimum=0)
+
+            if not _uses_supabase_storage() and not _dropbox_auto_sync_enabled():
+                # The search index ranks, filters by effective visibility and pages in SQL; the rows already
+                # carry their metadata overrides.
+                page, total = _metadata_search_files(
+                    content_type=content_type,
+                    branch=branch,
+                    query=query,
+                    include_hidden=include_hidden,
+                    offset=offset,
+                    limit=limit,
+                )
+                response = Response(page)
+                response["X-Total-Count"] = str(total)
+                return response
             else:
                 results = search_files(path, query)
-                if is_staff and _should_sync_metadata(content_type=content_type, branch=branch, force=False):
+                if (
+                    not _uses_supabase_storage()
+                    and is_staff
+                    and _should_sync_metadata(content_type=content_type, branch=branch, force=False)
+                ):
                     _sync_metadata_from_listing(results, content_type=content_type, branch=branch)
-            ordered_results = _sort_files_by_admin_order(results, content_type=content_type, branch=branch)
-            visible_results = _filter_files_by_visibility(
-                ordered_results,
-                content_type=content_type,
-                branch=branch,
-                include_hidden=include_hidden,
-            )
-            visible_results = _apply_metadata_overrides(visible_results, content_type=content_type, branch=branch)
-            return Response(visible_results)
+                # Admin order breaks ties between equally good matches.
+                visible_results = _prepare_listing(
+                    results,
+                    content_type=content_type,
+                    branch=branch,
+                    include_hidden=include_hidden,
+                )
+                visible_results.sort(key=lambda item: search_rank(item, query))
+            page = visible_results[offset : offset + limit]
+            response = Response(page)
+            response["X-Total-Count"] = str(len(visible_results))
+            return response
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -1494,12 +1738,14 @@ class DownloadFileView(APIView):
             if _is_subjective_path(path) and not (request.user and request.user.is_staff):
                 return Response({"error": "Download is disabled for library files."}, status=status.HTTP_403_FORBIDDEN)
 
-            file_content = download_file(path)
             filename = path.split('/')[-1]
-
-            response = HttpResponse(file_content, content_type='application/octet-stream')
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
-            return response
+            return storage_file_response(
+                request,
+                path,
+                content_type="application/octet-stream",
+                disposition="attachment",
+                filename=filename,
+            )
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -1518,6 +1764,8 @@ class ViewFileView(APIView):
             if not _can_access_path(request.user, path):
                 return Response({"error": "Authentication required or invalid path"}, status=status.HTTP_401_UNAUTHORIZED)
             link = get_shareable_link(path)
+            if _file_delivery_mode(request, default="link") == "redirect":
+                return _direct_link_response(link)
             return Response({"link": link})
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -1537,14 +1785,23 @@ class PreviewFileView(APIView):
             if not _can_access_path(request.user, path):
                 return Response({"error": "Authentication required or invalid path"}, status=status.HTTP_401_UNAUTHORIZED)
 
-            file_content = download_file(path)
-            filename = path.split("/")[-1] or "preview"
-            content_type = _guess_content_type(filename)
+            delivery_mode = _file_delivery_mode(request)
+            if delivery_mode != "proxy":
+                # Serve the bytes straight from the object store instead of through a gunicorn worker.
+                link = get_temporary_link(path)
+                if delivery_mode == "redirect":
+                    return _direct_link_response(link)
+                return Response({"link": link})
 
-            response = HttpResponse(file_content, content_type=content_type)
-            response["Content-Disposition"] = f'inline; filename="{filename}"'
-            response["Cache-Control"] = "private, max-age=300"
-            return response
+            filename = path.split("/")[-1] or "preview"
+            return storage_file_response(
+                request,
+                path,
+                content_type=_guess_content_type(filename),
+                disposition="inline",
+                filename=filename,
+                cache_control="private, max-age=300",
+            )
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -1622,6 +1879,8 @@ class UploadFileView(APIView):
                 content_type=content_type,
                 branch=branch,
             )
+            _refresh_derived_metadata(content_type, branch, prefix=path)
+            index_files(FileMetadata.objects.filter(pk=file_meta.pk))
             _invalidate_list_cache(content_type=content_type, branch=branch)
 
             payload = {
@@ -1706,6 +1965,8 @@ class FileVisibilityView(APIView):
             meta.file_size = file_size
             meta.is_visible = is_visible
             meta.save(update_fields=["name", "content_type", "branch", "file_size", "is_visible", "modified_at"])
+        # Hiding or showing a folder changes effective_visible for its whole subtree.
+        _refresh_derived_metadata(content_type, branch, prefix=normalized_path)
         _invalidate_list_cache(content_type=content_type, branch=branch)
 
         payload = {
@@ -1722,6 +1983,8 @@ class FileVisibilityView(APIView):
                 ).update(is_active=is_visible)
             else:
                 updated_count = ExamSet.objects.filter(source_file_path=normalized_path).update(is_active=is_visible)
+            if updated_count:
+                bump_exam_sets_version()
             payload["exam_sets_updated"] = updated_count
             if is_visible and updated_count == 0:
                 try:
@@ -1778,6 +2041,9 @@ class FileMetadataUpdateView(APIView):
                 update_fields.append("sort_order")
             if update_fields:
                 meta.save(update_fields=update_fields + ["modified_at"])
+            if sort_order is not None:
+                # Every descendant's key embeds this folder's sort order.
+                _refresh_derived_metadata(meta.content_type, meta.branch, prefix=meta.dropbox_path)
         else:
             meta = _ensure_metadata_entry(path=normalized_path, content_type=content_type, branch=branch)
             if meta is None:
@@ -1794,6 +2060,9 @@ class FileMetadataUpdateView(APIView):
                 update_fields.append("sort_order")
             if update_fields:
                 meta.save(update_fields=update_fields + ["modified_at"])
+                index_files(FileMetadata.objects.filter(pk=meta.pk))
+            if sort_order is not None:
+                _refresh_derived_metadata(meta.content_type, meta.branch, prefix=meta.dropbox_path)
 
         _invalidate_list_cache(content_type=content_type, branch=branch)
         return Response(
@@ -1834,7 +2103,10 @@ class RenameFileView(APIView):
                 is_dir = False
 
         try:
-            move_path(normalized_path, normalized_new_path)
+            move_result = move_path(normalized_path, normalized_new_path)
+        except StorageMoveIncomplete as exc:
+            # Metadata still points at the old path; retrying the rename resumes the journaled move.
+            return Response({"error": str(exc), "move": exc.report}, status=status.HTTP_409_CONFLICT)
         except Exception as exc:
             return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -1912,12 +2184,25 @@ class RenameFileView(APIView):
                     content_type=updated_content_type,
                     branch=updated_branch,
                 )
-            ExamSet.objects.filter(source_file_path=normalized_path).update(source_file_path=normalized_new_path)
+            if ExamSet.objects.filter(source_file_path=normalized_path).update(source_file_path=normalized_new_path):
+                bump_exam_sets_version()
 
+        index_files(
+            FileMetadata.objects.filter(
+                Q(dropbox_path=normalized_new_path) | Q(dropbox_path__startswith=f"{normalized_new_path}/")
+            )
+        )
+        _refresh_derived_metadata(
+            _infer_content_type_from_path(normalized_new_path),
+            _extract_branch_from_path(normalized_new_path),
+            prefix=normalized_new_path,
+        )
         _invalidate_list_cache_for_path(normalized_path)
         _invalidate_list_cache_for_path(normalized_new_path)
 
         payload = {"message": "Path renamed", "path": normalized_path, "new_path": normalized_new_path}
+        if isinstance(move_result, dict):
+            payload["move"] = move_result
         if _is_exam_set_path(normalized_path) or _is_exam_set_path(normalized_new_path):
             try:
                 payload["exam_sets_sync"] = _sync_exam_sets_for_branch(_extract_branch_from_path(normalized_new_path))
@@ -2124,15 +2409,28 @@ class DeleteFileView(APIView):
         
         try:
             normalized_path = _normalize_dropbox_path(path)
-            delete_file(normalized_path)
-            FileMetadata.objects.filter(
-                Q(dropbox_path=normalized_path) | Q(dropbox_path__startswith=f"{normalized_path}/")
-            ).delete()
-            FolderMetadata.objects.filter(
-                Q(dropbox_path=normalized_path) | Q(dropbox_path__startswith=f"{normalized_path}/")
+            delete_report = delete_file(normalized_path) or {}
+            deleted_scope = Q(dropbox_path=normalized_path) | Q(dropbox_path__startswith=f"{normalized_path}/")
+            # Objects that failed to delete are still in storage, so their rows and folders stay.
+            surviving = Q()
+            surviving_folders = set()
+            for failed_path in delete_report.get("failed") or {}:
+                failed_path = _normalize_dropbox_path(failed_path)
+                surviving |= Q(dropbox_path=failed_path) | Q(dropbox_path__startswith=f"{failed_path}/")
+                while failed_path and failed_path.startswith(f"{normalized_path}/"):
+                    failed_path = _parent_dropbox_path(failed_path)
+                    surviving_folders.add(failed_path)
+            FileMetadata.objects.filter(deleted_scope).exclude(surviving).delete()
+            FolderMetadata.objects.filter(deleted_scope).exclude(surviving).exclude(
+                dropbox_path__in=surviving_folders
             ).delete()
             _invalidate_list_cache_for_path(normalized_path)
-            payload = {"message": "File deleted successfully"}
+            payload = {
+                "message": "File deleted successfully",
+                "deleted_count": len(delete_report.get("deleted", [])),
+            }
+            if delete_report.get("failed"):
+                payload["delete_errors"] = delete_report["failed"]
             if _is_objective_question_path(normalized_path) or _is_exam_set_path(normalized_path):
                 try:
                     payload.update(_sync_questions_for_changed_path(normalized_path, prune_missing=True))